@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+'''
+The tests run outside of Maya on world_space_fake, installed before any world space module is imported.
+
+'''
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from world_space_fake import FakeMaya, FakeCmds, FakeScene
+
+FakeMaya.install(FakeCmds(), qt=False)
+
+import world_space_loc_core
+
+
+@pytest.fixture
+def cmds():
+    '''
+    Recorded cmds on a new fake scene, used by world_space_loc_core.
+
+    '''
+    recorder = FakeCmds(scene=FakeScene())
+    world_space_loc_core.cmds = recorder
+    return recorder
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+'''
+Key only partial bakes sample the key times of their sources, not the old keys of the locator.
+
+'''
+import pytest
+
+from world_space_loc_core import KeyIndex, Utils
+
+
+@pytest.fixture
+def index(cmds, monkeypatch):
+    monkeypatch.setattr(KeyIndex, 'index_instance', None)
+    yield KeyIndex.instance()
+    KeyIndex.instance().remove_callbacks()
+
+
+@pytest.fixture
+def rebaked(cmds, index):
+    '''
+    A locator keyed on every frame by an earlier bake, constrained again to its control.
+
+    '''
+    cmds.createNode('transform', n='ctrl')
+    for frame, value in [(1, 0.0), (6, 5.0), (20, 8.0)]:
+        cmds.setKeyframe('ctrl', at='tx', t=frame, v=value)
+    cmds.spaceLocator(n='loc')
+    for frame in range(1, 21):
+        cmds.setKeyframe('loc', t=frame)
+    cmds.parentConstraint('ctrl', 'loc')
+
+
+def test_windowed_key_bake_ignores_locator_keys(cmds, rebaked):
+    Utils.bake_obj(['loc'], True, windows=[(4, 10)])
+
+    times = cmds.keyframe('loc', at='tx', q=True)
+    # The window is keyed on its borders and the control key, the keys outside it stay
+    assert [t for t in times if 4 <= t <= 10] == [4, 6, 10]
+    assert [t for t in times if t < 4 or t > 10] == [1, 2, 3] + list(range(11, 21))
+    assert cmds.getAttr('loc.tx', t=6) == pytest.approx(5.0)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+'''
+Scheduler of world_space_batch with --fake: a few long-lived python workers bake the fake scenes
+of a shared queue.
+
+'''
+import sys
+import json
+
+from world_space_batch import Batch
+
+FAKE = ['-n', 'ctrl_*', '--fake', '--fake-nodes', '3', '--no-save']
+
+
+def run(tmp_path, argv):
+    report = str(tmp_path / 'report.json')
+    code = Batch.main(argv + ['--report', report])
+    with open(report) as f:
+        return code, json.load(f)['results']
+
+
+def test_workers_share_the_scenes(tmp_path):
+    scenes = ['shot_{}.ma'.format(i) for i in range(6)]
+    code, results = run(tmp_path, scenes + FAKE + ['-w', '2'])
+
+    assert code == 0
+    assert [r['scene'] for r in results] == scenes
+    assert all(r['ok'] and r['nodes'] == 3 for r in results)
+    # At most two processes for six scenes, each one initialized once
+    pids = set(r['pid'] for r in results)
+    assert len(pids) <= 2
+    assert len([r for r in results if r['time_init'] > 0.0]) == len(pids)
+
+
+def test_worker_cmd_has_no_scenes():
+    # Scenes named like the values of the options
+    args = Batch.get_parser().parse_args(['loc', 'ctrl_*', '-m', 'loc', '-n', 'ctrl_*', '-r', '1', '10', '--fake'])
+    worker = Batch.get_parser().parse_args(Batch.get_worker_cmd(args)[2:])
+
+    assert worker.worker and worker.scenes == []
+    assert (worker.mode, worker.nodes, worker.range, worker.fake) == ('loc', ['ctrl_*'], [1.0, 10.0], True)
+
+
+def test_dead_worker_fails_its_scene_only(tmp_path, monkeypatch):
+    # A worker exiting after its first line, every scene gets a new process
+    cmd = [sys.executable, '-c', 'import sys; sys.stdin.readline(); print("crash"); sys.exit(3)']
+    monkeypatch.setattr(Batch, 'get_worker_cmd', classmethod(lambda cls, args: cmd))
+    code, results = run(tmp_path, ['a.ma', 'b.ma', 'c.ma'] + FAKE + ['-w', '2'])
+
+    assert code == 1
+    assert [r['scene'] for r in results] == ['a.ma', 'b.ma', 'c.ma']
+    assert all(not r['ok'] and r['error'].startswith('worker exited with 3') and 'crash' in r['error']
+               for r in results)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+'''
+Decompose against the MTransformationMatrix of the fake om2, for every rotate order.
+
+'''
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from world_space_decompose import Decompose
+from world_space_loc_core import MatrixBake
+import maya.api.OpenMaya as om2
+
+ORDERS = range(6)
+
+
+def get_transforms(count, seed=0, shear=True):
+    '''
+    Random translate, rotate (radians), scale and shear, scales kept positive.
+    count: Number of transforms.
+    seed: Random seed.
+    shear: Add shear, zero otherwise.
+    return: Four (count x 3) arrays.
+
+    '''
+    rng = np.random.RandomState(seed)
+    t = rng.uniform(-10.0, 10.0, (count, 3))
+    r = rng.uniform(-math.pi, math.pi, (count, 3))
+    s = rng.uniform(0.2, 3.0, (count, 3))
+    sh = rng.uniform(-0.8, 0.8, (count, 3)) if shear else np.zeros((count, 3))
+    return t, r, s, sh
+
+
+def get_reference(t, r, s, sh, ro):
+    '''
+    Build the matrices with MTransformationMatrix.
+    return: (count x 4 x 4) array.
+
+    '''
+    matrices = []
+    for values in zip(t, r, s, sh):
+        tm = om2.MTransformationMatrix()
+        tm.setScale(values[2], om2.MSpace.kTransform)
+        tm.setShear(values[3], om2.MSpace.kTransform)
+        tm.setRotation(om2.MEulerRotation(*values[1], order=ro))
+        tm.setTranslation(om2.MVector(*values[0]), om2.MSpace.kTransform)
+        matrices.append(list(tm.asMatrix()))
+    return np.array(matrices).reshape(-1, 4, 4)
+
+
+@pytest.mark.parametrize('ro', ORDERS)
+def test_decompose_matches_reference(ro):
+    t, r, s, sh = get_transforms(200, ro)
+    t_out, r_out, s_out, sh_out = Decompose.decompose(get_reference(t, r, s, sh, ro), ro)
+
+    assert np.allclose(t_out, t)
+    assert np.allclose(s_out, s)
+    assert np.allclose(sh_out, sh)
+    # Same rotation, the angles can be the alternate solution
+    assert np.allclose(Decompose.rotation_matrix(r_out, ro), Decompose.rotation_matrix(r, ro))
+
+
+@pytest.mark.parametrize('ro', ORDERS)
+def test_euler_matches_reference(ro):
+    t, r, s, sh = get_transforms(200, ro + 10)
+    matrices = get_reference(t, r, s, sh, ro)
+    _, r_out, _, _ = Decompose.decompose(matrices, ro)
+
+    for m, angles in zip(matrices, r_out):
+        tm = om2.MTransformationMatrix(om2.MMatrix(m.ravel().tolist()))
+        ref = tm.rotation().reorder(ro)
+        assert np.allclose(angles, [ref.x, ref.y, ref.z])
+
+
+@pytest.mark.parametrize('ro', ORDERS)
+def test_rotation_matrix_matches_euler(ro):
+    _, r, _, _ = get_transforms(50, ro + 20)
+    for angles, m in zip(r, Decompose.rotation_matrix(r, ro)):
+        ref = om2.MEulerRotation(*angles, order=ro).asMatrix()
+        assert np.allclose(m, np.array(list(ref)).reshape(4, 4)[:3, :3])
+
+
+@pytest.mark.parametrize('ro', ORDERS)
+def test_compose_matches_reference(ro):
+    t, r, s, sh = get_transforms(50, ro + 30, shear=False)
+    assert np.allclose(Decompose.compose(t, r, s, ro), get_reference(t, r, s, sh, ro))
+
+
+def test_gimbal_lock():
+    r = np.array([[0.4, math.pi * 0.5, 0.0], [-1.2, -math.pi * 0.5, 0.0]])
+    t, _, s, sh = get_transforms(2, 40, shear=False)
+    _, r_out, _, _ = Decompose.decompose(get_reference(t, r, s, sh, 0), 0)
+    assert np.allclose(r_out, r)
+
+
+def test_localize_matches_reference():
+    t, r, s, sh = get_transforms(20, 50, shear=False)
+    world = get_reference(t, r, s, sh, 0)
+    parent = get_reference(t[::-1], r[::-1], s[::-1], sh, 0)
+
+    for local, m, p in zip(Decompose.localize(world, parent), world, parent):
+        ref = om2.MMatrix(m.ravel().tolist()) * om2.MMatrix(p.ravel().tolist()).inverse()
+        assert np.allclose(local.ravel(), list(ref))
+
+
+@pytest.mark.parametrize('ro', ORDERS)
+def test_channels_match_closest_solution(ro, monkeypatch):
+    # A spin past 180 degrees on the first axis and past 90 degrees on the middle one
+    frames = np.linspace(0.0, 1.0, 120)
+    r = np.stack([frames * math.pi * 3.0, np.sin(frames * math.pi) * 2.2, frames * 0.5], -1)
+    t, _, s, sh = get_transforms(len(frames), 60, shear=False)
+    matrices = [om2.MMatrix(m.ravel().tolist()) for m in get_reference(t, r, s, sh, ro)]
+
+    values = MatrixBake.decompose(matrices, ro)
+    monkeypatch.setattr(Decompose, 'available', classmethod(lambda cls: False))
+    reference = MatrixBake.decompose(matrices, ro)
+
+    assert np.allclose(values, reference)
+    # No flip left between two frames
+    assert np.abs(np.diff(np.array(values[3:6]), axis=-1)).max() < 0.5
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+'''
+wslFollow against the parent, point and orient constraint results, computed with om2 from the
+constraint definitions: offset before the target world matrix, local through the parent inverse,
+joint orient removed last. Controls with pivots and a rotate axis are checked against their
+own channels, composed through the full transform stack.
+
+'''
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import maya.api.OpenMaya as om2
+import world_space_loc_plugin
+from world_space_loc_plugin import FollowNode
+
+PARENT, POINT, ORIENT = range(3)
+# Rotate axis and pivots of a control without a transform stack
+NO_AXIS = (0.0, 0.0, 0.0)
+NO_PIVOTS = [(0.0, 0.0, 0.0)] * 4
+
+
+def get_matrix(rng, uniform=False, rotate=True):
+    '''
+    Random transform matrix.
+    rng: RandomState.
+    uniform: Same scale on every axis, like the parents of controls.
+    rotate: Random rotation, none otherwise.
+    return: MMatrix.
+
+    '''
+    tm = om2.MTransformationMatrix()
+    scale = rng.uniform(0.5, 2.0, 3)
+    tm.setScale([scale[0]] * 3 if uniform else scale, om2.MSpace.kTransform)
+    if rotate:
+        tm.setRotation(om2.MEulerRotation(*rng.uniform(-math.pi, math.pi, 3), order=int(rng.randint(6))))
+    tm.setTranslation(om2.MVector(*rng.uniform(-10.0, 10.0, 3)), om2.MSpace.kTransform)
+    return tm.asMatrix()
+
+
+def get_rows(count, seed=0):
+    '''
+    Random follow rows of every mode and rotate order, half of them joints.
+    return: List of (target, parent inverse, offset, mode, rotate order, orient, rotate axis, pivots).
+
+    '''
+    rng = np.random.RandomState(seed)
+    rows = []
+    for i in range(count):
+        mode = i % 3
+        offset = get_matrix(rng, uniform=True)
+        if mode == POINT:
+            # A point constraint offset is a translation in the parent space of the control
+            offset = om2.MTransformationMatrix().setTranslation(
+                om2.MVector(*rng.uniform(-5.0, 5.0, 3)), om2.MSpace.kTransform).asMatrix()
+        orient = om2.MEulerRotation(*rng.uniform(-math.pi, math.pi, 3)).asMatrix() if i % 2 else om2.MMatrix()
+        rows.append((get_matrix(rng), get_matrix(rng, uniform=True).inverse(), offset, mode, (i // 3) % 6, orient,
+                     NO_AXIS, NO_PIVOTS))
+    return rows
+
+
+def get_translation(v):
+    return om2.MMatrix([[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0], [v[0], v[1], v[2], 1.0]])
+
+
+def compose_stack(t, r, ro, s, sh, orient, axis, pivots):
+    '''
+    Local matrix of a control, sp^-1 * s * sh * sp * spt * rp^-1 * ra * r * jo * rp * rpt * t like Maya.
+    return: MMatrix.
+
+    '''
+    sp, spt, rp, rpt = pivots
+    scale = om2.MMatrix([[s[0], 0.0, 0.0, 0.0], [sh[0] * s[1], s[1], 0.0, 0.0], [sh[1] * s[2], sh[2] * s[2], s[2], 0.0],
+                         [0.0, 0.0, 0.0, 1.0]])
+    rotation = om2.MEulerRotation(*axis).asMatrix() * om2.MEulerRotation(r[0], r[1], r[2], ro).asMatrix() * orient
+    return get_translation([-v for v in sp]) * scale * get_translation(sp) * get_translation(spt) * \
+        get_translation([-v for v in rp]) * rotation * get_translation(rp) * get_translation(rpt) * get_translation(t)
+
+
+def constrain(target, parent_inverse, offset, mode, ro, orient, axis, pivots):
+    '''
+    Translate and rotation of a control driven by a constraint.
+    return: (x, y, z) translate, MQuaternion rotation, None for point constraints.
+
+    '''
+    if mode == POINT:
+        point = om2.MPoint(target[12], target[13], target[14]) * parent_inverse
+        return (point.x + offset[12], point.y + offset[13], point.z + offset[14]), None
+
+    if mode == ORIENT:
+        world = om2.MTransformationMatrix(offset).rotation(asQuaternion=True) * \
+            om2.MTransformationMatrix(target).rotation(asQuaternion=True)
+        parent = om2.MTransformationMatrix(parent_inverse).rotation(asQuaternion=True)
+        local = om2.MTransformationMatrix(target * parent_inverse).translation(om2.MSpace.kTransform)
+        return (local.x, local.y, local.z), world * parent * \
+            om2.MTransformationMatrix(orient).rotation(asQuaternion=True).conjugate()
+
+    local = om2.MTransformationMatrix(offset * target * parent_inverse)
+    t = local.translation(om2.MSpace.kTransform)
+    return (t.x, t.y, t.z), local.rotation(asQuaternion=True) * \
+        om2.MTransformationMatrix(orient).rotation(asQuaternion=True).conjugate()
+
+
+def check(rows, result):
+    for row, (t, r) in zip(rows, result):
+        ref_t, ref_r = constrain(*row)
+        if row[3] != ORIENT:
+            assert np.allclose(t, ref_t)
+        if ref_r is None:
+            assert np.allclose(r, 0.0)
+        else:
+            # The angles are in the rotate order of the control
+            rotation = om2.MEulerRotation(r[0], r[1], r[2], row[4])
+            assert np.allclose(list(rotation.asMatrix()), list(ref_r.asMatrix()))
+
+
+def test_solve_array_matches_constraints():
+    rows = get_rows(90)
+    check(rows, FollowNode.solve_array(rows))
+
+
+def test_solve_matches_constraints(monkeypatch):
+    # The om2 fallback when NumPy is not available
+    monkeypatch.setattr(world_space_loc_plugin, 'np', None)
+    rows = get_rows(90, 1)
+    check(rows, FollowNode.solve(rows))
+
+
+@pytest.mark.parametrize('mode', [PARENT, POINT, ORIENT])
+def test_identity_follows_target(mode):
+    rng = np.random.RandomState(mode)
+    target = get_matrix(rng, uniform=True)
+    t, r = FollowNode.solve_array([(target, om2.MMatrix(), om2.MMatrix(), mode, 0, om2.MMatrix(), NO_AXIS,
+                                    NO_PIVOTS)])[0]
+    tm = om2.MTransformationMatrix(target)
+    euler = tm.rotation()
+
+    if mode != ORIENT:
+        assert np.allclose(t, list(tm.translation(om2.MSpace.kTransform)))
+    if mode != POINT:
+        assert np.allclose(r, [euler.x, euler.y, euler.z])
+
+
+@pytest.mark.parametrize('array', [True, False])
+def test_solve_full_transform_stack(monkeypatch, array):
+    if not array:
+        monkeypatch.setattr(world_space_loc_plugin, 'np', None)
+    rng = np.random.RandomState(7)
+    rows = []
+    channels = []
+    for i in range(36):
+        mode = i % 3
+        ro = (i // 3) % 6
+        t = rng.uniform(-10.0, 10.0, 3).tolist()
+        r = rng.uniform(-math.pi, math.pi, 3).tolist()
+        axis = tuple(rng.uniform(-math.pi, math.pi, 3))
+        pivots = [tuple(p) for p in rng.uniform(-5.0, 5.0, (4, 3))]
+        orient = om2.MEulerRotation(*rng.uniform(-math.pi, math.pi, 3)).asMatrix() if i % 2 else om2.MMatrix()
+        local = compose_stack(t, r, ro, rng.uniform(0.5, 2.0, 3), rng.uniform(-0.5, 0.5, 3), orient, axis, pivots)
+
+        parent = get_matrix(rng, uniform=True)
+        target = get_matrix(rng)
+        world = local * parent
+        if mode == POINT:
+            # Keeps the rotate pivot where it is, like pointConstraint with maintain offset
+            pivot = om2.MPoint(*[a + b + c for a, b, c in zip(t, pivots[2], pivots[3])])
+            offset = get_translation(pivot - om2.MPoint(target[12], target[13], target[14]) * parent.inverse())
+        elif mode == ORIENT:
+            offset = (om2.MTransformationMatrix(world).rotation(asQuaternion=True) *
+                      om2.MTransformationMatrix(target).rotation(asQuaternion=True).conjugate()).asMatrix()
+        else:
+            offset = world * target.inverse()
+        rows.append((target, parent.inverse(), offset, mode, ro, orient, axis, pivots))
+        channels.append((t, r))
+
+    for row, (ref_t, ref_r), (t, r) in zip(rows, channels, FollowNode.solve(rows)):
+        if row[3] != ORIENT:
+            assert np.allclose(t, ref_t)
+        if row[3] != POINT:
+            assert np.allclose(list(om2.MEulerRotation(r[0], r[1], r[2], row[4]).asMatrix()),
+                               list(om2.MEulerRotation(ref_r[0], ref_r[1], ref_r[2], row[4]).asMatrix()))
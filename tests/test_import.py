@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+'''
+Import of world_space_loc_core in a fresh interpreter: no Qt, and fast.
+
+'''
+import os
+import sys
+import json
+import subprocess
+
+from world_space_bench import RESULT_TAG
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds, the fake maya is installed before the timer starts
+IMPORT_BUDGET = 1.0
+
+
+def get_import():
+    cmd = [sys.executable, os.path.join(ROOT, 'world_space_bench.py'), '--import-worker']
+    out = subprocess.Popen(cmd, stdout=subprocess.PIPE, cwd=ROOT).communicate()[0].decode('utf-8', 'replace')
+    for line in out.splitlines():
+        if line.startswith(RESULT_TAG):
+            return json.loads(line[len(RESULT_TAG):])
+    raise AssertionError('No import result in:\n{}'.format(out))
+
+
+def test_core_import_without_qt():
+    assert not get_import()['qt']
+
+
+def test_core_import_time():
+    assert get_import()['time'] < IMPORT_BUDGET
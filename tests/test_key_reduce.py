@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+'''
+Key reduction keeps the fixed keys and splits the spline until it is within tolerance.
+
+'''
+import math
+
+import pytest
+
+from world_space_loc_core import KeyReduce, WorldSpaceLoc
+
+
+def sine(count=41):
+    times = [float(i) for i in range(count)]
+    return times, [math.sin(t / 8.0) for t in times]
+
+
+def test_simplify_within_tolerance():
+    times, values = sine()
+    keep, err = KeyReduce.simplify(times, values, 0.01)
+
+    assert keep[0] == 0 and keep[-1] == len(times) - 1
+    assert len(keep) < len(times)
+    assert err <= 0.01
+    assert max(e for e, i in KeyReduce.get_errors(times, values, keep)) == err
+
+
+def test_simplify_keeps_fixed_keys():
+    times, values = sine()
+    fixed = list(range(0, 6)) + list(range(35, 41))
+    keep, err = KeyReduce.simplify(times, values, 0.01, fixed)
+
+    assert set(fixed) <= set(keep)
+    # The fixed keys shape the spline the error is measured on
+    assert max(e for e, i in KeyReduce.get_errors(times, values, keep)) == err <= 0.01
+
+
+def test_simplify_short_curves():
+    assert KeyReduce.simplify([0.0, 1.0], [0.0, 1.0], 0.001) == ([0, 1], 0.0)
+
+
+@pytest.mark.parametrize('native', [False, True])
+def test_bake_ctrl_reduces_baked_plugs(cmds, monkeypatch, native):
+    reduced = []
+    monkeypatch.setattr(KeyReduce, 'reduce', classmethod(lambda cls, plugs, *args: reduced.append(plugs) or
+                                                         {'curves': 0, 'removed': 0,
+                                                          'max_error': {'t': 0.0, 'r': 0.0, 's': 0.0}}))
+    cmds.createNode('transform', n='ctrl')
+    cmds.setKeyframe('ctrl', at='tx', t=1, v=1.0)
+    cmds.setKeyframe('ctrl', at='sx', t=1, v=2.0)
+    wsl = WorldSpaceLoc()
+    wsl.bake_loc(True, nodes=['ctrl'])
+    wsl.point_loc(False, nodes=['ctrl'])
+
+    wsl.reduce_tol = {}
+    wsl.bake_ctrl(False, native=native, nodes=['ctrl'])
+
+    # The hand keyed scale is not reduced
+    assert reduced == [['|ctrl.tx', '|ctrl.ty', '|ctrl.tz']]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+'''
+The tools never load the plugin themselves. Without it a Modifier runs its changes through cmds
+while the undo queue is on, so they are undone together, and with doIt otherwise.
+
+'''
+import pytest
+
+import maya.api.OpenMaya as om2
+from world_space_loc_core import Modifier, Utils, WorldSpaceLoc
+
+
+@pytest.fixture
+def undo(cmds):
+    cmds.undoInfo(state=True)
+    return cmds
+
+
+def test_apply_without_plugin(cmds):
+    cmds.createNode('transform', n='ctrl')
+    with Modifier() as mod:
+        mod.set_attr('ctrl', 'tx', 2.0)
+
+    assert cmds.getAttr('ctrl.tx') == 2.0
+    assert 'loadPlugin' not in cmds.report()
+
+
+def test_bake_without_plugin(cmds):
+    cmds.createNode('transform', n='ctrl')
+    assert Utils.get_loc_type() == 'locator'
+
+    WorldSpaceLoc().bake_loc(False, nodes=['ctrl'])
+    assert cmds.objExists('WSpace_loc_ctrl')
+    assert 'loadPlugin' not in cmds.report()
+
+
+def test_undo_without_plugin(undo):
+    undo.createNode('transform', n='ctrl')
+    with Modifier() as mod:
+        mod.set_attr('ctrl', 'tx', 2.0)
+        loc = mod.create_node('transform', 'loc')
+        mod.lock_attr(loc, ['v'], lock=True)
+
+    assert undo.getAttr('ctrl.tx') == 2.0 and undo.objExists('loc')
+    undo.undo()
+    assert undo.getAttr('ctrl.tx') == 0.0 and not undo.objExists('loc')
+    assert undo.objExists('ctrl')
+
+    undo.redo()
+    assert undo.getAttr('ctrl.tx') == 2.0 and undo.objExists('loc')
+
+
+def test_undo_bake_without_plugin(undo):
+    undo.createNode('transform', n='ctrl')
+    undo.setKeyframe('ctrl', t=1, v=0.0)
+    undo.setKeyframe('ctrl', t=10, v=5.0)
+
+    Utils.add_undo(WorldSpaceLoc().bake_loc)(False, nodes=['ctrl'])
+    assert undo.objExists('WSpace_loc_ctrl')
+
+    # The locator, its link and its color are in the same undo chunk as the bake
+    undo.undo()
+    assert not undo.objExists('WSpace_loc_ctrl')
+    assert undo.ls('WSpace_*') == []
+
+
+@pytest.fixture
+def plugin(undo, monkeypatch):
+    # Plugin nodes are not modelled by the fake scene, only its commands
+    monkeypatch.setattr(Utils, 'use_plugin_loc', False)
+    assert Modifier.load_plugin() is not None
+    return undo
+
+
+def get_plug(name):
+    sel = om2.MSelectionList()
+    sel.add(name)
+    return sel.getPlug(0)
+
+
+def test_undo_keys_with_plugin(plugin):
+    plugin.createNode('transform', n='ctrl')
+    plugin.setKeyframe('ctrl', at='tx', t=1, v=1.0)
+    times = om2.MTimeArray([om2.MTime(t) for t in [1, 2, 3]])
+
+    with Modifier() as mod:
+        mod.set_attr('ctrl', 'ty', 2.0)
+        mod.add_keys(get_plug('ctrl.tx'), times, [3.0, 4.0, 5.0])
+        mod.add_keys(get_plug('ctrl.tz'), times, [6.0, 7.0, 8.0])
+
+    assert plugin.report()['wslApplyModifier']['count'] == 1
+    assert [plugin.getAttr('ctrl.tx', t=t) for t in [1, 2, 3]] == [3.0, 4.0, 5.0]
+
+    # Keys on the existing curve and on the new one go back with the attribute
+    plugin.undo()
+    assert plugin.getAttr('ctrl.ty') == 0.0
+    assert plugin.keyframe('ctrl.tx', q=True) == [1] and plugin.getAttr('ctrl.tx', t=2) == 1.0
+    assert plugin.keyframe('ctrl.tz', q=True) is None
+
+    plugin.redo()
+    assert plugin.getAttr('ctrl.ty') == 2.0
+    assert [plugin.getAttr('ctrl.tz', t=t) for t in [1, 2, 3]] == [6.0, 7.0, 8.0]
+
+
+def test_failed_modifier_restores_keys(cmds):
+    cmds.createNode('transform', n='ctrl')
+    cmds.setKeyframe('ctrl', at='tx', t=1, v=1.0)
+
+    with pytest.raises(RuntimeError):
+        with Modifier() as mod:
+            mod.add_keys(get_plug('ctrl.tx'), om2.MTimeArray([om2.MTime(2)]), [4.0], keep=True)
+            raise RuntimeError('failed')
+    assert cmds.keyframe('ctrl.tx', q=True) == [1]
+
+
+def test_undo_native_bake_ctrl(plugin):
+    plugin.createNode('transform', n='ctrl')
+    plugin.setKeyframe('ctrl', at='tx', t=1, v=0.0)
+    plugin.setKeyframe('ctrl', at='tx', t=10, v=5.0)
+    wsl = WorldSpaceLoc()
+    wsl.bake_loc(True, nodes=['ctrl'])
+    wsl.point_loc(False, nodes=['ctrl'])
+    constr = plugin.ls(type='pointConstraint')
+    assert constr
+
+    wsl.bake_ctrl(True, native=True, nodes=['ctrl'])
+    assert plugin.ls(type='pointConstraint') == []
+    assert plugin.keyframe('ctrl.ty', q=True)
+
+    # Deleting the constraint and writing the keys is one undo step
+    plugin.undo()
+    assert plugin.ls(type='pointConstraint') == constr
+    assert plugin.keyframe('ctrl.tx', q=True) == [1, 10]
+    assert plugin.keyframe('ctrl.ty', q=True) is None
+
+    plugin.redo()
+    assert plugin.ls(type='pointConstraint') == []
+    assert plugin.keyframe('ctrl.ty', q=True)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+'''
+PoseCache storage and invalidation through the nodes each cached node depends on.
+
+'''
+import pytest
+
+pytest.importorskip('numpy')
+
+import maya.api.OpenMaya as om2
+from world_space_loc_core import PoseCache, MatrixBake, Utils
+
+
+@pytest.fixture
+def cache(cmds):
+    cache = PoseCache()
+    cache.add_callbacks()
+    yield cache
+    cache.clear()
+    cache.remove_callbacks()
+
+
+@pytest.fixture
+def rig(cmds):
+    '''
+    grp|ctrl keyed on tx, loc constrained to a target under its own group, and an unrelated node.
+
+    '''
+    cmds.createNode('transform', n='grp')
+    cmds.createNode('transform', n='ctrl', p='grp')
+    cmds.setKeyframe('ctrl', at='tx', t=1, v=0.0)
+    cmds.setKeyframe('ctrl', at='tx', t=10, v=9.0)
+    cmds.createNode('transform', n='target_grp')
+    cmds.createNode('transform', n='target', p='target_grp')
+    cmds.createNode('transform', n='loc')
+    cmds.parentConstraint('target', 'loc')
+    cmds.createNode('transform', n='other')
+    return dict((name, Utils.get_paths([name])[0]) for name in ['ctrl', 'loc', 'other'])
+
+
+def fill(cache, paths, frames=(1.0, 2.0, 3.0)):
+    for path in paths:
+        cache.put(path, list(frames), MatrixBake.sample([path], list(frames))[0])
+
+
+def test_put_inserts_in_place(cache, rig):
+    path = rig['ctrl']
+    fill(cache, [path], [2.0, 4.0])
+    fill(cache, [path], [5.0, 6.0])
+    fill(cache, [path], [1.0, 3.0, 4.0])
+
+    frames = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    assert list(cache.entries[om2.MObjectHandle(path.node()).hashCode()]['frames']) == frames
+    for m, ref in zip(cache.get(path, frames), MatrixBake.sample([path], frames)[0]):
+        assert m.isEquivalent(ref)
+    assert cache.size == len(frames) * 17 * 8
+    assert cache.get(path, [7.0]) == [None]
+
+
+@pytest.mark.parametrize('name, kept', [('ctrl', ['loc', 'other']), ('grp', ['loc', 'other']),
+                                        ('target', ['ctrl', 'other']), ('target_grp', ['ctrl', 'other']),
+                                        ('other', ['ctrl', 'loc'])])
+def test_attribute_change_drops_dependents(cmds, cache, rig, name, kept):
+    fill(cache, rig.values())
+    cmds.setAttr('{}.ty'.format(name), 1.0)
+    assert sorted(e['path'].split('|')[-1] for e in cache.entries.values()) == kept
+
+
+def test_curve_edit_drops_dependents(cmds, cache, rig):
+    fill(cache, rig.values())
+    cmds.setKeyframe('ctrl', at='tx', t=5, v=1.0)
+    assert sorted(e['path'].split('|')[-1] for e in cache.entries.values()) == ['loc', 'other']
+
+
+def test_connection_and_parent_drop_dependents(cmds, cache, rig):
+    fill(cache, rig.values())
+    cmds.connectAttr('other.tx', 'target.tz')
+    assert sorted(e['path'].split('|')[-1] for e in cache.entries.values()) == ['ctrl', 'other']
+
+    cmds.parent('grp', 'other')
+    assert sorted(e['path'].split('|')[-1] for e in cache.entries.values()) == ['other']
+
+
+def test_drop_clears_the_index(cmds, cache, rig):
+    fill(cache, [rig['ctrl']])
+    assert cache.sources
+    cmds.setAttr('grp.tx', 1.0)
+    assert not cache.entries and not cache.sources
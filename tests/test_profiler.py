@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+'''
+The profiler only wraps the cmds of the module while an operation runs.
+
+'''
+import pytest
+
+import world_space_loc_core
+from world_space_loc_core import Profiler, WorldSpaceLoc
+
+
+@pytest.fixture
+def profiler(cmds):
+    profiler = Profiler()
+    profiler.start()
+    yield profiler
+    profiler.stop()
+
+
+def test_operation_calls(cmds, profiler):
+    cmds.createNode('transform', n='ctrl')
+    assert world_space_loc_core.cmds is cmds
+
+    WorldSpaceLoc().bake_loc(False, nodes=['ctrl'])
+    record = profiler.records[-1]
+    assert record['operation'] == 'bake_loc'
+    assert record['commands']['parentConstraint'][0] == 1
+    assert world_space_loc_core.cmds is cmds
+
+
+def test_restored_when_raising(cmds, profiler):
+    @Profiler.wrap
+    def fail():
+        assert world_space_loc_core.cmds is not cmds
+        world_space_loc_core.cmds.ls()
+        raise RuntimeError('fail')
+
+    with pytest.raises(RuntimeError):
+        fail()
+    assert world_space_loc_core.cmds is cmds
+    assert profiler.records[-1]['commands']['ls'][0] == 1
+
+
+def test_stop_keeps_cmds(cmds, profiler):
+    profiler.stop()
+    assert world_space_loc_core.cmds is cmds
+    assert Profiler.active is None
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+Registry links, and the migration of the nodes named before the links existed.
+
+'''
+import pytest
+
+from world_space_loc_core import Registry, WorldSpaceLoc
+
+
+@pytest.fixture
+def registry(cmds):
+    registry = Registry()
+    registry.add_callbacks()
+    yield registry
+    registry.remove_callbacks()
+
+
+@pytest.fixture
+def legacy(cmds):
+    '''
+    Nodes of an older scene, found by name only: a parent constrained control and an aim setup.
+
+    '''
+    for ctrl in ['ctrl', 'aim_ctrl']:
+        cmds.createNode('transform', n=ctrl)
+    cmds.spaceLocator(n='WSpace_loc_ctrl')
+    cmds.parentConstraint('WSpace_loc_ctrl', 'ctrl', n='WSpace_loc_ctrl_parentConstraint')
+
+    cmds.createNode('transform', n='WSpace_loc_aim_grp_aim_ctrl')
+    cmds.spaceLocator(n='WSpace_loc_aim_target_aim_ctrl')
+    cmds.spaceLocator(n='WSpace_loc_aim_up_aim_ctrl')
+    cmds.parent('WSpace_loc_aim_target_aim_ctrl', 'WSpace_loc_aim_up_aim_ctrl', 'WSpace_loc_aim_grp_aim_ctrl')
+    cmds.parentConstraint('aim_ctrl', 'WSpace_loc_aim_grp_aim_ctrl', n='WSpace_loc_aim_ctrl_parentConstraint')
+    # Left over by an interrupted aim bake, its control does not exist
+    cmds.parentConstraint('aim_ctrl', 'WSpace_loc_aim_target_aim_ctrl', n='WSpace_loc_aim_ctrltarget_aimConstraint')
+
+
+@pytest.mark.parametrize('name, parsed', [('WSpace_loc_ctrl', ('ctrl', 'WSpace_loc_')),
+                                          ('|grp|WSpace_loc_aim_up_ctrl', ('ctrl', 'WSpace_loc_aim_up_')),
+                                          ('WSpace_loc_ctrl_orientConstraint', ('ctrl', '_orientConstraint')),
+                                          ('WSpace_loc_', None), ('ctrl', None)])
+def test_parse_legacy(name, parsed):
+    assert Registry.parse_legacy(name) == parsed
+
+
+def test_migrate_links_legacy_nodes(cmds, registry, legacy):
+    cmds.reset()
+    registry.load()
+    # One ls for the links, one for the legacy names
+    assert cmds.report()['ls']['count'] == 2
+
+    wsl = WorldSpaceLoc()
+    assert registry.get('ctrl', wsl.prefix) == '|WSpace_loc_ctrl'
+    assert registry.get('ctrl', wsl.parent_constr) == '|ctrl|WSpace_loc_ctrl_parentConstraint'
+    assert registry.get('aim_ctrl', wsl.aim_grp_prefix) == '|WSpace_loc_aim_grp_aim_ctrl'
+    assert registry.get('aim_ctrl', wsl.aim_prefix) == '|WSpace_loc_aim_grp_aim_ctrl|WSpace_loc_aim_target_aim_ctrl'
+    assert registry.get('aim_ctrl', wsl.up_prefix) == '|WSpace_loc_aim_grp_aim_ctrl|WSpace_loc_aim_up_aim_ctrl'
+    assert registry.get('aim_ctrl', wsl.aim_constr) is None
+
+    # Saved with the scene, the next load has nothing left to migrate
+    assert registry.migrate() == 0
+
+
+def test_migrated_scene_is_used(cmds, registry, legacy):
+    wsl = WorldSpaceLoc()
+    wsl.registry = registry
+    wsl.delete_constr(nodes=['ctrl'])
+    assert not cmds.objExists('WSpace_loc_ctrl_parentConstraint')
+    assert registry.get('ctrl', wsl.prefix) == '|WSpace_loc_ctrl'
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''
+Refresh bakes re-key the dirty intervals on the grid and in the windows of the first bake.
+
+'''
+import pytest
+
+from world_space_loc_core import BakeTracker, Utils
+
+
+@pytest.fixture
+def tracker(cmds):
+    tracker = BakeTracker()
+    tracker.add_callbacks()
+    yield tracker
+    tracker.remove_callbacks()
+
+
+@pytest.fixture
+def baked(cmds, tracker):
+    '''
+    A control keyed in x, tracked as a quarter frame bake of two windows.
+
+    '''
+    cmds.createNode('transform', n='ctrl')
+    for frame, value in [(1, 0.0), (10, 5.0), (15.5, 2.0), (30, 8.0)]:
+        cmds.setKeyframe('ctrl', at='tx', t=frame, v=value)
+    cmds.spaceLocator(n='loc')
+    tracker.track(Utils.get_paths(['ctrl']), ['loc'], False, 4, [(1, 12), (20, 30)])
+    return Utils.get_paths(['ctrl'])
+
+
+def loc_times(cmds):
+    return cmds.keyframe('loc', at='tx', q=True) or []
+
+
+def test_refresh_keeps_rate_grid(cmds, tracker, baked):
+    cmds.setKeyframe('ctrl', at='tx', t=10, v=6.0)
+    count = tracker.refresh(baked)
+
+    # The key at 10 dirties 1 to 15.5, clipped to the first window
+    times = loc_times(cmds)
+    assert count == len(times) == 45
+    assert times[0] == 1 and times[-1] == 12
+    assert all(t * 4 == int(t * 4) for t in times)
+    assert cmds.getAttr('loc.tx', t=10) == pytest.approx(6.0)
+
+
+def test_refresh_stays_in_windows(cmds, tracker, baked):
+    cmds.setKeyframe('ctrl', at='tx', t=15.5, v=4.0)
+    tracker.refresh(baked)
+
+    # 10 to 30 is dirty, 12 to 20 was never baked
+    times = loc_times(cmds)
+    assert not [t for t in times if 12 < t < 20]
+    assert [t for t in times if t <= 12] == [10 + i / 4.0 for i in range(9)]
+    assert [t for t in times if t >= 20] == [20 + i / 4.0 for i in range(41)]
+
+
+def test_refresh_keeps_other_edits(cmds, tracker, baked):
+    cmds.createNode('transform', n='other')
+    for frame, value in [(1, 0.0), (30, 3.0)]:
+        cmds.setKeyframe('other', at='ty', t=frame, v=value)
+    cmds.spaceLocator(n='other_loc')
+    other = Utils.get_paths(['other'])
+    tracker.track(other, ['other_loc'], False, 1, [(1, 30)])
+
+    cmds.setKeyframe('ctrl', at='tx', t=10, v=6.0)
+    cmds.setKeyframe('other', at='ty', t=30, v=4.0)
+    assert tracker.refresh(baked)
+
+    # The edit of the other control is still found by its own refresh
+    assert tracker.refresh(other) == 30
+    assert tracker.refresh(other) == 0
+    assert not tracker.edited
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+'''
+Headless batch baking of world space locators or controls over many scenes.
+Scenes are spread across a pool of long-lived mayapy worker processes: each worker initializes
+Maya and loads the plugin once, then takes the next scene of a shared queue until it is empty.
+A worker that dies fails its scene only, a new one takes the remaining scenes.
+
+usage:
+    mayapy world_space_batch.py shot_010.ma shot_020.ma -n "*:*_ctrl" -r 1001 1100 -w 4 --report batch.json
+
+With --fake the workers run the same bakes on plain python with world_space_fake, to test the
+scheduler without Maya. The fake scenes hold transforms named ctrl_0, ctrl_1...
+
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from collections import deque
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+RESULT_TAG = 'WSL_BATCH_RESULT:'
+
+
+class Batch(object):
+
+    @classmethod
+    def get_parser(cls):
+        parser = argparse.ArgumentParser(description='Bake world space locators or controls over many scenes.')
+        parser.add_argument('scenes', nargs='*', help='Scene files.')
+        parser.add_argument('-n', '--nodes', nargs='+', required=True,
+                            help='Name patterns of the controls to bake, every transform would match "*".')
+        parser.add_argument('-r', '--range', nargs=2, type=float, metavar=('START', 'END'),
+                            help='Frame range, the scene playback range by default.')
+        parser.add_argument('-m', '--mode', choices=['loc', 'ctrl'], default='loc',
+                            help='Bake locators (loc) or bake the constrained controls (ctrl).')
+        parser.add_argument('--every-frame', action='store_true', help='Bake every frame.')
+        parser.add_argument('--native', action='store_true', help='Use the matrix sampling engine.')
+        parser.add_argument('-o', '--output', help='Save the scenes to this folder instead of in place.')
+        parser.add_argument('--no-save', action='store_true', help='Do not save the scenes.')
+        parser.add_argument('-w', '--workers', type=int, default=2, help='Number of worker processes.')
+        parser.add_argument('--mayapy', default=os.environ.get('MAYAPY', 'mayapy'), help='mayapy executable.')
+        parser.add_argument('--report', help='Write the per scene results to this json file.')
+        parser.add_argument('--fake', action='store_true', help='Run the workers with FakeCmds.')
+        parser.add_argument('--fake-nodes', type=int, default=100, help='Number of nodes in a fake scene.')
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+        return parser
+
+    @classmethod
+    def get_cmds(cls, args):
+        '''
+        Get maya.cmds, or a FakeCmds scene installed as the maya modules when faking.
+        args: Parsed arguments.
+        return: cmds module or FakeCmds.
+
+        '''
+        if args.fake:
+            from world_space_fake import FakeMaya, FakeCmds
+            return FakeMaya.install(FakeCmds(nodes=['ctrl_{}'.format(i) for i in range(args.fake_nodes)]), qt=False)
+
+        import maya.standalone
+        maya.standalone.initialize(name='python')
+        from maya import cmds
+        # Loaded once per worker, the bakes fall back to cmds without it
+        from world_space_loc_core import Modifier
+        Modifier.load_plugin()
+        return cmds
+
+    @classmethod
+    def bake(cls, cmds, nodes, args):
+        '''
+        Run the bake on the nodes of the open scene.
+        cmds: cmds module or FakeCmds.
+        nodes: Nodes to bake.
+        args: Parsed arguments.
+
+        '''
+        from world_space_loc_core import WorldSpaceLoc
+        every_frame = not args.every_frame
+        wsl = WorldSpaceLoc()
+        if args.mode == 'loc':
+            wsl.bake_loc(every_frame=every_frame, native=args.native, nodes=nodes)
+        else:
+            wsl.bake_ctrl(every_frame=every_frame, native=args.native, nodes=nodes)
+
+    @classmethod
+    def run_scene(cls, cmds, scene, args):
+        '''
+        Open a scene, bake the matching nodes and save it. Runs inside the worker process.
+        cmds: cmds module or FakeCmds.
+        scene: Scene file.
+        args: Parsed arguments.
+        return: Result dict.
+
+        '''
+        result = {'scene': scene, 'ok': False, 'nodes': 0, 'error': None, 'pid': os.getpid(),
+                  'time_init': 0.0, 'time_open': 0.0, 'time_bake': 0.0, 'time_save': 0.0}
+        try:
+            start = time.time()
+            cmds.file(scene, o=True, f=True)
+            result['time_open'] = time.time() - start
+
+            nodes = cmds.ls(args.nodes, type='transform')
+            result['nodes'] = len(nodes)
+
+            start = time.time()
+            if nodes:
+                if args.range:
+                    playback = [cmds.playbackOptions(q=True, ast=True), cmds.playbackOptions(q=True, aet=True)]
+                    cmds.playbackOptions(ast=args.range[0], aet=args.range[1])
+                cls.bake(cmds, nodes, args)
+                if args.range:
+                    cmds.playbackOptions(ast=playback[0], aet=playback[1])
+            result['time_bake'] = time.time() - start
+
+            start = time.time()
+            if not args.no_save:
+                if args.output:
+                    cmds.file(rename=os.path.join(args.output, os.path.basename(scene)))
+                cmds.file(save=True, f=True)
+            result['time_save'] = time.time() - start
+            result['ok'] = True
+
+        except Exception as e:
+            result['error'] = '{}: {}'.format(type(e).__name__, e)
+
+        return result
+
+    @classmethod
+    def serve(cls, args):
+        '''
+        Worker loop: bake the scenes read from stdin, one json string per line, until stdin is closed.
+        Each result is written to stdout on a line starting with RESULT_TAG.
+        args: Parsed arguments.
+
+        '''
+        start = time.time()
+        cmds = cls.get_cmds(args)
+        init = time.time() - start
+
+        for line in iter(sys.stdin.readline, ''):
+            if not line.strip():
+                continue
+            result = cls.run_scene(cmds, json.loads(line), args)
+            # Maya and the plugin are only initialized for the first scene of the worker
+            result['time_init'], init = init, 0.0
+            sys.stdout.write('\n{}{}\n'.format(RESULT_TAG, json.dumps(result)))
+            sys.stdout.flush()
+
+    @classmethod
+    def get_worker_cmd(cls, args):
+        '''
+        Build the command line of a worker process from the parsed arguments, without the scenes.
+        args: Parsed arguments.
+        return: List of arguments.
+
+        '''
+        executable = sys.executable if args.fake else args.mayapy
+        cmd = [executable, os.path.abspath(__file__), '--worker', '--mode', args.mode, '--nodes'] + args.nodes
+        if args.range:
+            cmd += ['--range'] + [repr(f) for f in args.range]
+        if args.every_frame:
+            cmd.append('--every-frame')
+        if args.native:
+            cmd.append('--native')
+        if args.output:
+            cmd += ['--output', args.output]
+        if args.no_save:
+            cmd.append('--no-save')
+        if args.fake:
+            cmd += ['--fake', '--fake-nodes', str(args.fake_nodes)]
+        return cmd
+
+    @classmethod
+    def run_worker(cls, scenes, results, args):
+        '''
+        Feed the scenes of the queue to one worker process until the queue is empty.
+        A new process is started when the previous one died.
+        scenes: Queue of (index, scene file).
+        results: List of result dicts, filled at the index of each scene.
+        args: Parsed arguments.
+
+        '''
+        worker = None
+        try:
+            while True:
+                try:
+                    index, scene = scenes.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is None:
+                    worker = Worker(cls.get_worker_cmd(args))
+                results[index] = worker.run(scene)
+                if not worker.alive():
+                    worker = None
+        finally:
+            if worker is not None:
+                worker.close()
+
+    @classmethod
+    def schedule(cls, scenes, args):
+        '''
+        Bake the scenes with at most args.workers worker processes, each one taking scenes from a
+        shared queue.
+        scenes: Scene files.
+        args: Parsed arguments.
+        return: List of result dicts, in the order of the scenes.
+
+        '''
+        pending = queue.Queue()
+        for item in enumerate(scenes):
+            pending.put(item)
+
+        results = [None] * len(scenes)
+        threads = [threading.Thread(target=cls.run_worker, args=(pending, results, args))
+                   for _ in range(min(max(args.workers, 1), len(scenes)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @classmethod
+    def summary(cls, results, elapsed):
+        '''
+        Format the results as a table.
+        results: Result dicts.
+        elapsed: Total wall time.
+        return: Text.
+
+        '''
+        lines = ['{:<40} {:>4} {:>6} {:>8} {:>8} {:>8}'.format('scene', 'ok', 'nodes', 'open', 'bake', 'total')]
+        for r in results:
+            lines.append('{:<40} {:>4} {:>6} {:>8.2f} {:>8.2f} {:>8.2f}'.format(
+                os.path.basename(r['scene'])[-40:], 'yes' if r['ok'] else 'no', r.get('nodes', 0),
+                r.get('time_open', 0.0), r.get('time_bake', 0.0), r.get('time_total', 0.0)))
+            if r.get('error'):
+                lines.append('    {}'.format(r['error'].strip().splitlines()[-1]))
+
+        failed = len([r for r in results if not r['ok']])
+        lines.append('{} scenes, {} failed, {:.2f}s'.format(len(results), failed, elapsed))
+        return '\n'.join(lines)
+
+    @classmethod
+    def main(cls, argv=None):
+        parser = cls.get_parser()
+        args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+        if args.worker:
+            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+            cls.serve(args)
+            return 0
+        if not args.scenes:
+            parser.error('no scene files')
+
+        start = time.time()
+        results = cls.schedule(args.scenes, args)
+        elapsed = time.time() - start
+
+        print(cls.summary(results, elapsed))
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump({'elapsed': elapsed, 'results': results}, f, indent=2)
+
+        return 0 if all(r['ok'] for r in results) else 1
+
+
+class Worker(object):
+    '''
+    Long-lived worker process, fed one scene at a time through its stdin.
+    Its stderr goes to stdout, the last lines are kept to report a crash.
+
+    '''
+    def __init__(self, cmd):
+        '''
+        cmd: Worker command line, see Batch.get_worker_cmd.
+
+        '''
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.code = None
+
+    def alive(self):
+        return self.proc is not None
+
+    def run(self, scene):
+        '''
+        Bake a scene and wait for its result.
+        scene: Scene file.
+        return: Result dict.
+
+        '''
+        start = time.time()
+        output = deque(maxlen=50)
+        result = None
+        try:
+            self.proc.stdin.write((json.dumps(scene) + '\n').encode('utf-8'))
+            self.proc.stdin.flush()
+            for line in iter(self.proc.stdout.readline, b''):
+                line = line.decode('utf-8', 'replace').rstrip()
+                if line.startswith(RESULT_TAG):
+                    result = json.loads(line[len(RESULT_TAG):])
+                    break
+                output.append(line)
+        except (IOError, OSError) as e:
+            output.append(str(e))
+
+        if result is None:
+            self.close()
+            result = {'scene': scene, 'ok': False, 'nodes': 0,
+                      'error': 'worker exited with {}: {}'.format(self.code, '\n'.join(output)[-2000:])}
+
+        result['time_total'] = time.time() - start
+        return result
+
+    def close(self):
+        '''
+        Close the stdin of the process so it exits, and wait for it.
+
+        '''
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.code = self.proc.wait()
+        self.proc.stdout.close()
+        self.proc = None
+
+
+if __name__ == '__main__':
+    sys.exit(Batch.main())
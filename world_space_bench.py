@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmarks of the WorldSpaceLoc operations on synthetic rigs: wall time and Maya command counts
+per operation, for every combination of control count and frame range.
+
+usage:
+    python world_space_bench.py -c 10 100 -f 100 1000 -k 0.5 --latency 0.0001 -o bench.json
+    python world_space_bench.py --maya -o bench_maya.json
+    python world_space_bench.py -o bench.json --compare bench_old.json
+
+By default the operations run on FakeScene, with --maya they run under mayapy.
+The import time of world_space_loc_core is measured in a fresh interpreter, and whether it loaded Qt.
+
+The draw scenarios refresh the viewport over the frame range, with wslLocator shapes drawn by
+one wslLocatorDraw node or with spaceLocator shapes. They need a viewport, so they only run from
+the script editor of an interactive Maya session, for example:
+    import world_space_bench
+    world_space_bench.Bench.main(['--maya', '-s', 'draw_loc', 'draw_spaceloc', '-c', '1000', '-k', '0'])
+
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import platform
+import subprocess
+
+RESULT_TAG = 'WSL_BENCH_IMPORT:'
+
+
+class Rig(object):
+    '''
+    Synthetic rig: animated curve controls, part of them already constrained to baked locators.
+
+    '''
+    def __init__(self, controls, frames, constrained, key_step=10):
+        '''
+        controls: Number of controls.
+        frames: Length of the frame range.
+        constrained: Number of controls constrained to world space locators.
+        key_step: Frames between the keys of the controls.
+
+        '''
+        self.controls = controls
+        self.frames = frames
+        self.constrained = min(constrained, controls)
+        self.key_step = key_step
+        self.nodes = []
+
+    def build(self, cmds, wsl):
+        '''
+        Build the rig in a new scene.
+        cmds: maya.cmds or FakeCmds.
+        wsl: WorldSpaceLoc.
+
+        '''
+        cmds.file(new=True, f=True)
+        cmds.playbackOptions(min=1, max=self.frames, ast=1, aet=self.frames)
+
+        self.nodes = []
+        for i in range(self.controls):
+            ctrl = cmds.circle(n='bench_ctrl_{}'.format(i), ch=False)[0]
+            for f in range(1, self.frames + 1, self.key_step):
+                cmds.setKeyframe(ctrl, at='tx', t=f, v=float(f + i))
+                cmds.setKeyframe(ctrl, at='ry', t=f, v=float(f * 2))
+            self.nodes.append(ctrl)
+
+        if self.constrained:
+            wsl.bake_loc(True, nodes=self.nodes[:self.constrained])
+            wsl.parent_loc(False, nodes=self.nodes[:self.constrained])
+
+
+class Bench(object):
+    scenarios = ['bake_loc', 'bake_ctrl', 'bake_aim', 'native_loc', 'native_ctrl', 'native_aim', 'delete_constr',
+                 'select_loc', 'draw_loc', 'draw_spaceloc']
+    # Only measured with a viewport, see has_viewport
+    viewport_scenarios = ['draw_loc', 'draw_spaceloc']
+    # Plugin state before a draw scenario, restored by its teardown
+    plugin_loaded = True
+
+    # Setup of each scenario, not measured
+    @classmethod
+    def setup_bake_aim(cls, cmds, wsl, rig):
+        wsl.aim_loc(nodes=rig.nodes[rig.constrained:])
+
+    setup_native_aim = setup_bake_aim
+
+    @classmethod
+    def setup_select_loc(cls, cmds, wsl, rig):
+        cmds.select(rig.nodes)
+
+    @classmethod
+    def setup_draw_loc(cls, cmds, wsl, rig, plugin=True):
+        # One locator following each control, the plugin is unloaded again by the teardown
+        from world_space_loc_core import Utils, Modifier, Registry
+        cls.plugin_loaded = Modifier.get_plugin() is not None
+        if plugin:
+            Modifier.load_plugin()
+        Utils.use_plugin_loc = plugin
+        locs = Utils.create_locs(rig.nodes, 'bench_draw_', [0] * len(rig.nodes))
+        for ctrl, loc in zip(rig.nodes, locs):
+            cmds.parentConstraint(ctrl, Registry.get_name(loc))
+        cmds.select(cl=True)
+
+    @classmethod
+    def setup_draw_spaceloc(cls, cmds, wsl, rig):
+        cls.setup_draw_loc(cmds, wsl, rig, plugin=False)
+
+    # Restore the state a setup changed
+    @classmethod
+    def teardown_draw_loc(cls, cmds, wsl, rig):
+        from world_space_loc_core import Utils, Modifier
+        Utils.use_plugin_loc = True
+        if not cls.plugin_loaded and Modifier.get_plugin() is not None:
+            cmds.file(new=True, f=True)
+            cmds.unloadPlugin(Modifier.plugin)
+
+    teardown_draw_spaceloc = teardown_draw_loc
+
+    # Measured part of each scenario
+    @classmethod
+    def run_bake_loc(cls, cmds, wsl, rig):
+        wsl.bake_loc(True, nodes=rig.nodes)
+
+    @classmethod
+    def run_bake_ctrl(cls, cmds, wsl, rig):
+        wsl.bake_ctrl(False, nodes=rig.nodes)
+
+    @classmethod
+    def run_bake_aim(cls, cmds, wsl, rig):
+        wsl.bake_aim(True, nodes=rig.nodes)
+
+    @classmethod
+    def run_native_loc(cls, cmds, wsl, rig):
+        wsl.bake_loc(True, native=True, nodes=rig.nodes)
+
+    @classmethod
+    def run_native_ctrl(cls, cmds, wsl, rig):
+        wsl.bake_ctrl(False, native=True, nodes=rig.nodes)
+
+    @classmethod
+    def run_native_aim(cls, cmds, wsl, rig):
+        wsl.bake_aim(True, native=True, nodes=rig.nodes)
+
+    @classmethod
+    def run_delete_constr(cls, cmds, wsl, rig):
+        wsl.delete_constr(nodes=rig.nodes)
+
+    @classmethod
+    def run_select_loc(cls, cmds, wsl, rig):
+        wsl.select_loc()
+
+    @classmethod
+    def run_draw_loc(cls, cmds, wsl, rig):
+        for f in range(1, rig.frames + 1):
+            cmds.currentTime(f, update=True)
+            cmds.refresh(force=True)
+
+    run_draw_spaceloc = run_draw_loc
+
+    @classmethod
+    def get_parser(cls):
+        parser = argparse.ArgumentParser(description='Benchmark the world space locator operations.')
+        parser.add_argument('-s', '--scenarios', nargs='+', choices=cls.scenarios,
+                            default=[s for s in cls.scenarios if s not in cls.viewport_scenarios],
+                            help='Operations to measure, the draw scenarios are only run when asked.')
+        parser.add_argument('-c', '--controls', nargs='+', type=int, default=[10, 50], help='Control counts.')
+        parser.add_argument('-f', '--frames', nargs='+', type=int, default=[100, 500], help='Frame ranges.')
+        parser.add_argument('-k', '--constrained', type=float, default=0.5,
+                            help='Fraction of the controls already constrained.')
+        parser.add_argument('-n', '--repeat', type=int, default=1, help='Runs per scenario, the best is kept.')
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every fake cmds call.')
+        parser.add_argument('--maya', action='store_true', help='Run under mayapy instead of FakeScene.')
+        parser.add_argument('--mayapy', default=os.environ.get('MAYAPY', 'mayapy'), help='mayapy executable.')
+        parser.add_argument('-o', '--output', help='Write the results to this json file.')
+        parser.add_argument('--compare', help='Compare against the results of this json file.')
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help='Time or call count ratio reported as a regression.')
+        parser.add_argument('--import-worker', action='store_true', help=argparse.SUPPRESS)
+        return parser
+
+    @classmethod
+    def get_env(cls, args):
+        '''
+        Get the recorded cmds and the world space module, in FakeScene or in mayapy.
+        args: Parsed arguments.
+        return: Recorder, world_space_loc_core module.
+
+        '''
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from world_space_fake import Recorder, FakeCmds, FakeMaya
+
+        if args.maya:
+            from maya import cmds
+            # Empty until mayapy is initialized, already filled in an interactive session
+            if not hasattr(cmds, 'about'):
+                import maya.standalone
+                maya.standalone.initialize(name='python')
+            recorder = Recorder(cmds)
+        else:
+            # Without the Qt modules, the core must import without them
+            recorder = FakeMaya.install(FakeCmds(latency=args.latency), qt=False)
+
+        import world_space_loc_core
+        world_space_loc_core.cmds = recorder
+        return recorder, world_space_loc_core
+
+    @classmethod
+    def run_scenario(cls, name, rig, cmds, module, repeat=1):
+        '''
+        Build the rig and measure one operation on it.
+        name: Scenario name.
+        rig: Rig.
+        cmds: Recorder.
+        module: world_space_loc_core module.
+        repeat: Runs, the fastest is kept.
+        return: Result dict.
+
+        '''
+        best = None
+        for _ in range(max(repeat, 1)):
+            wsl = module.WorldSpaceLoc()
+            rig.build(cmds, wsl)
+            setup = getattr(cls, 'setup_{}'.format(name), None)
+            if setup:
+                setup(cmds, wsl, rig)
+
+            cmds.reset()
+            start = time.time()
+            getattr(cls, 'run_{}'.format(name))(cmds, wsl, rig)
+            elapsed = time.time() - start
+
+            if best is None or elapsed < best['time']:
+                best = {'scenario': name, 'controls': rig.controls, 'frames': rig.frames,
+                        'constrained': rig.constrained, 'time': elapsed, 'calls': cmds.count(),
+                        'commands': cmds.report()}
+
+            teardown = getattr(cls, 'teardown_{}'.format(name), None)
+            if teardown:
+                teardown(cmds, wsl, rig)
+
+        return best
+
+    @classmethod
+    def has_viewport(cls, cmds, args):
+        '''
+        Check if the draw scenarios can run: in Maya, but not in mayapy.
+        cmds: Recorder.
+        args: Parsed arguments.
+        return: True or False.
+
+        '''
+        return bool(args.maya and not cmds.about(batch=True))
+
+    @classmethod
+    def import_worker(cls, args):
+        '''
+        Time the import of world_space_loc_core. Runs in a fresh interpreter.
+        args: Parsed arguments.
+
+        '''
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        if args.maya:
+            import maya.standalone
+            maya.standalone.initialize(name='python')
+        else:
+            from world_space_fake import FakeMaya
+            FakeMaya.install(qt=False)
+
+        start = time.time()
+        importlib.import_module('world_space_loc_core')
+        elapsed = time.time() - start
+
+        qt = [m for m in sys.modules if m.split('.')[0] in ('PySide2', 'shiboken2')]
+        sys.stdout.write('\n{}{}\n'.format(RESULT_TAG, json.dumps({'time': elapsed, 'qt': bool(qt)})))
+
+    @classmethod
+    def run_import(cls, args):
+        '''
+        Measure the import of world_space_loc_core in a new process.
+        args: Parsed arguments.
+        return: Result dict.
+
+        '''
+        cmd = [sys.executable, os.path.abspath(__file__), '--import-worker'] + (['--maya'] if args.maya else [])
+        out = subprocess.Popen(cmd, stdout=subprocess.PIPE).communicate()[0].decode('utf-8', 'replace')
+
+        result = {'scenario': 'import_core', 'controls': 0, 'frames': 0, 'constrained': 0,
+                  'time': 0.0, 'calls': 0, 'commands': {}, 'qt': None}
+        for line in out.splitlines():
+            if line.startswith(RESULT_TAG):
+                result.update(json.loads(line[len(RESULT_TAG):]))
+        return result
+
+    @classmethod
+    def run(cls, args):
+        cmds, module = cls.get_env(args)
+        viewport = cls.has_viewport(cmds, args)
+        # In an interactive session sys.executable is Maya itself, the import is measured in mayapy only
+        results = [] if viewport else [cls.run_import(args)]
+        for controls in args.controls:
+            for frames in args.frames:
+                rig = Rig(controls, frames, int(controls * args.constrained))
+                for name in args.scenarios:
+                    if name in cls.viewport_scenarios and not viewport:
+                        results.append({'scenario': name, 'controls': controls, 'frames': frames,
+                                        'constrained': rig.constrained, 'time': 0.0, 'calls': 0, 'commands': {},
+                                        'skipped': True})
+                        continue
+                    results.append(cls.run_scenario(name, rig, cmds, module, args.repeat))
+
+        return {'mode': 'maya' if args.maya else 'fake', 'latency': args.latency, 'python': platform.python_version(),
+                'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}
+
+    @classmethod
+    def get_key(cls, result):
+        return result['scenario'], result['controls'], result['frames'], result['constrained']
+
+    @classmethod
+    def compare(cls, old, new, threshold):
+        '''
+        Compare two result sets.
+        old: Baseline results.
+        new: Current results.
+        threshold: Ratio reported as a regression.
+        return: Text, number of regressions.
+
+        '''
+        old_results = dict((cls.get_key(r), r) for r in old['results'])
+        lines = ['{:<14} {:>6} {:>6} {:>9} {:>9} {:>7} {:>8} {:>8}'.format(
+            'scenario', 'ctrls', 'frames', 'old', 'new', 'ratio', 'old cmd', 'new cmd')]
+        regressions = 0
+        for r in new['results']:
+            o = old_results.get(cls.get_key(r))
+            if o is None or r.get('skipped') or o.get('skipped'):
+                continue
+            ratio = r['time'] / o['time'] if o['time'] else 1.0
+            flag = ''
+            # Differences under a millisecond are timer noise
+            if ratio > threshold and r['time'] - o['time'] > 0.001 or r['calls'] > o['calls'] * threshold:
+                flag = ' <<'
+                regressions += 1
+            lines.append('{:<14} {:>6} {:>6} {:>9.4f} {:>9.4f} {:>7.2f} {:>8} {:>8}{}'.format(
+                r['scenario'], r['controls'], r['frames'], o['time'], r['time'], ratio, o['calls'], r['calls'], flag))
+
+        lines.append('{} regressions over {:.2f}x'.format(regressions, threshold))
+        return '\n'.join(lines), regressions
+
+    @classmethod
+    def summary(cls, data):
+        lines = ['{:<14} {:>6} {:>6} {:>6} {:>9} {:>8}'.format('scenario', 'ctrls', 'frames', 'constr', 'time', 'calls')]
+        for r in data['results']:
+            lines.append('{:<14} {:>6} {:>6} {:>6} {:>9.4f} {:>8}'.format(
+                r['scenario'], r['controls'], r['frames'], r['constrained'], r['time'], r['calls']))
+            if r.get('qt'):
+                lines.append('    Qt was imported')
+            if r.get('skipped'):
+                lines.append('    skipped, needs the viewport of an interactive Maya session')
+        return '\n'.join(lines)
+
+    @classmethod
+    def main(cls, argv=None):
+        argv = list(sys.argv[1:] if argv is None else argv)
+        args = cls.get_parser().parse_args(argv)
+
+        if args.maya:
+            try:
+                importlib.import_module('maya.standalone')
+            except ImportError:
+                # Not in mayapy, run the same arguments there
+                try:
+                    return subprocess.call([args.mayapy, os.path.abspath(__file__)] + argv)
+                except OSError:
+                    sys.stderr.write('mayapy not found: {}\n'.format(args.mayapy))
+                    return 1
+
+        if args.import_worker:
+            cls.import_worker(args)
+            return 0
+
+        data = cls.run(args)
+        print(cls.summary(data))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(data, f, indent=2)
+
+        if args.compare:
+            with open(args.compare) as f:
+                text, regressions = cls.compare(json.load(f), data, args.threshold)
+            print(text)
+            return 1 if regressions else 0
+
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(Bench.main())
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+'''
+Batched TRS decomposition of world matrices with NumPy.
+Does not import maya, matrices follow the Maya row vector convention (translation in the last row).
+
+'''
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Decompose(object):
+    # Axis order of each rotateOrder value (xyz, yzx, zxy, xzy, yxz, zyx)
+    ROTATE_ORDERS = [(0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (1, 0, 2), (2, 1, 0)]
+
+    @classmethod
+    def available(cls):
+        '''
+        Check if NumPy can be imported.
+        return: True or False
+
+        '''
+        return np is not None
+
+    @classmethod
+    def to_array(cls, matrices):
+        '''
+        Convert matrices to a (frames x 4 x 4) array.
+        matrices: List of MMatrix or any sequence of 16 floats.
+        return: Float64 array.
+
+        '''
+        return np.array([list(m) for m in matrices], dtype=np.float64).reshape(-1, 4, 4)
+
+    @classmethod
+    def parity(cls, ro):
+        '''
+        Get the sign of a rotate order permutation.
+        ro: Rotate order.
+        return: 1.0 for even orders, -1.0 for odd orders.
+
+        '''
+        return 1.0 if ro in (0, 1, 2) else -1.0
+
+    @classmethod
+    def rotation_matrix(cls, r, ro=0):
+        '''
+        Build rotation matrices from euler angles.
+        r: (frames x 3) array of x, y, z angles in radians.
+        ro: Rotate order.
+        return: (frames x 3 x 3) array.
+
+        '''
+        r = np.atleast_2d(r)
+        c = np.cos(r)
+        s = np.sin(r)
+        one = np.ones(len(r))
+        zero = np.zeros(len(r))
+
+        axes = [np.stack([one, zero, zero, zero, c[:, 0], s[:, 0], zero, -s[:, 0], c[:, 0]], -1),
+                np.stack([c[:, 1], zero, -s[:, 1], zero, one, zero, s[:, 1], zero, c[:, 1]], -1),
+                np.stack([c[:, 2], s[:, 2], zero, -s[:, 2], c[:, 2], zero, zero, zero, one], -1)]
+        i, j, k = cls.ROTATE_ORDERS[ro]
+
+        return np.matmul(np.matmul(axes[i].reshape(-1, 3, 3), axes[j].reshape(-1, 3, 3)),
+                         axes[k].reshape(-1, 3, 3))
+
+    @classmethod
+    def euler(cls, rot, ro=0):
+        '''
+        Extract euler angles from rotation matrices.
+        rot: (frames x 3 x 3) array of orthonormal rotation matrices.
+        ro: Rotate order.
+        return: (frames x 3) array of x, y, z angles in radians.
+
+        '''
+        i, j, k = cls.ROTATE_ORDERS[ro]
+        sign = cls.parity(ro)
+
+        sb = np.clip(-sign * rot[:, i, k], -1.0, 1.0)
+        b = np.arcsin(sb)
+        a = np.arctan2(sign * rot[:, j, k], rot[:, k, k])
+        c = np.arctan2(sign * rot[:, i, j], rot[:, i, i])
+
+        # Gimbal lock, keep the first axis and zero the last one
+        lock = np.abs(sb) > 1.0 - 1e-10
+        if lock.any():
+            a[lock] = np.arctan2(-sign * rot[lock, k, j], rot[lock, j, j])
+            c[lock] = 0.0
+
+        r = np.empty((len(rot), 3))
+        r[:, i] = a
+        r[:, j] = b
+        r[:, k] = c
+        return r
+
+    @classmethod
+    def decompose(cls, matrices, ro=0):
+        '''
+        Decompose matrices into translate, rotate, scale and shear.
+        matrices: (frames x 4 x 4) array.
+        ro: Rotate order.
+        return: Translate, rotate (radians), scale and shear (xy, xz, yz) arrays, each (frames x 3).
+
+        '''
+        m = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+        t = m[:, 3, :3].copy()
+        rows = m[:, :3, :3].copy()
+
+        # Gram-Schmidt on the rows, the same order MTransformationMatrix uses
+        sx = np.linalg.norm(rows[:, 0], axis=-1)
+        rows[:, 0] /= sx[:, None]
+        xy = np.einsum('ij,ij->i', rows[:, 0], rows[:, 1])
+        rows[:, 1] -= xy[:, None] * rows[:, 0]
+        sy = np.linalg.norm(rows[:, 1], axis=-1)
+        rows[:, 1] /= sy[:, None]
+        xz = np.einsum('ij,ij->i', rows[:, 0], rows[:, 2])
+        rows[:, 2] -= xz[:, None] * rows[:, 0]
+        yz = np.einsum('ij,ij->i', rows[:, 1], rows[:, 2])
+        rows[:, 2] -= yz[:, None] * rows[:, 1]
+        sz = np.linalg.norm(rows[:, 2], axis=-1)
+        rows[:, 2] /= sz[:, None]
+
+        # Negative determinant, flip the scale on the last axis
+        neg = np.linalg.det(rows) < 0.0
+        sz[neg] *= -1.0
+        rows[neg, 2] *= -1.0
+
+        # The shear is scaled by the axis it leans, sy for xy and sz for xz and yz
+        s = np.stack([sx, sy, sz], -1)
+        sh = np.stack([xy / sy, xz / sz, yz / sz], -1)
+        return t, cls.euler(rows, ro), s, sh
+
+    @classmethod
+    def compose(cls, t, r, s, ro=0):
+        '''
+        Build matrices from translate, rotate and scale arrays.
+        t: (frames x 3) translate.
+        r: (frames x 3) rotate in radians.
+        s: (frames x 3) scale.
+        ro: Rotate order.
+        return: (frames x 4 x 4) array.
+
+        '''
+        t = np.atleast_2d(t)
+        m = np.zeros((len(t), 4, 4))
+        m[:, :3, :3] = np.atleast_2d(s)[:, :, None] * cls.rotation_matrix(r, ro)
+        m[:, 3, :3] = t
+        m[:, 3, 3] = 1.0
+        return m
+
+    @classmethod
+    def euler_filter(cls, r, ro=0):
+        '''
+        Remove euler flips, the vectorized counterpart of MEulerRotation.setToClosestSolution.
+        r: (frames x 3) array of x, y, z angles in radians.
+        ro: Rotate order.
+        return: Filtered copy of r.
+
+        '''
+        r = np.array(r, dtype=np.float64)
+        if len(r) < 2:
+            return r
+
+        i, j, k = cls.ROTATE_ORDERS[ro]
+        pi = np.pi
+
+        # A jump of about pi on the first and last axis at once is the alternate solution
+        d = np.diff(r, axis=0)
+        d = (d + pi) % (2.0 * pi) - pi
+        flip = (np.abs(d[:, i]) > pi * 0.5) & (np.abs(d[:, k]) > pi * 0.5)
+        alt = np.concatenate([[False], np.cumsum(flip) % 2 == 1])
+
+        r[alt, i] += pi
+        r[alt, j] = pi - r[alt, j]
+        r[alt, k] += pi
+
+        return np.unwrap(r, axis=0)
+
+    @classmethod
+    def localize(cls, matrices, parent_matrices):
+        '''
+        Multiply world matrices by the parent inverse, to bake into a non-world parent.
+        matrices: (frames x 4 x 4) world matrices.
+        parent_matrices: (frames x 4 x 4) or (4 x 4) parent world matrices.
+        return: (frames x 4 x 4) local matrices.
+
+        '''
+        return np.matmul(np.asarray(matrices), np.linalg.inv(np.asarray(parent_matrices)))
+
+    @classmethod
+    def unpivot(cls, matrices, ro=0, pivots=None, axis=None, orient=None):
+        '''
+        Decompose local matrices against the full transform stack of a transform,
+        sp^-1 * s * sh * sp * spt * rp^-1 * ra * r * jo * rp * rpt * t, instead of t * r * s.
+        The scale and shear are read from the matrices, the pivots only move the translate.
+        matrices: (frames x 4 x 4) local matrices.
+        ro: Rotate order of r.
+        pivots: (4 x 3) or (frames x 4 x 3) scale pivot, scale pivot translate, rotate pivot and
+        rotate pivot translate, all zero when None.
+        axis: (3 x 3) or (frames x 3 x 3) rotate axis rotation, identity when None.
+        orient: (3 x 3) or (frames x 3 x 3) joint orient rotation, identity when None.
+        return: Translate, rotate (radians), scale and shear arrays, like decompose.
+
+        '''
+        m = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+        t, r, s, sh = cls.decompose(m, ro)
+        if pivots is None and axis is None and orient is None:
+            return t, r, s, sh
+
+        # ra * r * jo, the rotation left once the scale and shear are removed
+        rot = cls.rotation_matrix(r, ro)
+        if pivots is not None:
+            pivots = np.broadcast_to(np.asarray(pivots, dtype=np.float64), (len(m), 4, 3))
+            sp, spt, rp, rpt = np.moveaxis(pivots, 1, 0)
+            scale = np.matmul(m[:, :3, :3], np.transpose(rot, (0, 2, 1)))
+            # Translation of sp^-1 * s * sh * sp * spt * rp^-1, carried by the rotation
+            pre = sp + spt - rp - np.einsum('fi,fij->fj', sp, scale)
+            t = t - np.einsum('fi,fij->fj', pre, rot) - rp - rpt
+
+        if axis is not None:
+            rot = np.matmul(np.transpose(np.broadcast_to(axis, (len(m), 3, 3)), (0, 2, 1)), rot)
+        if orient is not None:
+            rot = np.matmul(rot, np.transpose(np.broadcast_to(orient, (len(m), 3, 3)), (0, 2, 1)))
+        if axis is not None or orient is not None:
+            r = cls.euler(rot, ro)
+
+        return t, r, s, sh
+
+    @classmethod
+    def transform_points(cls, matrices, points):
+        '''
+        Move points fixed in the space of objects along their world matrices, for all objects in one call.
+        matrices: One (frames x 4 x 4) array or list of MMatrix per object, same frame count for all.
+        points: One list of (x, y, z) points per object, same point count for all.
+        return: (objects x points x frames x 3) array of world positions.
+
+        '''
+        matrices = np.stack([m if isinstance(m, np.ndarray) else cls.to_array(m) for m in matrices])
+        points = np.asarray(points, dtype=np.float64)
+        points = np.concatenate([points, np.ones(points.shape[:-1] + (1,))], -1)
+
+        return np.einsum('okj,ofjl->okfl', points, matrices)[..., :3]
+
+    @classmethod
+    def channels(cls, matrices, ro=0, parent_matrices=None, pivots=None, axis=None, orient=None):
+        '''
+        Decompose matrices to the nine transform channels in one call.
+        matrices: (frames x 4 x 4) array or list of MMatrix.
+        ro: Rotate order.
+        parent_matrices: Optional parent world matrices.
+        pivots, axis, orient: Optional transform stack of the object, see unpivot.
+        return: (9 x frames) array in tx, ty, tz, rx, ry, rz, sx, sy, sz order.
+
+        '''
+        if not isinstance(matrices, np.ndarray):
+            matrices = cls.to_array(matrices)
+        if parent_matrices is not None:
+            if not isinstance(parent_matrices, np.ndarray):
+                parent_matrices = cls.to_array(parent_matrices)
+            matrices = cls.localize(matrices, parent_matrices)
+
+        t, r, s, _ = cls.unpivot(matrices, ro, pivots, axis, orient)
+        return np.concatenate([t, cls.euler_filter(r, ro), s], -1).T
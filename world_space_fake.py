@@ -0,0 +1,2180 @@
+# -*- coding: utf-8 -*-
+'''
+Stand-in for maya.cmds and maya.api.OpenMaya outside of Maya, used by the batch scheduler and the benchmarks.
+Every cmds call is recorded. FakeScene keeps a minimal dependency graph (nodes, dag hierarchy, attributes,
+connections, keys) shared by FakeCmds and the OpenMaya classes below, enough to run the WorldSpaceLoc
+operations. Values are not evaluated like Maya does, only the amount of work is comparable.
+World matrices are composed from the channels with NumPy, so the native matrix bakes run too.
+The undo queue starts off, once turned on with undoInfo the cmds changes and the undoable plugin commands
+are recorded, so undo and redo can be checked. loadPlugin runs the commands of a plugin, not its nodes.
+
+'''
+import os
+import sys
+import math
+import time
+import types
+import fnmatch
+import importlib
+from functools import partial
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Recorder(object):
+    '''
+    Record the count and time of every call made through it. A call goes to the cmd_<name>
+    method when there is one, then to the wrapped module, and returns None otherwise.
+
+    '''
+    def __init__(self, module=None, latency=0.0):
+        '''
+        module: Module to forward the calls to, like maya.cmds.
+        latency: Seconds spent in every call.
+
+        '''
+        self.module = module
+        self.latency = latency
+        self.calls = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name.startswith('cmd_'):
+            raise AttributeError(name)
+
+        func = getattr(self, 'cmd_{}'.format(name), None)
+        if func is None and self.module is not None:
+            func = getattr(self.module, name)
+
+        def call(*args, **kwargs):
+            start = time.time()
+            if self.latency:
+                time.sleep(self.latency)
+            try:
+                return func(*args, **kwargs) if func else None
+            finally:
+                stat = self.calls.setdefault(name, [0, 0.0])
+                stat[0] += 1
+                stat[1] += time.time() - start
+        return call
+
+    def reset(self):
+        self.calls = {}
+
+    def report(self):
+        '''
+        Get the recorded calls.
+        return: Dict of command name to {'count', 'time'}.
+
+        '''
+        return dict((name, {'count': c, 'time': t}) for name, (c, t) in self.calls.items())
+
+    def count(self):
+        return sum(c for c, t in self.calls.values())
+
+
+class FakeNode(object):
+    # Attributes of each node type: name, kind, default
+    TRANSFORM = [(a, 'double', 0.0) for a in ['tx', 'ty', 'tz', 'rx', 'ry', 'rz']] + \
+                [(a, 'double', 1.0) for a in ['sx', 'sy', 'sz']] + \
+                [('v', 'bool', True), ('rotateOrder', 'enum', 0), ('worldMatrix', 'matrix', None)]
+    SHAPE = [('v', 'bool', True)]
+    LOCATOR = [(a, 'double', 0.0) for a in ['lpx', 'lpy', 'lpz']] + \
+              [(a, 'double', 1.0) for a in ['lsx', 'lsy', 'lsz']]
+    COMMON = [('message', 'message', None), ('overrideEnabled', 'bool', False), ('overrideColor', 'int', 0)]
+
+    COMPOUNDS = {'t': ['tx', 'ty', 'tz'], 'r': ['rx', 'ry', 'rz'], 's': ['sx', 'sy', 'sz'],
+                 'translate': ['tx', 'ty', 'tz'], 'rotate': ['rx', 'ry', 'rz'], 'scale': ['sx', 'sy', 'sz'],
+                 'lp': ['lpx', 'lpy', 'lpz'], 'ls': ['lsx', 'lsy', 'lsz']}
+    ALIASES = {'translateX': 'tx', 'translateY': 'ty', 'translateZ': 'tz',
+               'rotateX': 'rx', 'rotateY': 'ry', 'rotateZ': 'rz',
+               'scaleX': 'sx', 'scaleY': 'sy', 'scaleZ': 'sz', 'visibility': 'v', 'ro': 'rotateOrder'}
+
+    CONSTRAINTS = ['parentConstraint', 'pointConstraint', 'orientConstraint', 'aimConstraint']
+
+    # Function sets of each node type
+    FN = {'transform': ['kDagNode', 'kTransform'],
+          'joint': ['kDagNode', 'kTransform', 'kJoint'],
+          'locator': ['kDagNode', 'kShape', 'kLocator'],
+          'nurbsCurve': ['kDagNode', 'kShape', 'kNurbsCurve'],
+          'pairBlend': ['kPairBlend']}
+
+    def __init__(self, scene, name, node_type, parent=None):
+        self.scene = scene
+        self.name = name
+        self.type = node_type
+        self.parent = parent
+        self.children = []
+        self.alive = True
+
+        scene.counter += 1
+        self.hash = scene.counter
+
+        self.kinds = {}
+        self.values = {}
+        self.flags = {}
+        self.keys = {}
+        self.curves = {}
+        self.targets = []
+
+        attrs = list(self.COMMON)
+        fn = self.FN.get(node_type, [])
+        if node_type in self.CONSTRAINTS:
+            fn = ['kDagNode', 'kTransform', 'kConstraint']
+        if 'kTransform' in fn:
+            attrs += self.TRANSFORM
+        if 'kShape' in fn:
+            attrs += self.SHAPE
+        if 'kLocator' in fn:
+            attrs += self.LOCATOR
+
+        self.fn = set(fn + ['kDependencyNode'])
+        for attr, kind, default in attrs:
+            self.add_attr(attr, kind, default)
+
+    def add_attr(self, attr, kind, default=None):
+        self.kinds[attr] = kind
+        self.values[attr] = default
+        self.flags[attr] = [False, kind == 'double', False]
+
+    def get_attr(self, attr):
+        '''
+        Resolve an attribute name.
+        attr: Short, long or compound name.
+        return: Attribute name, None if the node does not have it.
+
+        '''
+        attr = self.ALIASES.get(attr, attr)
+        if attr in self.kinds or attr in self.COMPOUNDS and self.COMPOUNDS[attr][0] in self.kinds:
+            return attr
+        return None
+
+    def is_dag(self):
+        return 'kDagNode' in self.fn
+
+    def get_curve(self, attr):
+        if attr not in self.curves:
+            self.curves[attr] = FakeCurve(self, attr)
+        return self.curves[attr]
+
+    def path(self):
+        if not self.is_dag():
+            return self.name
+
+        names = []
+        node = self
+        while node:
+            names.append(node.name)
+            node = node.parent
+        return '|' + '|'.join(reversed(names))
+
+    def value(self, attr, frame=None):
+        '''
+        Get the value of an attribute, following constraints and keys.
+        attr: Attribute name.
+        frame: Frame, the current values when None.
+        return: Value.
+
+        '''
+        src = self.scene.connections.get((self, attr))
+        if src and src[0].targets:
+            return src[0].targets[0].value(attr, frame)
+
+        keys = self.keys.get(attr)
+        if keys and frame is not None:
+            times = sorted(keys)
+            if frame <= times[0]:
+                return keys[times[0]]
+            for ids in range(1, len(times)):
+                if frame <= times[ids]:
+                    t0, t1 = times[ids - 1], times[ids]
+                    w = (frame - t0) / float(t1 - t0)
+                    return keys[t0] * (1.0 - w) + keys[t1] * w
+            return keys[times[-1]]
+
+        return self.values.get(attr)
+
+    def matrix(self, frame=None):
+        '''
+        Compose the world matrix from the channels of the node and its parents, rotations in degrees.
+        frame: Frame, the current values when None.
+        return: MMatrix.
+
+        '''
+        tm = MTransformationMatrix()
+        if 'kTransform' in self.fn:
+            angles = [math.radians(self.value(a, frame)) for a in self.COMPOUNDS['r']]
+            tm.setScale([self.value(a, frame) for a in self.COMPOUNDS['s']])
+            tm.setRotation(MEulerRotation(*angles, order=int(self.value('rotateOrder') or 0)))
+            tm.setTranslation([self.value(a, frame) for a in self.COMPOUNDS['t']])
+
+        matrix = tm.asMatrix()
+        return matrix * self.parent.matrix(frame) if self.parent else matrix
+
+
+class FakeCurve(object):
+    '''
+    Anim curve of a keyed attribute, only reached through MItDependencyGraph and MFnAnimCurve.
+
+    '''
+    def __init__(self, node, attr):
+        self.node = node
+        self.attr = attr
+        self.name = '{}_{}'.format(node.name, attr)
+        self.type = 'animCurveTL'
+        self.fn = set(['kDependencyNode', 'kAnimCurve', 'kAnimCurveTimeToDistance'])
+        self.kinds = {}
+        self.alive = True
+
+        node.scene.counter += 1
+        self.hash = node.scene.counter
+
+    @property
+    def keys(self):
+        return self.node.keys.get(self.attr, {})
+
+    def get_attr(self, attr):
+        return attr if attr == 'output' else None
+
+
+class FakeScene(object):
+    '''
+    Node graph of the fake scene. The current scene is used by the OpenMaya classes.
+
+    '''
+    current = None
+
+    def __init__(self):
+        self.counter = 0
+        self.nodes = {}
+        self.connections = {}
+        self.selection = []
+        self.file = ''
+        self.playback = {'min': 1.0, 'max': 120.0, 'ast': 1.0, 'aet': 120.0}
+
+        self.callbacks = {}
+        self.callback_id = 0
+
+        # Every node ever created, compared by capture and diff
+        self.every = []
+        self.undo_state = False
+        self.undo_queue = []
+        self.redo_queue = []
+        self.chunk = None
+        self.chunk_depth = 0
+        FakeScene.current = self
+
+    def add_callback(self, kind, func):
+        self.callback_id += 1
+        self.callbacks[self.callback_id] = (kind, func)
+        return self.callback_id
+
+    def remove_callback(self, callback_id):
+        self.callbacks.pop(callback_id, None)
+
+    def notify(self, kind, *args):
+        for k, func in list(self.callbacks.values()):
+            if k == kind:
+                func(*args)
+
+    def new(self):
+        for node in self.nodes.values():
+            node.alive = False
+        self.nodes = {}
+        self.connections = {}
+        self.selection = []
+        self.every = []
+        self.undo_queue = []
+        self.redo_queue = []
+        self.notify('new')
+
+    def unique_name(self, name):
+        if name not in self.nodes:
+            return name
+
+        base = name.rstrip('0123456789')
+        i = 1
+        while '{}{}'.format(base, i) in self.nodes:
+            i += 1
+        return '{}{}'.format(base, i)
+
+    def create(self, node_type, name=None, parent=None):
+        '''
+        Create a node.
+        node_type: Node type.
+        name: Node name, made unique.
+        parent: Parent FakeNode.
+        return: FakeNode.
+
+        '''
+        name = self.unique_name(name or '{}1'.format(node_type))
+        node = FakeNode(self, name, node_type, parent)
+        if parent:
+            parent.children.append(node)
+        self.nodes[name] = node
+        self.every.append(node)
+        self.notify('added', MObject(node))
+        return node
+
+    def find(self, name):
+        '''
+        Find a node by short name, full path or plug name.
+        name: Name.
+        return: FakeNode, None if it does not exist.
+
+        '''
+        name = name.split('.')[0]
+        return self.nodes.get(name.split('|')[-1])
+
+    def get(self, name):
+        node = self.find(name)
+        if node is None:
+            raise ValueError('No object matches name: {}'.format(name))
+        return node
+
+    def rename(self, node, name):
+        del self.nodes[node.name]
+        node.name = self.unique_name(name)
+        self.nodes[node.name] = node
+        return node.name
+
+    def reparent(self, node, parent=None):
+        if node.parent:
+            node.parent.children.remove(node)
+        node.parent = parent
+        if parent:
+            parent.children.append(node)
+        self.notify('parent', MDagPath(node), MDagPath(parent))
+
+    def delete(self, node):
+        if not node.alive:
+            return
+
+        for child in list(node.children):
+            self.delete(child)
+
+        self.notify('removed', MObject(node))
+        self.reparent(node)
+        for dst, src in list(self.connections.items()):
+            if dst[0] is node or src[0] is node:
+                del self.connections[dst]
+
+        node.alive = False
+        self.nodes.pop(node.name, None)
+        self.selection = [n for n in self.selection if n is not node]
+
+    def revive(self, node, parent=None):
+        '''
+        Bring back a deleted node, without its connections.
+        node: FakeNode.
+        parent: Parent FakeNode.
+
+        '''
+        if node.alive:
+            return
+
+        node.alive = True
+        self.nodes[node.name] = node
+        self.reparent(node, parent)
+
+    # Undo
+    MISSING = object()
+
+    def capture(self):
+        '''
+        Copy the state of every node and the connections, compared by diff.
+        return: Dict of FakeNode to state, dict of connections.
+
+        '''
+        nodes = {}
+        for node in self.every:
+            nodes[node] = {'alive': node.alive, 'name': node.name, 'parent': node.parent,
+                           'children': list(node.children), 'kinds': dict(node.kinds), 'values': dict(node.values),
+                           'flags': dict((a, list(f)) for a, f in node.flags.items()),
+                           'keys': dict((a, dict(k)) for a, k in node.keys.items())}
+        return nodes, dict(self.connections)
+
+    def diff(self, before):
+        '''
+        Compare the scene with a capture. Nodes created since then only change their alive state.
+        before: Result of capture.
+        return: List of (FakeNode, container, key, old, new), old or new is MISSING when the key did not exist.
+
+        '''
+        nodes, connections = before
+        after, after_connections = self.capture()
+        changes = []
+
+        def compare(node, container, old, new):
+            for key in set(old) | set(new):
+                a, b = old.get(key, self.MISSING), new.get(key, self.MISSING)
+                if a is not b and (a is self.MISSING or b is self.MISSING or a != b):
+                    changes.append((node, container, key, a, b))
+
+        for node, state in after.items():
+            if node not in nodes:
+                changes.append((node, node.__dict__, 'alive', False, True))
+                continue
+
+            old = nodes[node]
+            compare(node, node.__dict__, dict((f, old[f]) for f in ['alive', 'name', 'parent', 'children']),
+                    dict((f, state[f]) for f in ['alive', 'name', 'parent', 'children']))
+            for field in ['kinds', 'values', 'flags', 'keys']:
+                compare(node, getattr(node, field), old[field], state[field])
+
+        compare(None, self.connections, connections, after_connections)
+        return changes
+
+    def restore(self, changes, index):
+        '''
+        Put back one side of a diff.
+        changes: Result of diff.
+        index: 0 for the state before, 1 for the state after.
+
+        '''
+        touched = set()
+        for node, container, key, old, new in changes:
+            value = (old, new)[index]
+            if value is self.MISSING:
+                container.pop(key, None)
+            else:
+                container[key] = type(value)(value) if isinstance(value, (list, dict)) else value
+            if node is not None:
+                touched.add(node)
+
+        for node in touched:
+            for name in [n for n, v in self.nodes.items() if v is node]:
+                del self.nodes[name]
+            if node.alive:
+                self.nodes[node.name] = node
+
+    def record(self, before):
+        '''
+        Add the changes made since a capture to the undo queue.
+        before: Result of capture.
+
+        '''
+        changes = self.diff(before)
+        if changes:
+            self.add_undo(lambda: self.restore(changes, 0), lambda: self.restore(changes, 1))
+
+    def add_undo(self, undo, redo):
+        if not self.undo_state:
+            return
+
+        self.redo_queue = []
+        if self.chunk is None:
+            self.undo_queue.append([(undo, redo)])
+        else:
+            self.chunk.append((undo, redo))
+
+    def open_chunk(self):
+        self.chunk_depth += 1
+        if self.chunk_depth == 1:
+            self.chunk = []
+
+    def close_chunk(self):
+        self.chunk_depth = max(self.chunk_depth - 1, 0)
+        if not self.chunk_depth and self.chunk is not None:
+            if self.chunk:
+                self.undo_queue.append(self.chunk)
+            self.chunk = None
+
+    def undo(self):
+        if self.undo_queue:
+            chunk = self.undo_queue.pop()
+            for undo, redo in reversed(chunk):
+                undo()
+            self.redo_queue.append(chunk)
+
+    def redo(self):
+        if self.redo_queue:
+            chunk = self.redo_queue.pop()
+            for undo, redo in chunk:
+                redo()
+            self.undo_queue.append(chunk)
+
+    def attribute_changed(self, node, attr, msg, other=None):
+        '''
+        Run the attribute changed callbacks of a node.
+        node: FakeNode.
+        attr: Attribute name.
+        msg: MNodeMessage flags.
+        other: Other MPlug of a connection.
+
+        '''
+        self.notify(('attribute', node), msg, MPlug(node, attr), other or MPlug())
+
+    def connect(self, src, src_attr, dst, dst_attr):
+        self.connections[(dst, dst_attr)] = (src, src_attr)
+        self.notify('connection', MPlug(src, src_attr), MPlug(dst, dst_attr), True)
+        self.attribute_changed(dst, dst_attr, MNodeMessage.kConnectionMade, MPlug(src, src_attr))
+
+    def disconnect(self, dst, dst_attr):
+        src = self.connections.pop((dst, dst_attr), None)
+        if src:
+            self.notify('connection', MPlug(*src), MPlug(dst, dst_attr), False)
+            self.attribute_changed(dst, dst_attr, MNodeMessage.kConnectionBroken, MPlug(*src))
+
+
+class FakeCmds(Recorder):
+    '''
+    maya.cmds on a FakeScene.
+
+    '''
+    channels = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz', 'sx', 'sy', 'sz']
+
+    # Commands changing the scene, recorded in the undo queue once it is on
+    UNDOABLE = set(['createNode', 'spaceLocator', 'circle', 'rename', 'parent', 'delete', 'parentConstraint',
+                    'pointConstraint', 'orientConstraint', 'aimConstraint', 'setAttr', 'addAttr', 'connectAttr',
+                    'disconnectAttr', 'removeMultiInstance', 'setKeyframe', 'keyframe', 'cutKey', 'bakeResults'])
+
+    def __init__(self, nodes=None, latency=0.0, scene=None):
+        '''
+        nodes: Names of transforms added to the fake scene, and to every scene opened later.
+        latency: Seconds spent in every call.
+        scene: FakeScene, a new one by default.
+
+        '''
+        super(FakeCmds, self).__init__(None, latency)
+        self.scene = scene or FakeScene()
+        self.plugins = {}
+        self.scene_nodes = list(nodes or [])
+        for n in self.scene_nodes:
+            self.scene.create('transform', n)
+
+    def __getattr__(self, name):
+        call = super(FakeCmds, self).__getattr__(name)
+        if name not in self.UNDOABLE:
+            return call
+
+        def undoable(*args, **kwargs):
+            scene = self.scene
+            if not scene.undo_state or kwargs.get('q') or kwargs.get('query'):
+                return call(*args, **kwargs)
+
+            before = scene.capture()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                scene.record(before)
+        return undoable
+
+    def names(self, args):
+        names = []
+        for a in args:
+            names.extend(a if isinstance(a, (list, tuple)) else [a])
+        return [str(n) for n in names]
+
+    # Scene and selection
+    def cmd_ls(self, *args, **kwargs):
+        if kwargs.get('sl') or kwargs.get('selection'):
+            return [n.name for n in self.scene.selection if n.alive]
+
+        patterns = self.names(args)
+        nodes = list(self.scene.nodes.values())
+        if patterns:
+            result = []
+            for n in nodes:
+                for p in patterns:
+                    name, _, attr = p.partition('.')
+                    if fnmatch.fnmatchcase(n.name, name.split('|')[-1]) and (not attr or attr in n.kinds):
+                        result.append(n)
+                        break
+            nodes = result
+
+        node_type = kwargs.get('type') or kwargs.get('typ')
+        if node_type:
+            nodes = [n for n in nodes if n.type == node_type or
+                     node_type == 'transform' and 'kTransform' in n.fn]
+
+        return [n.path() if kwargs.get('l') or kwargs.get('long') else n.name for n in nodes]
+
+    def cmd_select(self, *args, **kwargs):
+        if kwargs.get('cl') or kwargs.get('clear'):
+            self.scene.selection = []
+            return
+
+        nodes = [self.scene.get(n) for n in self.names(args)]
+        if kwargs.get('add'):
+            self.scene.selection.extend(nodes)
+        else:
+            self.scene.selection = nodes
+
+    def cmd_objExists(self, name):
+        return self.scene.find(name) is not None
+
+    def cmd_file(self, path=None, **kwargs):
+        if kwargs.get('q') or kwargs.get('query'):
+            return self.scene.file
+        if kwargs.get('new') or kwargs.get('n'):
+            self.scene.new()
+            self.scene.file = ''
+        if path and (kwargs.get('o') or kwargs.get('open')):
+            # Every file holds the same transforms, like the first scene
+            self.scene.new()
+            for n in self.scene_nodes:
+                self.scene.create('transform', n)
+            self.scene.file = path
+            self.scene.notify('open')
+        if kwargs.get('rename'):
+            self.scene.file = kwargs['rename']
+        return self.scene.file
+
+    def cmd_playbackOptions(self, **kwargs):
+        query = kwargs.pop('q', False) or kwargs.pop('query', False)
+        if query:
+            for key in kwargs:
+                return self.scene.playback.get(key)
+
+        for key, value in kwargs.items():
+            self.scene.playback[key] = float(value)
+
+    def cmd_pluginInfo(self, name=None, **kwargs):
+        return name in self.plugins
+
+    def cmd_loadPlugin(self, path, **kwargs):
+        '''
+        Import a plugin module found on sys.path and run its initializePlugin, see MFnPlugin.
+
+        '''
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name not in self.plugins:
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                raise RuntimeError('Plugin not found: {}'.format(path))
+            module.initializePlugin(self)
+            self.plugins[name] = module
+        return [name]
+
+    def cmd_unloadPlugin(self, name, **kwargs):
+        module = self.plugins.pop(name, None)
+        if module is not None:
+            module.uninitializePlugin(self)
+
+    def run_command(self, creator, *args, **kwargs):
+        cmd = creator()
+        result = cmd.doIt(args)
+        if cmd.isUndoable():
+            self.scene.add_undo(cmd.undoIt, cmd.redoIt)
+        return result
+
+    # Undo queue
+    def cmd_undoInfo(self, *args, **kwargs):
+        scene = self.scene
+        if kwargs.get('q') or kwargs.get('query'):
+            return scene.undo_state
+
+        if kwargs.get('openChunk'):
+            scene.open_chunk()
+        if kwargs.get('closeChunk'):
+            scene.close_chunk()
+        if 'stateWithoutFlush' in kwargs:
+            scene.undo_state = bool(kwargs['stateWithoutFlush'])
+        if 'state' in kwargs:
+            scene.undo_state = bool(kwargs['state'])
+            if not scene.undo_state:
+                scene.undo_queue = []
+                scene.redo_queue = []
+
+    def cmd_undo(self):
+        self.scene.undo()
+
+    def cmd_redo(self):
+        self.scene.redo()
+
+    def cmd_about(self, **kwargs):
+        return True
+
+    def cmd_evaluationManager(self, *args, **kwargs):
+        if kwargs.get('q') or kwargs.get('query'):
+            return ['parallel'] if kwargs.get('mode') else False
+
+    def cmd_cycleCheck(self, **kwargs):
+        return True
+
+    def cmd_autoKeyframe(self, **kwargs):
+        return False
+
+    # Nodes
+    def cmd_createNode(self, node_type, n=None, p=None, **kwargs):
+        return self.scene.create(node_type, n, self.scene.get(p) if p else None).name
+
+    def cmd_spaceLocator(self, n='locator1', **kwargs):
+        loc = self.scene.create('transform', n)
+        self.scene.create('locator', '{}Shape'.format(loc.name), loc)
+        return [loc.name]
+
+    def cmd_circle(self, n='nurbsCircle1', **kwargs):
+        crv = self.scene.create('transform', n)
+        self.scene.create('nurbsCurve', '{}Shape'.format(crv.name), crv)
+        return [crv.name] if kwargs.get('ch') is False else [crv.name, 'makeNurbCircle1']
+
+    def cmd_rename(self, old, new):
+        return self.scene.rename(self.scene.get(old), new)
+
+    def cmd_parent(self, *args, **kwargs):
+        names = self.names(args)
+        parent = None
+        if not kwargs.get('w') and not kwargs.get('world'):
+            parent = self.scene.get(names.pop())
+
+        nodes = [self.scene.get(n) for n in names]
+        for node in nodes:
+            self.scene.reparent(node, parent)
+        return [n.name for n in nodes]
+
+    def cmd_delete(self, *args, **kwargs):
+        nodes = [self.scene.find(n) for n in self.names(args)]
+        if kwargs.get('cn') or kwargs.get('constraints'):
+            constr_lst = []
+            for node in nodes:
+                if node is None:
+                    continue
+                if 'kConstraint' in node.fn:
+                    constr_lst.append(node)
+                constr_lst.extend([c for c in node.children if 'kConstraint' in c.fn])
+            nodes = constr_lst
+
+        for node in nodes:
+            if node is not None:
+                self.scene.delete(node)
+
+    def constraint(self, node_type, attrs, args, kwargs):
+        names = self.names(args)
+        driven = self.scene.get(names[-1])
+        name = kwargs.get('n') or kwargs.get('name') or '{}_{}1'.format(driven.name, node_type)
+        constr = self.scene.create(node_type, name, driven)
+        constr.targets = [self.scene.get(n) for n in names[:-1]]
+        for attr in attrs:
+            self.scene.connect(constr, attr, driven, attr)
+        return [constr.name]
+
+    def cmd_parentConstraint(self, *args, **kwargs):
+        return self.constraint('parentConstraint', self.channels[:6], args, kwargs)
+
+    def cmd_pointConstraint(self, *args, **kwargs):
+        return self.constraint('pointConstraint', self.channels[:3], args, kwargs)
+
+    def cmd_orientConstraint(self, *args, **kwargs):
+        return self.constraint('orientConstraint', self.channels[3:6], args, kwargs)
+
+    def cmd_aimConstraint(self, *args, **kwargs):
+        return self.constraint('aimConstraint', self.channels[3:6], args, kwargs)
+
+    # Attributes
+    def split(self, name):
+        node, _, attr = name.partition('.')
+        node = self.scene.get(node)
+        resolved = node.get_attr(attr)
+        if resolved is None:
+            raise ValueError('No object matches name: {}'.format(name))
+        return node, resolved
+
+    def cmd_getAttr(self, name, **kwargs):
+        node, attr = self.split(name)
+        if attr in FakeNode.COMPOUNDS:
+            return [tuple(node.value(a, kwargs.get('t')) for a in FakeNode.COMPOUNDS[attr])]
+        return node.value(attr, kwargs.get('t'))
+
+    def cmd_setAttr(self, name, *values, **kwargs):
+        node, attr = self.split(name)
+        attrs = FakeNode.COMPOUNDS.get(attr, [attr])
+        if kwargs.get('type') == 'matrix':
+            values = [MMatrix(values)]
+        for a in attrs:
+            flags = node.flags[a]
+            for ids, flag in enumerate(['l', 'k', 'cb']):
+                if flag in kwargs:
+                    flags[ids] = bool(kwargs[flag])
+        for a, v in zip(attrs, values):
+            node.values[a] = v
+            self.scene.attribute_changed(node, a, MNodeMessage.kAttributeSet)
+
+    def cmd_addAttr(self, node, ln=None, at=None, dt=None, **kwargs):
+        node = self.scene.get(node)
+        node.add_attr(ln, 'message' if at == 'message' else dt or at or 'double')
+
+    def cmd_attributeQuery(self, attr, n=None, ex=False, **kwargs):
+        return self.scene.get(n).get_attr(attr) is not None
+
+    def cmd_connectAttr(self, src, dst, **kwargs):
+        src_node, src_attr = self.split(src)
+        dst_node, dst_attr = self.split(dst)
+        self.scene.connect(src_node, src_attr, dst_node, dst_attr)
+
+    def cmd_disconnectAttr(self, src, dst, **kwargs):
+        self.scene.disconnect(*self.split(dst))
+
+    def cmd_removeMultiInstance(self, name, **kwargs):
+        # Array plugs are not modelled
+        self.split(name)
+
+    # Keys
+    def cmd_setKeyframe(self, *args, **kwargs):
+        value = kwargs.get('v')
+        frame = kwargs.get('t')
+        for name in self.names(args):
+            node = self.scene.get(name)
+            attrs = kwargs.get('at') or name.partition('.')[2] or self.channels
+            attrs = [attrs] if isinstance(attrs, str) else attrs
+            for attr in [node.get_attr(a) for a in attrs]:
+                v = node.value(attr, frame) if value is None else value
+                node.keys.setdefault(attr, {})[frame] = v
+                node.values[attr] = v
+                self.scene.notify('curves', [MObject(node.get_curve(attr))])
+
+    def cmd_keyframe(self, *args, **kwargs):
+        if kwargs.get('e') or kwargs.get('edit'):
+            first, last = kwargs['index']
+            for name in self.names(args):
+                node, attr = self.split(name)
+                keys = node.keys.get(attr, {})
+                for t in sorted(keys)[first:last + 1]:
+                    keys[t] = kwargs['valueChange']
+                self.scene.notify('curves', [MObject(node.get_curve(attr))])
+            return
+
+        names = self.names(args)
+        if kwargs.get('n') or kwargs.get('name'):
+            return []
+
+        start, end = kwargs.get('t', (None, None))
+        times = set()
+        for name in names:
+            node = self.scene.get(name)
+            attr = node.get_attr(name.partition('.')[2]) if '.' in name else None
+            for a, keys in node.keys.items():
+                if attr is None or a == attr:
+                    times.update(t for t in keys if (start is None or t >= start) and (end is None or t <= end))
+        return sorted(times) or None
+
+    def cmd_cutKey(self, *args, **kwargs):
+        start, end = kwargs.get('t', (None, None))
+        for name in self.names(args):
+            node = self.scene.get(name)
+            attrs = kwargs.get('at') or name.partition('.')[2] or list(node.keys)
+            attrs = [attrs] if isinstance(attrs, str) else attrs
+            for attr in [node.get_attr(a) for a in attrs]:
+                keys = node.keys.get(attr, {})
+                for t in [t for t in keys if (start is None or t >= start) and (end is None or t <= end)]:
+                    del keys[t]
+                self.scene.notify('curves', [MObject(node.get_curve(attr))])
+
+    def cmd_bakeResults(self, *args, **kwargs):
+        nodes = [self.scene.get(n) for n in self.names(args)]
+        ranges = kwargs.get('t', (self.scene.playback['ast'], self.scene.playback['aet']))
+        keys = kwargs.get('sr', [False, 0])[0]
+
+        # Several time ranges, one per sampled frame, the keys outside them stay with pok
+        if isinstance(ranges, list):
+            for node in nodes:
+                for attr in self.channels:
+                    values = dict((f, node.value(attr, f)) for f, _ in ranges)
+                    keys = node.keys.get(attr, {}) if kwargs.get('pok') else {}
+                    keys.update(values)
+                    node.keys[attr] = keys
+            return
+
+        start, end = ranges
+        for node in nodes:
+            frames = range(int(start), int(end) + 1)
+            if keys:
+                drivers = set(c.targets[0] for c in node.children if c.targets) or set([node])
+                times = set([start, end])
+                for driver in drivers:
+                    for k in driver.keys.values():
+                        times.update(t for t in k if start <= t <= end)
+                frames = sorted(times)
+
+            for attr in self.channels:
+                node.keys[attr] = dict((f, node.value(attr, f)) for f in frames)
+
+
+# OpenMaya classes on FakeScene.current
+class MFn(object):
+    kDependencyNode = 'kDependencyNode'
+    kDagNode = 'kDagNode'
+    kTransform = 'kTransform'
+    kJoint = 'kJoint'
+    kShape = 'kShape'
+    kLocator = 'kLocator'
+    kNurbsCurve = 'kNurbsCurve'
+    kConstraint = 'kConstraint'
+    kPairBlend = 'kPairBlend'
+    kAnimCurve = 'kAnimCurve'
+    kAnimCurveTimeToDistance = 'kAnimCurveTimeToDistance'
+    kWorld = 'kWorld'
+    kInvalid = 'kInvalid'
+    kNumericAttribute = 'kNumericAttribute'
+    kUnitAttribute = 'kUnitAttribute'
+    kEnumAttribute = 'kEnumAttribute'
+    kTypedAttribute = 'kTypedAttribute'
+    kMessageAttribute = 'kMessageAttribute'
+
+
+class MObject(object):
+
+    def __init__(self, node=None):
+        self.node = node.node if isinstance(node, MObject) else node
+
+    def isNull(self):
+        return self.node is None
+
+    def hasFn(self, fn):
+        return self.node is not None and fn in self.node.fn
+
+    def __eq__(self, other):
+        return isinstance(other, MObject) and self.node is other.node
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return id(self.node)
+
+
+MObject.kNullObj = MObject()
+
+
+class MObjectHandle(object):
+
+    def __init__(self, obj):
+        self.obj = MObject(obj)
+
+    def hashCode(self):
+        return self.obj.node.hash if self.obj.node else 0
+
+    def isValid(self):
+        return self.obj.node is not None and self.obj.node.alive
+
+    def isAlive(self):
+        return self.isValid()
+
+    def object(self):
+        return self.obj
+
+
+class MDagPath(object):
+
+    def __init__(self, node=None):
+        self.obj = MObject(node.node() if isinstance(node, MDagPath) else node)
+
+    @staticmethod
+    def getAPathTo(obj):
+        return MDagPath(obj)
+
+    def node(self):
+        return self.obj
+
+    def fullPathName(self):
+        return self.obj.node.path()
+
+    def partialPathName(self):
+        return self.obj.node.name
+
+    def length(self):
+        return len(self.obj.node.path().split('|')) - 1 if self.obj.node else 0
+
+    def hasFn(self, fn):
+        return self.obj.hasFn(fn)
+
+    def instanceNumber(self):
+        return 0
+
+    def inclusiveMatrix(self):
+        return self.obj.node.matrix()
+
+    def inclusiveMatrixInverse(self):
+        return self.inclusiveMatrix().inverse()
+
+    def exclusiveMatrix(self):
+        parent = self.obj.node.parent
+        return parent.matrix() if parent else MMatrix()
+
+    def exclusiveMatrixInverse(self):
+        return self.exclusiveMatrix().inverse()
+
+    def pop(self):
+        self.obj = MObject(self.obj.node.parent)
+
+    def __eq__(self, other):
+        return isinstance(other, MDagPath) and self.obj == other.obj
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class MSelectionList(object):
+
+    def __init__(self):
+        self.items = []
+        self.attrs = []
+
+    def add(self, item):
+        if isinstance(item, MDagPath):
+            item = item.node()
+        if isinstance(item, MObject):
+            self.items.append(item.node)
+            self.attrs.append('')
+            return self
+
+        node = FakeScene.current.find(str(item))
+        if node is None:
+            raise RuntimeError('(kInvalidParameter): Object does not exist')
+        self.items.append(node)
+        self.attrs.append(str(item).partition('.')[2])
+        return self
+
+    def length(self):
+        return len(self.items)
+
+    def getDependNode(self, i):
+        return MObject(self.items[i])
+
+    def getDagPath(self, i):
+        if not self.items[i].is_dag():
+            raise TypeError('item is not a DAG path')
+        return MDagPath(self.items[i])
+
+    def getPlug(self, i):
+        attr = self.items[i].get_attr(self.attrs[i]) if self.attrs[i] else None
+        if attr is None:
+            raise TypeError('item is not a plug')
+        return MPlug(self.items[i], attr)
+
+
+class MFnData(object):
+    kString = 'string'
+    kMatrix = 'matrix'
+
+
+class MFnNumericData(object):
+    kBoolean = 'bool'
+    kByte = 'byte'
+    kChar = 'char'
+    kShort = 'short'
+    kInt = 'int'
+    kFloat = 'float'
+    kDouble = 'double'
+
+
+class FakeAttribute(object):
+    FN = {'double': MFn.kNumericAttribute, 'int': MFn.kNumericAttribute, 'bool': MFn.kNumericAttribute,
+          'enum': MFn.kEnumAttribute, 'string': MFn.kTypedAttribute, 'matrix': MFn.kTypedAttribute,
+          'message': MFn.kMessageAttribute}
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+
+    def hasFn(self, fn):
+        return self.FN.get(self.kind) == fn
+
+    def isNull(self):
+        return False
+
+
+class MFnNumericAttribute(object):
+
+    def __init__(self, attr=None):
+        self.attr = attr
+
+    def numericType(self):
+        return self.attr.kind
+
+
+class MFnUnitAttribute(object):
+    kDistance = 'distance'
+    kAngle = 'angle'
+
+    def __init__(self, attr=None):
+        self.attr = attr
+
+    def unitType(self):
+        return self.attr.kind
+
+
+class MFnAttribute(object):
+
+    def __init__(self, attr=None):
+        self.attr = attr
+
+    @property
+    def name(self):
+        return self.attr.name
+
+
+class MFnMessageAttribute(object):
+
+    def create(self, long_name, short_name):
+        return FakeAttribute(long_name, 'message')
+
+
+class MFnTypedAttribute(object):
+
+    def create(self, long_name, short_name, data_type):
+        return FakeAttribute(long_name, data_type)
+
+
+class MTime(object):
+    kSeconds = 6
+    kFilm = 8
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = value
+
+    def asUnits(self, unit):
+        return self.value
+
+    @staticmethod
+    def uiUnit():
+        return MTime.kFilm
+
+
+class MFnAnimCurve(object):
+    kAnimCurveTL = 'animCurveTL'
+    kAnimCurveTA = 'animCurveTA'
+    kAnimCurveTU = 'animCurveTU'
+    isUnitlessInput = False
+
+    def __init__(self, obj=None):
+        self.curve = obj.node if obj is not None else None
+
+    def setObject(self, obj):
+        self.curve = obj.node
+
+    def object(self):
+        return MObject(self.curve)
+
+    def create(self, plug, *args, **kwargs):
+        self.curve = plug.obj.node.get_curve(plug.attr)
+        return MObject(self.curve)
+
+    @property
+    def numKeys(self):
+        return len(self.curve.keys)
+
+    def addKeys(self, times, values, *args, **kwargs):
+        node, attr = self.curve.node, self.curve.attr
+        before = dict(self.curve.keys)
+        if not kwargs.get('keepExistingKeys'):
+            node.keys[attr] = {}
+        keys = node.keys.setdefault(attr, {})
+        for t, v in zip(times, values):
+            keys[t.value] = v
+        if kwargs.get('change') is not None:
+            kwargs['change'].add(self.curve, before)
+        FakeScene.current.notify('curves', [MObject(self.curve)])
+
+    def evaluate(self, time):
+        return self.curve.node.value(self.curve.attr, time.value)
+
+    def find(self, time):
+        return sorted(self.curve.keys).index(time.value) if time.value in self.curve.keys else None
+
+    def setValue(self, i, value, change=None):
+        before = dict(self.curve.keys)
+        self.curve.keys[sorted(self.curve.keys)[i]] = value
+        if change is not None:
+            change.add(self.curve, before)
+
+    def input(self, i):
+        return MTime(sorted(self.curve.keys)[i])
+
+    def value(self, i):
+        return self.curve.keys[sorted(self.curve.keys)[i]]
+
+    def inTangentType(self, i):
+        return 0
+
+    outTangentType = inTangentType
+
+    def getTangentAngleWeight(self, i, in_tangent):
+        return MAngle(0.0), 1.0
+
+
+class MAnimCurveChange(object):
+    '''
+    Keys of the curves edited through it, before and after, swapped back by undoIt and redoIt.
+
+    '''
+    def __init__(self):
+        self.changes = []
+
+    def add(self, curve, before):
+        self.changes.append((curve.node, curve.attr, before, dict(curve.keys)))
+
+    def undoIt(self):
+        for node, attr, before, after in reversed(self.changes):
+            node.keys[attr] = dict(before)
+
+    def redoIt(self):
+        for node, attr, before, after in self.changes:
+            node.keys[attr] = dict(after)
+
+
+class MTimeArray(list):
+    pass
+
+
+class MDoubleArray(list):
+    pass
+
+
+class MPointArray(list):
+    pass
+
+
+class MPlug(object):
+    # Array and compound plugs are not modelled
+    isElement = False
+    isChild = False
+
+    def __init__(self, node=None, attr=None):
+        self.obj = MObject(node)
+        self.attr = attr.name if isinstance(attr, FakeAttribute) else attr
+
+    @property
+    def isNull(self):
+        return self.obj.node is None
+
+    def fake(self):
+        return self.obj.node
+
+    def node(self):
+        return self.obj
+
+    def name(self):
+        return '{}.{}'.format(self.obj.node.name, self.attr)
+
+    def partialName(self, *args, **kwargs):
+        return self.attr
+
+    def attribute(self):
+        return FakeAttribute(self.attr, self.obj.node.kinds.get(self.attr, 'compound'))
+
+    def child(self, i):
+        return MPlug(self.obj, FakeNode.COMPOUNDS[self.attr][i])
+
+    def source(self):
+        src = FakeScene.current.connections.get((self.obj.node, self.attr))
+        return MPlug(*src) if src else MPlug()
+
+    def elementByLogicalIndex(self, i):
+        # Array plugs are not modelled, every element is the plug itself
+        return self
+
+    def asMObject(self, ctx=None):
+        if self.attr == 'worldMatrix':
+            return MObject(FakeData(self.obj.node.matrix(MDGContext.frame(ctx))))
+        value = self.obj.node.value(self.attr)
+        return value if isinstance(value, MObject) else MFnMatrixData().create(MMatrix())
+
+    def destinations(self):
+        return [MPlug(dst, attr) for (dst, attr), src in FakeScene.current.connections.items()
+                if src == (self.obj.node, self.attr)]
+
+    def asDouble(self, ctx=None):
+        return float(self.obj.node.value(self.attr, MDGContext.frame(ctx)) or 0.0)
+
+    def asInt(self, ctx=None):
+        return int(self.obj.node.value(self.attr, MDGContext.frame(ctx)) or 0)
+
+    def asBool(self, ctx=None):
+        return bool(self.obj.node.value(self.attr, MDGContext.frame(ctx)))
+
+    def asString(self, *args):
+        return self.obj.node.value(self.attr) or ''
+
+    def set_value(self, value):
+        self.obj.node.values[self.attr] = value
+
+    setDouble = setInt = setBool = setString = set_value
+
+    def flag(ids):
+        def get(self):
+            return self.obj.node.flags[self.attr][ids]
+
+        def set(self, value):
+            self.obj.node.flags[self.attr][ids] = bool(value)
+        return property(get, set)
+
+    isLocked = flag(0)
+    isKeyable = flag(1)
+    isChannelBox = flag(2)
+    del flag
+
+
+class MFnDependencyNode(object):
+
+    def __init__(self, obj=None):
+        self.obj = MObject(obj.node() if isinstance(obj, MDagPath) else obj)
+
+    def object(self):
+        return self.obj
+
+    def name(self):
+        return self.obj.node.name
+
+    @property
+    def typeName(self):
+        return self.obj.node.type
+
+    def hasAttribute(self, name):
+        return self.obj.node.get_attr(name) is not None
+
+    def attribute(self, name):
+        attr = self.obj.node.get_attr(name)
+        return FakeAttribute(attr, self.obj.node.kinds.get(attr, 'compound'))
+
+    def findPlug(self, name, want_networked=False):
+        attr = self.obj.node.get_attr(name)
+        if attr is None:
+            raise RuntimeError('(kInvalidParameter): Cannot find plug {}'.format(name))
+        return MPlug(self.obj, attr)
+
+
+class MFnDagNode(MFnDependencyNode):
+
+    def parentCount(self):
+        return 1 if self.obj.node.parent else 0
+
+    def parent(self, i):
+        return MObject(self.obj.node.parent)
+
+    def childCount(self):
+        return len(self.obj.node.children)
+
+    def child(self, i):
+        return MObject(self.obj.node.children[i])
+
+    def fullPathName(self):
+        return self.obj.node.path()
+
+    def getPath(self):
+        return MDagPath(self.obj)
+
+
+class MDGModifier(object):
+    '''
+    Operations are queued and run on doIt, node creation is immediate.
+
+    '''
+    def __init__(self):
+        self.ops = []
+        self.done = 0
+
+    def queue(self, do, undo):
+        self.ops.append((do, undo))
+
+    def createNode(self, node_type, parent=None):
+        scene = FakeScene.current
+        parent = parent.node if isinstance(parent, MObject) else None
+        node = scene.create(node_type, '{}1'.format(node_type), parent)
+        self.queue(lambda: scene.revive(node, parent), lambda: scene.delete(node))
+        return MObject(node)
+
+    def renameNode(self, obj, name):
+        node = obj.node
+        old = node.name
+        self.queue(lambda: FakeScene.current.rename(node, name), lambda: FakeScene.current.rename(node, old))
+
+    def reparentNode(self, obj, parent=None):
+        node = obj.node
+        old = node.parent
+        new = parent.node if isinstance(parent, MObject) else None
+        self.queue(lambda: FakeScene.current.reparent(node, new), lambda: FakeScene.current.reparent(node, old))
+
+    def deleteNode(self, obj):
+        scene = FakeScene.current
+        node = obj.node
+        changes = []
+
+        def do():
+            before = scene.capture()
+            scene.delete(node)
+            changes[:] = scene.diff(before)
+        self.queue(do, lambda: scene.restore(changes, 0))
+
+    def addAttribute(self, obj, attr):
+        node = obj.node
+        self.queue(lambda: node.add_attr(attr.name, attr.kind), lambda: node.kinds.pop(attr.name, None))
+
+    def connect(self, src, dst):
+        scene = FakeScene.current
+        self.queue(lambda: scene.connect(src.obj.node, src.attr, dst.obj.node, dst.attr),
+                   lambda: scene.disconnect(dst.obj.node, dst.attr))
+
+    def disconnect(self, src, dst):
+        scene = FakeScene.current
+        self.queue(lambda: scene.disconnect(dst.obj.node, dst.attr),
+                   lambda: scene.connect(src.obj.node, src.attr, dst.obj.node, dst.attr))
+
+    def new_value(self, plug, value):
+        node, attr = plug.obj.node, plug.attr
+
+        def do():
+            old.append(node.values.get(attr))
+            node.values[attr] = value
+            FakeScene.current.attribute_changed(node, attr, MNodeMessage.kAttributeSet)
+        old = []
+        self.queue(do, lambda: node.values.__setitem__(attr, old.pop()))
+
+    newPlugValue = newPlugValueDouble = newPlugValueInt = newPlugValueBool = newPlugValueString = new_value
+
+    def newPlugValueMDistance(self, plug, value):
+        self.new_value(plug, value.value)
+
+    newPlugValueMAngle = newPlugValueMDistance
+
+    def doIt(self):
+        while self.done < len(self.ops):
+            self.ops[self.done][0]()
+            self.done += 1
+
+    def undoIt(self):
+        while self.done:
+            self.done -= 1
+            self.ops[self.done][1]()
+
+
+class MDagModifier(MDGModifier):
+    pass
+
+
+class MDistance(object):
+    kCentimeters = 6
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = value
+
+    def asUnits(self, unit):
+        return self.value
+
+    @staticmethod
+    def uiUnit():
+        return MDistance.kCentimeters
+
+
+class MAngle(MDistance):
+    kDegrees = 2
+
+    @staticmethod
+    def uiUnit():
+        return MAngle.kDegrees
+
+
+class MVector(object):
+
+    def __init__(self, *args):
+        values = args[0] if len(args) == 1 else args or (0.0, 0.0, 0.0)
+        self.x, self.y, self.z = [float(v) for v in values]
+
+    def length(self):
+        return (self.x ** 2 + self.y ** 2 + self.z ** 2) ** 0.5
+
+    def normalize(self):
+        length = self.length() or 1.0
+        self.x, self.y, self.z = self.x / length, self.y / length, self.z / length
+        return self
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z)[i]
+
+    def __len__(self):
+        return 3
+
+    def __add__(self, other):
+        return MVector(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    def __sub__(self, other):
+        return MVector(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __mul__(self, other):
+        if isinstance(other, MMatrix):
+            return MVector(np.dot([self.x, self.y, self.z], other.array[:3, :3]))
+        return MVector(self.x * other, self.y * other, self.z * other)
+
+
+class MSpace(object):
+    kInvalid = 0
+    kTransform = 1
+    kPreTransform = 2
+    kPostTransform = 3
+    kWorld = 4
+    kObject = kPreTransform
+
+
+class MMatrix(object):
+    '''
+    4 x 4 matrix in the Maya row vector convention, translation in the last row.
+
+    '''
+    def __init__(self, values=None):
+        '''
+        values: 16 floats, 4 rows of 4 floats or an MMatrix, identity by default.
+
+        '''
+        if values is None:
+            self.array = np.identity(4)
+        elif isinstance(values, MMatrix):
+            self.array = values.array.copy()
+        else:
+            self.array = np.array(values, dtype=np.float64).reshape(4, 4)
+
+    def __iter__(self):
+        return iter(self.array.ravel().tolist())
+
+    def __len__(self):
+        return 16
+
+    def __getitem__(self, i):
+        return float(self.array.ravel()[i])
+
+    def __mul__(self, other):
+        return MMatrix(np.dot(self.array, other.array))
+
+    def __eq__(self, other):
+        return isinstance(other, MMatrix) and np.array_equal(self.array, other.array)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def getElement(self, row, col):
+        return float(self.array[row, col])
+
+    def inverse(self):
+        return MMatrix(np.linalg.inv(self.array))
+
+    def transpose(self):
+        return MMatrix(self.array.T)
+
+    def isEquivalent(self, other, tolerance=1e-10):
+        return bool(np.allclose(self.array, other.array, rtol=0.0, atol=tolerance))
+
+
+class MPoint(object):
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        if isinstance(x, (MPoint, MVector, list, tuple)):
+            x, y, z = x[0], x[1], x[2]
+        self.x, self.y, self.z, self.w = float(x), float(y), float(z), float(w)
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z, self.w)[i]
+
+    def __mul__(self, other):
+        if isinstance(other, MMatrix):
+            p = np.dot([self.x, self.y, self.z, self.w], other.array)
+            return MPoint(p[0] / p[3], p[1] / p[3], p[2] / p[3])
+        return MPoint(self.x * other, self.y * other, self.z * other)
+
+    def __add__(self, other):
+        return MPoint(self.x + other[0], self.y + other[1], self.z + other[2])
+
+    def __sub__(self, other):
+        if isinstance(other, MPoint):
+            return MVector(self.x - other.x, self.y - other.y, self.z - other.z)
+        return MPoint(self.x - other[0], self.y - other[1], self.z - other[2])
+
+
+class MEulerRotation(object):
+    '''
+    Euler angles in radians. The matrix of an order is the product of the axis rotations in
+    that order, xyz is Rx * Ry * Rz with row vectors.
+
+    '''
+    kXYZ, kYZX, kZXY, kXZY, kYXZ, kZYX = range(6)
+    AXES = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, order=0):
+        if isinstance(x, (MEulerRotation, MVector, list, tuple)):
+            order = x.order if isinstance(x, MEulerRotation) else y or 0
+            x, y, z = x[0], x[1], x[2]
+        self.x, self.y, self.z = float(x), float(y), float(z)
+        self.order = order
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z)[i]
+
+    def __setitem__(self, i, value):
+        setattr(self, 'xyz'[i], float(value))
+
+    @staticmethod
+    def axis(index, angle):
+        c, s = math.cos(angle), math.sin(angle)
+        m = np.identity(3)
+        # Row vectors: the next axis turns toward the one after it
+        a, b = (index + 1) % 3, (index + 2) % 3
+        m[a, a], m[a, b], m[b, a], m[b, b] = c, s, -s, c
+        return m
+
+    def rotation(self):
+        '''
+        Get the 3 x 3 rotation matrix.
+        return: Float64 array.
+
+        '''
+        m = np.identity(3)
+        for name in self.AXES[self.order]:
+            i = 'xyz'.index(name)
+            m = np.dot(m, self.axis(i, self[i]))
+        return m
+
+    def asMatrix(self):
+        m = np.identity(4)
+        m[:3, :3] = self.rotation()
+        return MMatrix(m)
+
+    def asQuaternion(self):
+        return MQuaternion.from_rotation(self.rotation())
+
+    @classmethod
+    def from_rotation(cls, rot, order=0):
+        '''
+        Solve the angles of an order from a rotation matrix, angle by angle: the middle angle
+        is read on the corner of the matrix, the outer angles once the middle one is known.
+        rot: 3 x 3 orthonormal rotation matrix.
+        order: Rotate order.
+        return: MEulerRotation.
+
+        '''
+        i, j, k = ['xyz'.index(a) for a in cls.AXES[order]]
+        # Odd orders mirror the angles of the even ones
+        sign = 1.0 if (j - i) % 3 == 1 else -1.0
+
+        middle = math.asin(max(-1.0, min(1.0, -sign * rot[i][k])))
+        if abs(rot[i][k]) < 1.0 - 1e-10:
+            first = math.atan2(sign * rot[j][k], rot[k][k])
+            last = math.atan2(sign * rot[i][j], rot[i][i])
+        else:
+            # Gimbal lock, the last angle is folded into the first one
+            first = math.atan2(-sign * rot[k][j], rot[j][j])
+            last = 0.0
+
+        angles = [0.0, 0.0, 0.0]
+        angles[i], angles[j], angles[k] = first, middle, last
+        return cls(angles[0], angles[1], angles[2], order)
+
+    @classmethod
+    def decompose(cls, matrix, order=0):
+        return cls.from_rotation(MTransformationMatrix(matrix).rotation_array(), order)
+
+    def reorder(self, order):
+        return self.from_rotation(self.rotation(), order)
+
+    def reorderIt(self, order):
+        other = self.reorder(order)
+        self.x, self.y, self.z, self.order = other.x, other.y, other.z, order
+        return self
+
+    def alternateSolution(self):
+        i, j, k = ['xyz'.index(a) for a in self.AXES[self.order]]
+        angles = [self.x, self.y, self.z]
+        angles[i] += math.pi
+        angles[j] = math.pi - angles[j]
+        angles[k] += math.pi
+        return MEulerRotation(angles[0], angles[1], angles[2], self.order)
+
+    def setToClosestSolution(self, other):
+        '''
+        Pick the solution, alternate or not, with every angle the closest to the other rotation.
+        other: MEulerRotation.
+        return: Self.
+
+        '''
+        best = None
+        for rot in [self, self.alternateSolution()]:
+            angles = [a + 2.0 * math.pi * round((b - a) / (2.0 * math.pi)) for a, b in zip(rot, other)]
+            distance = sum(abs(a - b) for a, b in zip(angles, other))
+            if best is None or distance < best[0]:
+                best = (distance, angles)
+
+        self.x, self.y, self.z = best[1]
+        return self
+
+
+class MQuaternion(object):
+
+    def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+        if isinstance(x, (MQuaternion, list, tuple)):
+            x, y, z, w = x[0], x[1], x[2], x[3]
+        self.x, self.y, self.z, self.w = float(x), float(y), float(z), float(w)
+
+    def __getitem__(self, i):
+        return (self.x, self.y, self.z, self.w)[i]
+
+    def __mul__(self, other):
+        # Same order as the matrices, q1 * q2 rotates by q1 then by q2
+        x1, y1, z1, w1 = other
+        x2, y2, z2, w2 = self
+        return MQuaternion(w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                           w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                           w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+                           w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2)
+
+    def conjugate(self):
+        return MQuaternion(-self.x, -self.y, -self.z, self.w)
+
+    def inverse(self):
+        return self.conjugate()
+
+    def rotation(self):
+        x, y, z, w = self
+        return np.array([[1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y + z * w), 2.0 * (x * z - y * w)],
+                         [2.0 * (x * y - z * w), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z + x * w)],
+                         [2.0 * (x * z + y * w), 2.0 * (y * z - x * w), 1.0 - 2.0 * (x * x + y * y)]])
+
+    def asMatrix(self):
+        m = np.identity(4)
+        m[:3, :3] = self.rotation()
+        return MMatrix(m)
+
+    def asEulerRotation(self):
+        return MEulerRotation.from_rotation(self.rotation())
+
+    @classmethod
+    def from_rotation(cls, rot):
+        '''
+        Get the quaternion of a rotation matrix, from its largest diagonal term.
+        rot: 3 x 3 orthonormal rotation matrix.
+        return: MQuaternion.
+
+        '''
+        trace = rot[0][0] + rot[1][1] + rot[2][2]
+        if trace > 0.0:
+            s = 2.0 * math.sqrt(trace + 1.0)
+            return cls((rot[1][2] - rot[2][1]) / s, (rot[2][0] - rot[0][2]) / s, (rot[0][1] - rot[1][0]) / s,
+                       0.25 * s)
+
+        i = max(range(3), key=lambda a: rot[a][a])
+        j, k = (i + 1) % 3, (i + 2) % 3
+        s = 2.0 * math.sqrt(1.0 + rot[i][i] - rot[j][j] - rot[k][k])
+        q = [0.0, 0.0, 0.0, (rot[j][k] - rot[k][j]) / s]
+        q[i] = 0.25 * s
+        q[j] = (rot[i][j] + rot[j][i]) / s
+        q[k] = (rot[i][k] + rot[k][i]) / s
+        return cls(*q)
+
+    @staticmethod
+    def slerp(p, q, t, spin=0):
+        dot = sum(a * b for a, b in zip(p, q))
+        if dot < 0.0:
+            q, dot = MQuaternion(-q.x, -q.y, -q.z, -q.w), -dot
+        if dot > 1.0 - 1e-10:
+            wa, wb = 1.0 - t, t
+        else:
+            angle = math.acos(dot)
+            wa, wb = math.sin((1.0 - t) * angle) / math.sin(angle), math.sin(t * angle) / math.sin(angle)
+        return MQuaternion(*[a * wa + b * wb for a, b in zip(p, q)])
+
+
+class MTransformationMatrix(object):
+    '''
+    Translate, rotate, scale and shear of a matrix, without pivots. The matrix is S * Sh * R * T,
+    the shear matrix has xy, xz and yz below its diagonal.
+
+    '''
+    def __init__(self, matrix=None):
+        '''
+        matrix: MMatrix decomposed, identity by default.
+
+        '''
+        self.t = np.zeros(3)
+        self.rot = np.identity(3)
+        self.s = np.ones(3)
+        self.sh = np.zeros(3)
+        self.order = MEulerRotation.kXYZ
+        if matrix is not None:
+            self.set_matrix(MMatrix(matrix).array)
+
+    def set_matrix(self, m):
+        self.t = m[3, :3].copy()
+        x, y, z = [m[i, :3].copy() for i in range(3)]
+
+        # Gram-Schmidt: the x row keeps its direction, the shear is what y and z share with the rows before
+        sx = np.linalg.norm(x)
+        x /= sx
+        y_on_x = np.dot(x, y)
+        y -= y_on_x * x
+        sy = np.linalg.norm(y)
+        y /= sy
+        z_on_x = np.dot(x, z)
+        z_on_y = np.dot(y, z)
+        z -= z_on_x * x + z_on_y * y
+        sz = np.linalg.norm(z)
+        z /= sz
+        if np.dot(np.cross(x, y), z) < 0.0:
+            sz, z = -sz, -z
+
+        self.s = np.array([sx, sy, sz])
+        self.sh = np.array([y_on_x / sy, z_on_x / sz, z_on_y / sz])
+        self.rot = np.array([x, y, z])
+
+    def asMatrix(self):
+        shear = np.identity(3)
+        shear[1, 0], shear[2, 0], shear[2, 1] = self.sh
+        m = np.identity(4)
+        m[:3, :3] = np.dot(np.dot(np.diag(self.s), shear), self.rot)
+        m[3, :3] = self.t
+        return MMatrix(m)
+
+    def translation(self, space=MSpace.kTransform):
+        return MVector(self.t)
+
+    def setTranslation(self, vector, space=MSpace.kTransform):
+        self.t = np.array([vector[0], vector[1], vector[2]], dtype=np.float64)
+        return self
+
+    def rotation_array(self):
+        return self.rot.copy()
+
+    def rotation(self, asQuaternion=False):
+        if asQuaternion:
+            return MQuaternion.from_rotation(self.rot)
+        return MEulerRotation.from_rotation(self.rot, self.order)
+
+    def setRotation(self, rot):
+        if isinstance(rot, MEulerRotation):
+            self.order = rot.order
+        self.rot = rot.rotation()
+        return self
+
+    def rotationOrder(self):
+        return self.order
+
+    def reorderRotation(self, order):
+        self.order = order
+        return self
+
+    def scale(self, space=MSpace.kTransform):
+        return self.s.tolist()
+
+    def setScale(self, scale, space=MSpace.kTransform):
+        self.s = np.array(list(scale)[:3], dtype=np.float64)
+        return self
+
+    def shear(self, space=MSpace.kTransform):
+        return self.sh.tolist()
+
+    def setShear(self, shear, space=MSpace.kTransform):
+        self.sh = np.array(list(shear)[:3], dtype=np.float64)
+        return self
+
+
+class MDGContext(object):
+
+    def __init__(self, time=None):
+        self.time = time
+
+    def isNormal(self):
+        return self.time is None
+
+    def getTime(self):
+        return self.time
+
+    @staticmethod
+    def frame(ctx):
+        '''
+        Get the frame evaluated in a context.
+        ctx: MDGContext or None.
+        return: Frame, None for the normal context.
+
+        '''
+        return ctx.time.value if ctx is not None and ctx.time is not None else None
+
+
+MDGContext.kNormal = MDGContext()
+
+
+class MFnMatrixData(object):
+
+    def __init__(self, obj=None):
+        self.obj = obj
+
+    def create(self, matrix):
+        self.obj = MObject(FakeData(MMatrix(matrix)))
+        return self.obj
+
+    def matrix(self):
+        return MMatrix(self.obj.node.matrix)
+
+    def set(self, matrix):
+        self.obj.node.matrix = MMatrix(matrix)
+
+
+class FakeData(object):
+    '''
+    Matrix data held by an MObject, like a matrix plug value.
+
+    '''
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.fn = set(['kData', 'kMatrixData'])
+        self.alive = True
+
+
+class MItDependencyGraph(object):
+    '''
+    Node level traversal of the fake connections, constraint targets and the curves of keyed attributes.
+
+    '''
+    kDownstream = 0
+    kUpstream = 1
+    kDepthFirst = 0
+    kNodeLevel = 0
+
+    def __init__(self, root, fn=None, direction=0, *args):
+        self.edges = {}
+        links = [(dst, src) for (dst, _), (src, _) in FakeScene.current.connections.items()]
+        for node in FakeScene.current.nodes.values():
+            links.extend((node, target) for target in node.targets)
+            links.extend((node, node.get_curve(attr)) for attr in node.keys)
+        for dst, src in links:
+            a, b = (dst, src) if direction == self.kUpstream else (src, dst)
+            self.edges.setdefault(a, []).append(b)
+
+        self.fn = fn
+        self.seen = set()
+        self.stack = [root.node]
+        self.current = None
+        self.pruned = False
+        self.find()
+
+    def find(self):
+        # Depth first, the nodes skipped by the filter are still traversed
+        while self.stack:
+            node = self.stack.pop()
+            if node in self.seen:
+                continue
+            self.seen.add(node)
+            if self.fn in (None, MFn.kInvalid) or self.fn in node.fn:
+                self.current = node
+                return
+            self.stack.extend(self.edges.get(node, []))
+
+    def isDone(self):
+        return self.current is None
+
+    def currentNode(self):
+        return MObject(self.current)
+
+    def prune(self):
+        self.pruned = True
+
+    def next(self):
+        if not self.pruned:
+            self.stack.extend(self.edges.get(self.current, []))
+        self.current = None
+        self.pruned = False
+        self.find()
+
+
+class MMessage(object):
+
+    @staticmethod
+    def removeCallback(callback_id):
+        FakeScene.current.remove_callback(callback_id)
+
+    @staticmethod
+    def removeCallbacks(callback_ids):
+        for callback_id in callback_ids:
+            FakeScene.current.remove_callback(callback_id)
+
+
+class MDGMessage(MMessage):
+
+    @staticmethod
+    def addNodeAddedCallback(func, node_type='dependNode', *args):
+        return FakeScene.current.add_callback('added', func)
+
+    @staticmethod
+    def addNodeRemovedCallback(func, node_type='dependNode', *args):
+        return FakeScene.current.add_callback('removed', func)
+
+    @staticmethod
+    def addConnectionCallback(func, *args):
+        return FakeScene.current.add_callback('connection', func)
+
+
+class MNodeMessage(MMessage):
+    kConnectionMade = 0x01
+    kConnectionBroken = 0x02
+    kAttributeSet = 0x08
+
+    @staticmethod
+    def addAttributeChangedCallback(obj, func, *args):
+        return FakeScene.current.add_callback(('attribute', obj.node), func)
+
+
+class MDagMessage(MMessage):
+
+    @staticmethod
+    def addParentAddedCallback(func, *args):
+        return FakeScene.current.add_callback('parent', func)
+
+
+class MAnimMessage(MMessage):
+
+    @staticmethod
+    def addAnimCurveEditedCallback(func, *args):
+        return FakeScene.current.add_callback('curves', func)
+
+
+class MSceneMessage(MMessage):
+    kAfterNew = 'new'
+    kAfterOpen = 'open'
+
+    @staticmethod
+    def addCallback(kind, func, *args):
+        return FakeScene.current.add_callback(kind, func)
+
+
+class MGlobal(object):
+
+    @staticmethod
+    def displayInfo(msg):
+        pass
+
+    @staticmethod
+    def setActiveSelectionList(sel, *args):
+        FakeScene.current.selection = list(sel.items)
+
+    displayWarning = displayError = displayInfo
+
+
+class MTypeId(object):
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def id(self):
+        return self.value
+
+
+class MPxNode(object):
+    '''
+    Plugin node base, only enough to define the plugin classes and call their solvers.
+
+    '''
+    kDependNode = 0
+    kLocatorNode = 1
+
+
+class MPxLocatorNode(MPxNode):
+    pass
+
+
+class MPxCommand(object):
+    pass
+
+
+class MFnPlugin(object):
+    '''
+    Register the commands of a plugin on the FakeCmds passed as the plugin object, its nodes are not modelled.
+
+    '''
+    def __init__(self, cmds=None, *args):
+        self.cmds = cmds
+
+    def registerCommand(self, name, creator):
+        setattr(self.cmds, 'cmd_{}'.format(name), partial(self.cmds.run_command, creator))
+
+    def deregisterCommand(self, name):
+        delattr(self.cmds, 'cmd_{}'.format(name))
+
+    def registerNode(self, *args):
+        pass
+
+    deregisterNode = registerNode
+
+
+class MUserData(object):
+
+    def __init__(self, *args):
+        pass
+
+
+class FakeQtClass(type):
+    '''
+    Class attributes of the FakeQt classes are functions doing nothing, like the registration calls
+    of the render API.
+
+    '''
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class FakeQt(types.ModuleType):
+    '''
+    Qt stand-in, every name is an empty class so widget classes can be defined.
+
+    '''
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        cls = FakeQtClass(name, (object,), {'__getattr__': lambda self, n: None})
+        setattr(self, name, cls)
+        return cls
+
+
+class FakeMaya(object):
+    om2_names = ['MFn', 'MObject', 'MObjectHandle', 'MDagPath', 'MSelectionList', 'MFnData', 'MFnNumericData',
+                 'MFnAttribute', 'MFnNumericAttribute', 'MFnUnitAttribute', 'MFnMessageAttribute',
+                 'MFnTypedAttribute', 'MTime', 'MTimeArray', 'MDoubleArray', 'MPointArray', 'MPlug',
+                 'MFnDependencyNode', 'MFnDagNode', 'MDGModifier', 'MDagModifier', 'MDistance', 'MAngle',
+                 'MVector', 'MSpace', 'MMatrix', 'MPoint', 'MEulerRotation', 'MQuaternion', 'MTransformationMatrix',
+                 'MDGContext', 'MFnMatrixData',
+                 'MItDependencyGraph', 'MMessage', 'MDGMessage', 'MNodeMessage', 'MDagMessage', 'MSceneMessage',
+                 'MGlobal', 'MTypeId', 'MPxNode', 'MPxLocatorNode', 'MPxCommand', 'MFnPlugin', 'MUserData']
+    # Like in Maya, the anim curve classes are only in OpenMayaAnim
+    oma_names = ['MFnAnimCurve', 'MAnimCurveChange', 'MAnimMessage']
+
+    @classmethod
+    def install(cls, cmds=None, qt=True):
+        '''
+        Register the fake maya, maya.cmds, maya.api.OpenMaya, maya.api.OpenMayaAnim and Qt modules, so the
+        world space modules can be imported outside of Maya.
+        cmds: FakeCmds, a new one by default.
+        qt: Also register the Qt modules.
+        return: FakeCmds.
+
+        '''
+        cmds = cmds or FakeCmds()
+        this = sys.modules[__name__]
+
+        maya = types.ModuleType('maya')
+        api = types.ModuleType('maya.api')
+        om2 = types.ModuleType('maya.api.OpenMaya')
+        for name in cls.om2_names:
+            setattr(om2, name, getattr(this, name))
+        oma = types.ModuleType('maya.api.OpenMayaAnim')
+        for name in cls.oma_names:
+            setattr(oma, name, getattr(this, name))
+        maya.cmds = cmds
+        maya.api = api
+        api.OpenMaya = om2
+        api.OpenMayaAnim = oma
+
+        # The render API is only needed to define the draw override of the plugin
+        api.OpenMayaRender = FakeQt('maya.api.OpenMayaRender')
+        modules = {'maya': maya, 'maya.cmds': cmds, 'maya.api': api, 'maya.api.OpenMaya': om2,
+                   'maya.api.OpenMayaAnim': oma, 'maya.api.OpenMayaRender': api.OpenMayaRender}
+
+        if qt:
+            maya.OpenMayaUI = FakeQt('maya.OpenMayaUI')
+            modules['maya.OpenMayaUI'] = maya.OpenMayaUI
+            modules['shiboken2'] = FakeQt('shiboken2')
+            modules['PySide2'] = FakeQt('PySide2')
+            for name in ['QtWidgets', 'QtCore', 'QtGui']:
+                setattr(modules['PySide2'], name, FakeQt('PySide2.{}'.format(name)))
+                modules['PySide2.{}'.format(name)] = getattr(modules['PySide2'], name)
+
+        sys.modules.update(modules)
+        return cmds
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+'''
+Compact binary file of baked world space channels, no Maya dependency.
+
+layout (little endian):
+    magic 'WSLA', uint32 version, uint32 index size, index json, padding to 4 bytes
+    per node: float32 frames[count], then float32 values[count] for each of the 9 channels
+
+The index holds the name, rotate order, key count and byte offset of every node,
+the reader memory maps the file and only reads the requested nodes and frame windows.
+
+'''
+import sys
+import json
+import mmap
+import struct
+from array  import array
+from bisect import bisect_left, bisect_right
+
+MAGIC = b'WSLA'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+
+
+class AnimFile(object):
+    channels = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz', 'sx', 'sy', 'sz']
+
+    @classmethod
+    def to_array(cls, data):
+        '''
+        Read little endian float32 values.
+        data: Bytes.
+        return: array('f').
+
+        '''
+        values = array('f')
+        if hasattr(values, 'frombytes'):
+            values.frombytes(data)
+        else:
+            values.fromstring(data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    @classmethod
+    def to_bytes(cls, values):
+        values = array('f', values)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+    @classmethod
+    def write(cls, path, nodes, info=None):
+        '''
+        Write a file.
+        path: File path.
+        nodes: List of (name, rotate order, frames, values), values holds one list per channel.
+        info: Extra json data stored in the index, like the time unit.
+
+        '''
+        entries = []
+        offset = 0
+        for name, ro, frames, values in nodes:
+            entries.append({'name': name, 'ro': ro, 'count': len(frames), 'offset': offset})
+            offset += len(frames) * 4 * (len(cls.channels) + 1)
+
+        index = json.dumps({'info': info or {}, 'nodes': entries}).encode('utf-8')
+        index += b' ' * (-(HEADER.size + len(index)) % 4)
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(index)))
+            f.write(index)
+            for name, ro, frames, values in nodes:
+                f.write(cls.to_bytes(frames))
+                for channel in values:
+                    f.write(cls.to_bytes(channel))
+
+    def __init__(self, path):
+        '''
+        Open a file for reading, the data stays memory mapped until close.
+        path: File path.
+
+        '''
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, size = HEADER.unpack(self.map[:HEADER.size])
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('Not a world space animation file: {}'.format(path))
+        if version > VERSION:
+            self.close()
+            raise ValueError('Unsupported file version {}: {}'.format(version, path))
+
+        index = json.loads(self.map[HEADER.size:HEADER.size + size].decode('utf-8'))
+        self.info = index['info']
+        self.data_offset = HEADER.size + size
+        self.nodes = dict((n['name'], n) for n in index['nodes'])
+        self.names = [n['name'] for n in index['nodes']]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.file.close()
+        self.map = None
+
+    def get_range(self, name):
+        '''
+        Get the first and last frame of a node.
+        name: Node name.
+        return: (start, end), None when the node has no keys.
+
+        '''
+        frames = self.read_frames(name)
+        return (frames[0], frames[-1]) if frames else None
+
+    def read_frames(self, name):
+        entry = self.nodes[name]
+        start = self.data_offset + entry['offset']
+        return self.to_array(self.map[start:start + entry['count'] * 4])
+
+    def read(self, name, start=None, end=None):
+        '''
+        Read the frames and channels of a node inside a frame window.
+        name: Node name.
+        start: First frame, from the beginning when None.
+        end: Last frame, to the end when None.
+        return: Frames and one array per channel.
+
+        '''
+        entry = self.nodes[name]
+        count = entry['count']
+        frames = self.read_frames(name)
+        first = 0 if start is None else bisect_left(frames, start)
+        last = count if end is None else bisect_right(frames, end)
+        last = max(first, last)
+
+        base = self.data_offset + entry['offset'] + count * 4
+        values = []
+        for ids in range(len(self.channels)):
+            offset = base + (ids * count + first) * 4
+            values.append(self.to_array(self.map[offset:offset + (last - first) * 4]))
+
+        return frames[first:last], values
@@ -0,0 +1,4216 @@
+# -*- coding: utf-8 -*-
+'''
+World Space Locator core: the Maya operations, without any Qt dependency.
+The window lives in world_space_loc_ui, Qt is only imported once the window is shown.
+
+'''
+import os
+import sys
+import math
+import json
+import time
+from array     import array
+from bisect    import bisect_left
+from maya      import cmds
+from functools import partial, wraps
+from collections import OrderedDict
+from maya.api  import OpenMaya as om2
+from maya.api  import OpenMayaAnim as oma
+
+from world_space_io import AnimFile
+from world_space_decompose import Decompose
+
+class Utils(object):
+    # Locator shape of world_space_loc_plugin, used for new locators when the plugin is loaded
+    plugin_loc = 'wslLocator'
+    use_plugin_loc = True
+    # Node of world_space_loc_plugin drawing all the plugin locators of the scene
+    plugin_loc_draw = 'wslLocatorDraw'
+    loc_draw_name = 'WSpace_draw'
+
+    @classmethod
+    def add_undo(cls, func):
+        @wraps(func)
+        def undo(*args, **kwargs):
+            cmds.undoInfo(openChunk=True)
+            Profiler.wrap(func)(*args, **kwargs)
+            cmds.undoInfo(closeChunk=True)
+        return undo
+    
+    @classmethod
+    def show_window(cls):
+        '''
+        Show the World Space Locator window, Qt is imported on the first call.
+        
+        '''
+        from world_space_loc_ui import WSpaceWindow
+        WSpaceWindow.show_window()
+
+    @classmethod
+    def mayaWindow(cls):
+        from maya.OpenMayaUI import MQtUtil
+        from shiboken2       import wrapInstance
+        from PySide2         import QtWidgets
+        if sys.version_info.major >= 3:
+            return wrapInstance(int(MQtUtil.mainWindow()), QtWidgets.QMainWindow)
+        else:
+            return wrapInstance(long(MQtUtil.mainWindow()), QtWidgets.QMainWindow)
+
+    @classmethod
+    def obj_exists(cls, lst):
+        '''
+        Check if a list of objects exists one by one.
+        return: True or False
+               
+        '''
+        for i in lst:
+            if not cmds.objExists(i):
+                break
+        else:
+            return True
+
+        return False
+
+    @classmethod
+    def short_name(cls, obj):
+        '''
+        Get a name usable as a node name suffix, without dag path or namespace separators.
+        obj: Object name.
+        return: Short name.
+        
+        '''
+        return obj.split('|')[-1].replace(':', '_')
+
+    @classmethod
+    def get_norm_vec(cls, obj, get_type='t'):
+        '''
+        Normalize a vector.
+        obj: Object to get the attribute from2.
+        get_type: Specify the attribute to get from the object ('t', 'r', 's').
+        return: Normalized vector.
+        
+        '''
+        vec = om2.MVector(cmds.getAttr('{}.{}'.format(obj, get_type))[0])
+        vec.normalize()
+
+        return vec
+
+    @classmethod
+    def cond_switch(cls, lst, func):
+        '''
+        Evaluate multiple conditions and execute a dynamic function.
+        lst: List of conditions.
+        func: Function to be executed.
+        
+        '''
+        for cond in lst:
+            if cmds.objExists(cond):
+                pass
+            else:
+                func()
+
+    @classmethod
+    def bake_obj(cls, obj, keys=True, rate=1, windows=None):
+        '''
+        Bake keyframes. The object needs to be constrained for this to work properly.
+        Key only bakes sample the key times found upstream by KeyIndex.
+        obj: Object to be baked, can be a list.
+        keys: Whether to bake every frame.
+        rate: Samples per frame when every frame is baked.
+        windows: Merged FrameRanges windows, the keys outside them stay. None for the playback range.
+        
+        '''
+        start_key = cmds.playbackOptions(q=True, ast=True)
+        end_key = cmds.playbackOptions(q=True, aet=True)
+        if not obj:
+            return
+
+        # The old keys inside the windows go first, KeyIndex would find them upstream as key times
+        if windows:
+            FrameRanges.cut(obj, windows, MatrixBake.channels)
+        time_range = windows or (start_key, end_key)
+        if keys:
+            objs = obj if isinstance(obj, (list, tuple)) else [obj]
+            frames = MatrixBake.get_frames(objs, True, windows=windows) if windows else \
+                KeyIndex.instance().get_frames(objs, start_key, end_key)
+            time_range = [(f, f) for f in frames]
+
+        cmds.bakeResults(obj, t=time_range, sb=1.0 / rate, sm=False, pok=bool(windows), sac=False, ral=False,
+                         bol=False, mr=True, cp=False, s=True)
+
+    @classmethod
+    def set_attr(cls, nodes, attrs, value, modifier=None):
+        '''
+        Add attributes to nodes.
+        nodes: List of objects to add attributes to.
+        attrs: List of attributes to be added.
+        value: List of values to set for the attributes.
+        modifier: Collect the changes in this Modifier instead of running setAttr.
+        
+        '''
+        if modifier:
+            for n in nodes:
+                for ids, i in enumerate(attrs):
+                    modifier.set_attr(n, i, value[ids])
+            return
+
+        for n in nodes:
+            for ids, i in enumerate(attrs):
+                if isinstance(value[ids], (list, tuple)):
+                    cmds.setAttr('{}.{}'.format(n, i), *value[ids])
+                else:
+                    cmds.setAttr('{}.{}'.format(n, i), value[ids])
+
+    @classmethod
+    def lock_attr(cls, nodes, attrs, v=False, modifier=None):
+        '''
+        Lock attributes on nodes.
+        nodes: List of objects to lock attributes on.
+        attrs: List of attributes to be locked.
+        v: Value for lock and keyable properties.
+        modifier: Collect the changes in this Modifier instead of running setAttr.
+        
+        '''
+        if isinstance(nodes and attrs, list):
+            if 't' in attrs:
+                attrs.remove('t')
+                attrs.extend(['tx', 'ty', 'tz'])
+            if 'r' in attrs:
+                attrs.remove('r')
+                attrs.extend(['rx', 'ry', 'rz'])
+            if 's' in attrs:
+                attrs.remove('s')
+                attrs.extend(['sx', 'sy', 'sz'])
+
+            if modifier:
+                for n in nodes:
+                    modifier.lock_attr(n, attrs, lock=False, keyable=False, channel_box=v)
+                return
+
+            for n in nodes:
+                for i in attrs:
+                    cmds.setAttr('{}.{}'.format(n, i), l=False, k=False, cb=v)
+
+    @classmethod
+    def get_paths(cls, nodes=None):
+        '''
+        Resolve nodes to dag paths once.
+        nodes: List of names, MObjects or MDagPaths, an MSelectionList, None for the selection.
+        return: List of MDagPath, non dag nodes are skipped.
+        
+        '''
+        if nodes is None:
+            nodes = cmds.ls(sl=True) or []
+
+        if isinstance(nodes, om2.MSelectionList):
+            sel = nodes
+        else:
+            sel = om2.MSelectionList()
+            for n in nodes:
+                sel.add(n)
+
+        paths = []
+        for i in range(sel.length()):
+            try:
+                paths.append(sel.getDagPath(i))
+            except (TypeError, RuntimeError):
+                pass
+
+        return paths
+
+    @classmethod
+    def get_rotate_order(cls, path):
+        '''
+        Get the rotate order of a node.
+        path: MDagPath or MObject.
+        return: Rotate order.
+        
+        '''
+        node = path.node() if isinstance(path, om2.MDagPath) else path
+        return om2.MFnDependencyNode(node).findPlug('rotateOrder', False).asInt()
+
+    @classmethod
+    def get_loc_type(cls):
+        '''
+        Get the shape type of new locators.
+        return: The plugin locator type when world_space_loc_plugin is loaded, 'locator' otherwise.
+        
+        '''
+        if cls.use_plugin_loc and Modifier.get_plugin() is not None:
+            return cls.plugin_loc
+        return 'locator'
+
+    @classmethod
+    def create_loc_nodes(cls, objs, prefix, ros, modifier=None, parents=None):
+        '''
+        Create locators in one batch, with the objects' rotate orders and a series of hidden attributes.
+        Plugin locators also get the node drawing them, when the scene has none.
+        objs: The objects to get the names from.
+        prefix: The prefix to be added.
+        ros: Rotate orders.
+        modifier: Collect the changes in this Modifier, applied here when None.
+        parents: Parent of each locator, None for the world.
+        return: List of (locator, shape) MObjects, valid once the modifier is applied.
+        
+        '''
+        mod = modifier or Modifier()
+        shape_type = cls.get_loc_type()
+        if shape_type == cls.plugin_loc and not cmds.ls(type=cls.plugin_loc_draw):
+            draw = mod.create_node('transform', cls.loc_draw_name)
+            mod.create_node(cls.plugin_loc_draw, '{}Shape'.format(cls.loc_draw_name), draw)
+
+        nodes = []
+        for ids, obj in enumerate(objs):
+            name = '{}{}'.format(prefix, cls.short_name(obj))
+            loc = mod.create_node('transform', name, parents[ids] if parents else None)
+            shape = mod.create_node(shape_type, '{}Shape'.format(name), loc)
+            mod.set_attr(loc, 'rotateOrder', ros[ids])
+            if shape_type == cls.plugin_loc:
+                mod.set_attr(shape, 'wslRotateOrder', ros[ids])
+
+            cls.lock_attr([loc], ['v'], v=False, modifier=mod)
+            cls.lock_attr([shape], ['lpx', 'lpy', 'lpz', 'lsx', 'lsy', 'lsz'], v=False, modifier=mod)
+            nodes.append((loc, shape))
+
+        if modifier is None:
+            mod.apply()
+        return nodes
+
+    @classmethod
+    def create_locs(cls, objs, prefix, ros, modifier=None, parents=None):
+        '''
+        Create locators in one batch, see create_loc_nodes.
+        return: List of locator MObjects, valid once the modifier is applied.
+        
+        '''
+        return [loc for loc, _ in cls.create_loc_nodes(objs, prefix, ros, modifier, parents)]
+
+    @classmethod
+    def create_loc(cls, obj, prefix, ro=None):
+        '''
+        Create a locator, get the object's rotate order, and hide a series of attributes.
+        obj: The object to get the name from2.
+        prefix: The prefix to be added.
+        ro: Rotate order, read from the object when None.
+        return: Locator object.
+        
+        '''
+        if ro is None:
+            ro = cmds.getAttr('{}.rotateOrder'.format(obj))
+
+        return Registry.get_name(cls.create_locs([obj], prefix, [ro])[0])
+
+    @classmethod
+    def scale_loc(cls, obj, value):
+        '''
+        Scale the locator.
+        obj: The locator object.
+        value: Scale value.
+        
+        '''
+        ScaleSnapshot([obj]).commit(value)
+
+
+class Modifier(object):
+    '''
+    Collect attribute sets, lock/keyable changes, node creation, reparenting, connections and keys
+    into one MDagModifier and one MAnimCurveChange, applied with a single doIt. It goes through the
+    undoable wslApplyModifier command when world_space_loc_plugin is loaded. Without the plugin and
+    with the undo queue on, every change runs right away through cmds inside one undo chunk instead.
+    
+    '''
+    plugin = 'world_space_loc_plugin'
+    INT_TYPES = [om2.MFnNumericData.kByte, om2.MFnNumericData.kChar,
+                 om2.MFnNumericData.kShort, om2.MFnNumericData.kInt]
+
+    @classmethod
+    def load_plugin(cls):
+        '''
+        Load the plugin providing wslApplyModifier, once from the window and batch entry points.
+        return: Plugin module, None if it can't be loaded.
+        
+        '''
+        if not cmds.pluginInfo(cls.plugin, q=True, loaded=True):
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '{}.py'.format(cls.plugin))
+            try:
+                cmds.loadPlugin(path, quiet=True)
+            except RuntimeError:
+                return None
+
+        return sys.modules.get(cls.plugin)
+
+    @classmethod
+    def get_plugin(cls):
+        '''
+        Get the plugin providing wslApplyModifier, without loading it.
+        return: Plugin module, None if it is not loaded.
+        
+        '''
+        if not cmds.pluginInfo(cls.plugin, q=True, loaded=True):
+            return None
+
+        return sys.modules.get(cls.plugin)
+
+    @classmethod
+    def get_node(cls, node):
+        '''
+        Get the MObject of a node.
+        node: Name, MObject or MDagPath.
+        return: MObject.
+        
+        '''
+        if isinstance(node, om2.MObject):
+            return node
+        if isinstance(node, om2.MDagPath):
+            return node.node()
+
+        sel = om2.MSelectionList()
+        sel.add(node)
+        return sel.getDependNode(0)
+
+    @classmethod
+    def get_plug_name(cls, plug):
+        '''
+        Get the name of a plug for cmds, also valid for an attribute added through cmds.
+        plug: MPlug.
+        return: Node path and attribute name.
+        
+        '''
+        if plug.isElement or plug.isChild:
+            attr = plug.partialName(useLongNames=True, useFullAttributePath=True)
+        else:
+            attr = om2.MFnAttribute(plug.attribute()).name
+        return '{}.{}'.format(Registry.get_name(plug.node()), attr)
+
+    @classmethod
+    def get_ui_value(cls, plug, value):
+        '''
+        Convert a value in internal units to the UI units of cmds.
+        plug: MPlug.
+        value: Value.
+        return: Value in UI units.
+        
+        '''
+        attr = plug.attribute()
+        if attr.hasFn(om2.MFn.kUnitAttribute):
+            unit = om2.MFnUnitAttribute(attr).unitType()
+            if unit == om2.MFnUnitAttribute.kDistance:
+                return om2.MDistance(value).asUnits(om2.MDistance.uiUnit())
+            if unit == om2.MFnUnitAttribute.kAngle:
+                return om2.MAngle(value).asUnits(om2.MAngle.uiUnit())
+        return value
+
+    def __init__(self, undoable=True):
+        '''
+        undoable: Go through the plugin command or cmds, False to always collect the changes for doIt.
+        
+        '''
+        self.modifier = om2.MDagModifier()
+        self.anim = oma.MAnimCurveChange()
+        self.undoable = undoable
+        self.module = None
+        self.direct = False
+        self.done = False
+        self.flags = []
+        self.restore = []
+        self.empty = True
+
+        # Called once after the first doIt
+        self.after = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            if not self.empty:
+                self.apply()
+        elif self.direct:
+            cmds.undoInfo(closeChunk=True)
+        else:
+            # Keys are written to the existing curves as soon as they are collected
+            self.anim.undoIt()
+
+    def begin(self):
+        '''
+        Decide how the changes are applied, on the first one.
+        return: True when the changes run right away through cmds.
+        
+        '''
+        if self.empty:
+            self.empty = False
+            if self.undoable:
+                self.module = self.get_plugin()
+                self.direct = self.module is None and bool(cmds.undoInfo(q=True, state=True))
+                if self.direct:
+                    cmds.undoInfo(openChunk=True)
+        return self.direct
+
+    def create_node(self, node_type, name=None, parent=None):
+        '''
+        Create a dag node.
+        node_type: Node type.
+        name: Node name.
+        parent: Parent node, None for the world.
+        return: MObject of the new node.
+        
+        '''
+        parent = None if parent is None else self.get_node(parent)
+        if self.begin():
+            kwargs = {'ss': True}
+            if name:
+                kwargs['n'] = name
+            path = ''
+            if parent is not None:
+                path = kwargs['p'] = Registry.get_name(parent)
+            return self.get_node('{}|{}'.format(path, cmds.createNode(node_type, **kwargs)))
+
+        obj = self.modifier.createNode(node_type, om2.MObject.kNullObj if parent is None else parent)
+        if name:
+            self.modifier.renameNode(obj, name)
+
+        return obj
+
+    def reparent(self, node, parent=None):
+        node = self.get_node(node)
+        parent = None if parent is None else self.get_node(parent)
+        if self.begin():
+            if parent is None:
+                cmds.parent(Registry.get_name(node), w=True)
+            else:
+                cmds.parent(Registry.get_name(node), Registry.get_name(parent))
+            return
+
+        self.modifier.reparentNode(node, om2.MObject.kNullObj if parent is None else parent)
+
+    def delete_node(self, node):
+        node = self.get_node(node)
+        if self.begin():
+            cmds.delete(Registry.get_name(node))
+            return
+
+        self.modifier.deleteNode(node)
+
+    def add_attr(self, node, attr):
+        '''
+        Add a dynamic attribute, through cmds only message, string and double attributes are supported.
+        node: Node.
+        attr: Attribute MObject.
+        
+        '''
+        node = self.get_node(node)
+        if self.begin():
+            kwargs = {'ln': om2.MFnAttribute(attr).name}
+            if attr.hasFn(om2.MFn.kMessageAttribute):
+                kwargs['at'] = 'message'
+            elif attr.hasFn(om2.MFn.kTypedAttribute):
+                kwargs['dt'] = 'string'
+            else:
+                kwargs['at'] = 'double'
+            cmds.addAttr(Registry.get_name(node), **kwargs)
+            return
+
+        self.modifier.addAttribute(node, attr)
+
+    def connect(self, src, dst):
+        if self.begin():
+            cmds.connectAttr(self.get_plug_name(src), self.get_plug_name(dst), f=True)
+            return
+
+        self.modifier.connect(src, dst)
+
+    def disconnect(self, src, dst):
+        if self.begin():
+            cmds.disconnectAttr(self.get_plug_name(src), self.get_plug_name(dst))
+            return
+
+        self.modifier.disconnect(src, dst)
+
+    def remove_multi(self, plug):
+        if self.begin():
+            cmds.removeMultiInstance(self.get_plug_name(plug), b=True)
+            return
+
+        self.modifier.removeMultiInstance(plug, True)
+
+    def set_matrix(self, plug, matrix):
+        '''
+        Set a matrix plug value.
+        plug: MPlug.
+        matrix: MMatrix.
+        
+        '''
+        if self.begin():
+            cmds.setAttr(self.get_plug_name(plug), *[matrix[i] for i in range(16)], type='matrix')
+            return
+
+        self.modifier.newPlugValue(plug, om2.MFnMatrixData().create(matrix))
+
+    def set_double(self, plug, value):
+        '''
+        Set a plug value in internal units.
+        plug: MPlug.
+        value: Value.
+        
+        '''
+        if self.begin():
+            cmds.setAttr(self.get_plug_name(plug), self.get_ui_value(plug, value))
+            return
+
+        self.modifier.newPlugValueDouble(plug, value)
+
+    def set_plug(self, plug, value):
+        '''
+        Set a plug value, in UI units like cmds.setAttr.
+        plug: MPlug.
+        value: Value.
+        
+        '''
+        attr = plug.attribute()
+        if self.begin():
+            if attr.hasFn(om2.MFn.kTypedAttribute):
+                cmds.setAttr(self.get_plug_name(plug), value, type='string')
+            else:
+                cmds.setAttr(self.get_plug_name(plug), value)
+            return
+
+        if attr.hasFn(om2.MFn.kUnitAttribute):
+            unit = om2.MFnUnitAttribute(attr).unitType()
+            if unit == om2.MFnUnitAttribute.kDistance:
+                self.modifier.newPlugValueMDistance(plug, om2.MDistance(value, om2.MDistance.uiUnit()))
+            elif unit == om2.MFnUnitAttribute.kAngle:
+                self.modifier.newPlugValueMAngle(plug, om2.MAngle(value, om2.MAngle.uiUnit()))
+            else:
+                self.modifier.newPlugValueDouble(plug, value)
+        elif attr.hasFn(om2.MFn.kEnumAttribute):
+            self.modifier.newPlugValueInt(plug, int(value))
+        elif attr.hasFn(om2.MFn.kNumericAttribute):
+            numeric_type = om2.MFnNumericAttribute(attr).numericType()
+            if numeric_type == om2.MFnNumericData.kBoolean:
+                self.modifier.newPlugValueBool(plug, bool(value))
+            elif numeric_type in self.INT_TYPES:
+                self.modifier.newPlugValueInt(plug, int(value))
+            else:
+                self.modifier.newPlugValueDouble(plug, value)
+        else:
+            self.modifier.newPlugValueString(plug, value)
+
+    def set_attr(self, node, attr, value):
+        '''
+        Set an attribute, a list value sets the children of a compound.
+        node: Node.
+        attr: Attribute name.
+        value: Value or list of values.
+        
+        '''
+        plug = om2.MFnDependencyNode(self.get_node(node)).findPlug(attr, False)
+        if isinstance(value, (list, tuple)):
+            for ids, v in enumerate(value):
+                self.set_plug(plug.child(ids), v)
+        else:
+            self.set_plug(plug, value)
+
+    def add_keys(self, plug, times, values, keep=False):
+        '''
+        Key an attribute in bulk, reusing its anim curve. The keys of existing curves are written
+        right away and recorded, so undo, redo and a failed Modifier put them back.
+        plug: MPlug.
+        times: MTimeArray.
+        values: Values in internal units.
+        keep: Merge with the existing keys instead of replacing them.
+        
+        '''
+        src = plug.source()
+        curve = not src.isNull and src.node().hasFn(om2.MFn.kAnimCurve)
+        if self.begin():
+            name = self.get_plug_name(plug)
+            if not src.isNull and not curve:
+                cmds.disconnectAttr(src.name(), name)
+            elif curve and not keep:
+                cmds.cutKey(name, clear=True)
+            unit = om2.MTime.uiUnit()
+            for t, v in zip(times, values):
+                cmds.setKeyframe(name, t=t.asUnits(unit), v=self.get_ui_value(plug, v))
+            return
+
+        fn = oma.MFnAnimCurve()
+        if curve:
+            fn.setObject(src.node())
+        else:
+            if not src.isNull:
+                self.modifier.disconnect(src, plug)
+            fn.create(plug, modifier=self.modifier)
+        fn.addKeys(times, om2.MDoubleArray(values), keepExistingKeys=keep, change=self.anim)
+
+    def set_key(self, plug, fn, index, value):
+        '''
+        Change the value of a key.
+        plug: Keyed MPlug.
+        fn: MFnAnimCurve of its curve.
+        index: Key index.
+        value: Value in internal units.
+        
+        '''
+        if self.begin():
+            cmds.keyframe(self.get_plug_name(plug), e=True, index=(index, index), absolute=True,
+                          valueChange=self.get_ui_value(plug, value))
+            return
+
+        fn.setValue(index, value, change=self.anim)
+
+    def lock_attr(self, node, attrs, lock=False, keyable=False, channel_box=False):
+        '''
+        Change the lock, keyable and channel box state of attributes.
+        node: Node.
+        attrs: Attribute names.
+        lock: Lock state.
+        keyable: Keyable state.
+        channel_box: Channel box state.
+        
+        '''
+        self.begin()
+        fn = om2.MFnDependencyNode(self.get_node(node))
+        for a in attrs:
+            self.flags.append((fn.findPlug(a, False), lock, keyable, channel_box))
+
+    @classmethod
+    def set_flags(cls, plug, lock, keyable, channel_box):
+        plug.isLocked = False
+        plug.isKeyable = keyable
+        plug.isChannelBox = channel_box
+        plug.isLocked = lock
+
+    def doIt(self):
+        self.modifier.doIt()
+        # The keys were written when they were collected, a redo puts them back
+        if self.done:
+            self.anim.redoIt()
+        self.done = True
+
+        self.restore = []
+        for plug, lock, keyable, channel_box in self.flags:
+            self.restore.append((plug, plug.isLocked, plug.isKeyable, plug.isChannelBox))
+            self.set_flags(plug, lock, keyable, channel_box)
+
+        while self.after:
+            self.after.pop(0)()
+
+    def undoIt(self):
+        for flags in reversed(self.restore):
+            self.set_flags(*flags)
+        self.anim.undoIt()
+        self.modifier.undoIt()
+
+    def apply(self):
+        '''
+        Apply all collected changes with one doIt, through the undo queue when the plugin is loaded.
+        Changes made through cmds only have their flags and after callbacks left, then the undo chunk is closed.
+        
+        '''
+        if self.direct:
+            try:
+                for plug, lock, keyable, channel_box in self.flags:
+                    cmds.setAttr(self.get_plug_name(plug), l=lock, k=keyable, cb=channel_box)
+                while self.after:
+                    self.after.pop(0)()
+            finally:
+                cmds.undoInfo(closeChunk=True)
+            return
+
+        if self.module is None:
+            self.doIt()
+            return
+
+        self.module.pending.append(self)
+        cmds.wslApplyModifier()
+
+
+class ScaleSnapshot(object):
+    '''
+    Snapshot the locator scales and curve CV positions of nodes once, then scale them
+    by an absolute factor from the snapshot, so repeated updates never compound.
+    
+    '''
+    def __init__(self, nodes=None):
+        '''
+        nodes: Locators or curve controls, the selection by default.
+        
+        '''
+        self.locs = []
+        self.curves = []
+
+        for path in Utils.get_paths(nodes):
+            fn = om2.MFnDagNode(path)
+            for i in range(fn.childCount()):
+                shape = fn.child(i)
+                if om2.MFnDependencyNode(shape).typeName == Utils.plugin_loc:
+                    plug = om2.MFnDependencyNode(shape).findPlug('size', False)
+                    self.locs.append(([plug], [plug.asDouble()]))
+
+                elif shape.hasFn(om2.MFn.kLocator):
+                    shape_fn = om2.MFnDependencyNode(shape)
+                    plugs = [shape_fn.findPlug(a, False) for a in ['lsx', 'lsy', 'lsz']]
+                    self.locs.append((plugs, [p.asDouble() for p in plugs]))
+
+                elif shape.hasFn(om2.MFn.kNurbsCurve):
+                    curve_fn = om2.MFnNurbsCurve(shape)
+                    points = curve_fn.cvPositions()
+                    box = om2.MBoundingBox()
+                    for p in points:
+                        box.expand(p)
+                    self.curves.append((curve_fn, om2.MPointArray(points), box.center))
+
+    def get_points(self, points, center, factor):
+        return om2.MPointArray([center + (p - center) * factor for p in points])
+
+    def apply(self, factor):
+        '''
+        Scale directly through the API, outside of the undo queue. Used while dragging.
+        factor: Absolute scale factor from the snapshot.
+        
+        '''
+        for plugs, values in self.locs:
+            for plug, v in zip(plugs, values):
+                plug.setDouble(v * factor)
+
+        for curve_fn, points, center in self.curves:
+            curve_fn.setCVPositions(self.get_points(points, center, factor))
+            curve_fn.updateCurve()
+
+    def restore(self):
+        '''
+        Restore the exact snapshot values.
+        
+        '''
+        for plugs, values in self.locs:
+            for plug, v in zip(plugs, values):
+                plug.setDouble(v)
+
+        for curve_fn, points, center in self.curves:
+            curve_fn.setCVPositions(points)
+            curve_fn.updateCurve()
+
+    def commit(self, factor):
+        '''
+        Restore the snapshot, then apply the final factor as one undoable Modifier.
+        factor: Absolute scale factor from the snapshot.
+        
+        '''
+        self.restore()
+        if factor == 1.0:
+            return
+
+        with Modifier() as mod:
+            for plugs, values in self.locs:
+                for plug, v in zip(plugs, values):
+                    mod.set_double(plug, v * factor)
+
+            for curve_fn, points, center in self.curves:
+                cp = om2.MFnDependencyNode(curve_fn.object()).findPlug('controlPoints', False)
+                for ids, p in enumerate(self.get_points(points, center, factor)):
+                    element = cp.elementByLogicalIndex(ids)
+                    for axis in range(3):
+                        mod.set_double(element.child(axis), p[axis])
+
+
+class BakeSnapshot(object):
+    '''
+    Channels of baked nodes copied into flat typed arrays before a fast bake, which runs with
+    the undo queue off. Deleted nodes are kept in a Modifier and created ones are remembered,
+    so revert puts the animation and the nodes back at once. An inactive snapshot keeps the undo
+    queue on and deletes nodes with cmds.delete.
+    
+    '''
+    STATIC, CURVE, WEIGHTED, DRIVEN = range(4)
+
+    # Time, value, in/out angles and weights, in/out tangent types
+    KEY_BYTES = 6 * 8 + 2
+
+    @classmethod
+    def get_plugs(cls, plugs):
+        sel = om2.MSelectionList()
+        for p in plugs:
+            sel.add(p)
+        return [sel.getPlug(i) for i in range(sel.length())]
+
+    @classmethod
+    def get_curve(cls, plug):
+        src = plug.source()
+        if not src.isNull and src.node().hasFn(om2.MFn.kAnimCurve):
+            return src.node()
+        return None
+
+    @classmethod
+    def estimate(cls, plugs):
+        '''
+        Estimate the memory of a snapshot without copying anything.
+        plugs: List of 'node.attr' names.
+        return: Bytes.
+        
+        '''
+        size = 0
+        for plug in cls.get_plugs(plugs):
+            curve = cls.get_curve(plug)
+            size += 9 + (oma.MFnAnimCurve(curve).numKeys * cls.KEY_BYTES if curve else 8)
+        return size
+
+    def __init__(self, plugs=None, active=True):
+        '''
+        plugs: List of 'node.attr' names to copy.
+        active: Turn the undo queue off inside the context.
+        
+        '''
+        self.active = active
+        self.names = []
+        self.kinds = array('b')
+        self.counts = array('l')
+        self.statics = array('d')
+        self.keys = array('d')
+        self.tangents = array('b')
+
+        self.created = []
+        self.deleted = []
+        self.undo_state = None
+        if active and plugs:
+            self.capture(plugs)
+
+    def __enter__(self):
+        if self.active:
+            self.undo_state = cmds.undoInfo(q=True, stateWithoutFlush=True)
+            cmds.undoInfo(stateWithoutFlush=False)
+        return self
+
+    def __exit__(self, *args):
+        if self.undo_state is not None:
+            cmds.undoInfo(stateWithoutFlush=self.undo_state)
+        self.undo_state = None
+
+    def capture(self, plugs):
+        '''
+        Copy the keys or static values of attributes.
+        plugs: List of 'node.attr' names.
+        
+        '''
+        unit = om2.MTime.uiUnit()
+        for plug in self.get_plugs(plugs):
+            self.names.append(plug.name())
+            curve = self.get_curve(plug)
+            if curve is None:
+                self.kinds.append(self.STATIC if plug.source().isNull else self.DRIVEN)
+                self.statics.append(plug.asDouble())
+                continue
+
+            fn = oma.MFnAnimCurve(curve)
+            self.kinds.append(self.WEIGHTED if fn.isWeighted else self.CURVE)
+            self.counts.append(fn.numKeys)
+            for i in range(fn.numKeys):
+                in_angle, in_weight = fn.getTangentAngleWeight(i, True)
+                out_angle, out_weight = fn.getTangentAngleWeight(i, False)
+                self.keys.extend([fn.input(i).asUnits(unit), fn.value(i), in_angle.asRadians(), in_weight,
+                                  out_angle.asRadians(), out_weight])
+                self.tangents.extend([fn.inTangentType(i), fn.outTangentType(i)])
+
+    def add_created(self, nodes):
+        if self.active:
+            self.created.extend(om2.MObjectHandle(Modifier.get_node(n)) for n in nodes)
+
+    def delete(self, nodes):
+        '''
+        Delete nodes, kept in a Modifier so revert can bring them back.
+        nodes: Node names.
+        
+        '''
+        if not nodes:
+            return
+        if not self.active:
+            cmds.delete(nodes)
+            return
+
+        mod = Modifier()
+        for n in nodes:
+            mod.delete_node(n)
+        self.apply(mod)
+
+    def apply(self, modifier):
+        '''
+        Apply a Modifier, kept so revert can undo it.
+        modifier: Modifier.
+        
+        '''
+        if modifier.empty:
+            return
+        if not self.active:
+            modifier.apply()
+            return
+
+        modifier.doIt()
+        self.deleted.append(modifier)
+
+    @property
+    def size(self):
+        return sum(a.itemsize * len(a) for a in [self.kinds, self.counts, self.statics, self.keys, self.tangents])
+
+    def info(self):
+        return {'plugs': len(self.names), 'keys': len(self.tangents) // 2, 'bytes': self.size}
+
+    def revert(self):
+        '''
+        Restore the nodes and the copied channels, with one Modifier and one addKeys per curve.
+        
+        '''
+        with self:
+            for handle in self.created:
+                if handle.isValid():
+                    cmds.delete(om2.MFnDependencyNode(handle.object()).name())
+            self.created = []
+
+            plugs = self.get_plugs(self.names)
+
+            # Sources added by the bake go first, so the deleted constraints can reconnect
+            modifier = om2.MDGModifier()
+            for plug, kind in zip(plugs, self.kinds):
+                src = plug.source()
+                if kind in (self.STATIC, self.DRIVEN) and not src.isNull and \
+                        (src.node().hasFn(om2.MFn.kAnimCurve) or src.node().hasFn(om2.MFn.kPairBlend)):
+                    modifier.deleteNode(src.node())
+                elif kind in (self.CURVE, self.WEIGHTED) and not src.isNull and src.node().hasFn(om2.MFn.kPairBlend):
+                    modifier.deleteNode(src.node())
+            modifier.doIt()
+
+            for mod in reversed(self.deleted):
+                mod.undoIt()
+            self.deleted = []
+
+            unit = om2.MTime.uiUnit()
+            modifier = om2.MDGModifier()
+            curves = []
+            offset = 0
+            statics = iter(self.statics)
+            counts = iter(self.counts)
+            for plug, kind in zip(plugs, self.kinds):
+                if kind in (self.STATIC, self.DRIVEN):
+                    value = next(statics)
+                    if kind == self.STATIC:
+                        modifier.newPlugValueDouble(plug, value)
+                    continue
+
+                count = next(counts)
+                fn = oma.MFnAnimCurve()
+                curve = self.get_curve(plug)
+                if curve is None:
+                    fn.create(plug, modifier=modifier)
+                else:
+                    fn.setObject(curve)
+                curves.append((fn, kind, offset, count))
+                offset += count
+
+            modifier.doIt()
+            for fn, kind, offset, count in curves:
+                keys = self.keys[offset * 6:(offset + count) * 6]
+                fn.setIsWeighted(kind == self.WEIGHTED)
+                fn.addKeys(om2.MTimeArray([om2.MTime(t, unit) for t in keys[0::6]]), om2.MDoubleArray(keys[1::6]),
+                           keepExistingKeys=False)
+                for i in range(count):
+                    key = keys[i * 6:i * 6 + 6]
+                    fn.setAngle(i, om2.MAngle(key[2]), True)
+                    fn.setAngle(i, om2.MAngle(key[4]), False)
+                    if kind == self.WEIGHTED:
+                        fn.setWeight(i, key[3], True)
+                        fn.setWeight(i, key[5], False)
+                    fn.setInTangentType(i, self.tangents[(offset + i) * 2])
+                    fn.setOutTangentType(i, self.tangents[(offset + i) * 2 + 1])
+
+
+class PoseCache(object):
+    '''
+    Sampled world matrices shared by the native bakes, keyed by node and frame.
+    Each node keeps one sorted array of frames and one array of 16 doubles per frame,
+    nodes are evicted least recently used first once the memory cap is reached.
+    Every cached node indexes the nodes it depends on: its upstream graph, the dag parents
+    of each dag node on the way and their own upstream graph. Attribute changes, connection
+    changes, reparenting and anim curve edits on any of them drop the cached node.
+    
+    '''
+    cache_instance = None
+
+    @classmethod
+    def enable(cls, limit=None):
+        '''
+        Use the cache for MatrixBake.sample.
+        limit: Memory cap in bytes, keeps the current one when None.
+        return: PoseCache.
+        
+        '''
+        if cls.cache_instance is None:
+            cls.cache_instance = PoseCache()
+        if limit is not None:
+            cls.cache_instance.limit = limit
+        cls.cache_instance.add_callbacks()
+        MatrixBake.cache = cls.cache_instance
+        return cls.cache_instance
+
+    @classmethod
+    def disable(cls):
+        if cls.cache_instance:
+            cls.cache_instance.clear()
+            cls.cache_instance.remove_callbacks()
+        MatrixBake.cache = None
+
+    def __init__(self, limit=128 * 1024 * 1024):
+        '''
+        limit: Memory cap in bytes.
+        
+        '''
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.callbacks = []
+        self.watched = {}
+        # Depended on node to the keys of the cached nodes depending on it
+        self.sources = {}
+
+    def add_callbacks(self):
+        if self.callbacks:
+            return
+
+        self.callbacks = [oma.MAnimMessage.addAnimCurveEditedCallback(self.curves_edited),
+                          om2.MDGMessage.addConnectionCallback(self.connection_changed),
+                          om2.MDagMessage.addParentAddedCallback(self.parent_changed),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterOpen, self.scene_changed),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterNew, self.scene_changed)]
+
+    def remove_callbacks(self):
+        if self.callbacks:
+            om2.MMessage.removeCallbacks(self.callbacks)
+        self.callbacks = []
+
+    def scene_changed(self, *args):
+        self.clear()
+
+    def clear(self):
+        for callback in self.watched.values():
+            try:
+                om2.MMessage.removeCallback(callback)
+            except RuntimeError:
+                pass
+        self.watched = {}
+        self.sources = {}
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def info(self):
+        '''
+        Get the cache usage.
+        return: Dict with the number of nodes and frames, bytes used, hits and misses.
+        
+        '''
+        return {'nodes': len(self.entries), 'frames': sum(len(e['frames']) for e in self.entries.values()),
+                'bytes': self.size, 'limit': self.limit, 'hits': self.hits, 'misses': self.misses}
+
+    def watch(self, key, node):
+        '''
+        Index the nodes a cached node depends on and watch their attribute changes.
+        Runs once per cached node, the index is dropped with it.
+        key: Cache key of the node.
+        node: MObject.
+        return: Set of the keys of the depended on nodes.
+        
+        '''
+        sources = set()
+        pending = [node]
+        while pending:
+            it = om2.MItDependencyGraph(pending.pop(), om2.MFn.kInvalid, om2.MItDependencyGraph.kUpstream,
+                                        om2.MItDependencyGraph.kDepthFirst, om2.MItDependencyGraph.kNodeLevel)
+            while not it.isDone():
+                current = it.currentNode()
+                source = om2.MObjectHandle(current).hashCode()
+                if source in sources:
+                    # Everything above was indexed from there
+                    it.prune()
+                else:
+                    sources.add(source)
+                    self.sources.setdefault(source, set()).add(key)
+                    if source not in self.watched:
+                        self.watched[source] = om2.MNodeMessage.addAttributeChangedCallback(
+                            current, self.attribute_changed)
+                    # The world matrix also depends on the dag parents, which are not connections
+                    if current.hasFn(om2.MFn.kDagNode):
+                        fn = om2.MFnDagNode(current)
+                        pending.extend(p for p in [fn.parent(i) for i in range(fn.parentCount())]
+                                       if not p.hasFn(om2.MFn.kWorld))
+                it.next()
+
+        return sources
+
+    def attribute_changed(self, msg, plug, *args):
+        if msg & (om2.MNodeMessage.kAttributeSet | om2.MNodeMessage.kConnectionMade |
+                  om2.MNodeMessage.kConnectionBroken):
+            self.invalidate(plug.node())
+
+    def connection_changed(self, src, dst, *args):
+        self.invalidate(dst.node())
+
+    def parent_changed(self, child, parent, *args):
+        self.invalidate(child.node())
+
+    def curves_edited(self, curves, *args):
+        for i in range(len(curves)):
+            self.invalidate(curves[i])
+
+    def invalidate(self, node):
+        '''
+        Drop the cached nodes depending on a node, looked up in the index built by watch.
+        node: MObject.
+        
+        '''
+        keys = self.sources.get(om2.MObjectHandle(node).hashCode())
+        if keys:
+            for key in list(keys):
+                self.drop(key)
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.size -= entry['bytes']
+            # Watched nodes keep their callback until clear, they are likely cached again
+            for source in entry['sources']:
+                keys = self.sources.get(source)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.sources[source]
+
+    def get(self, path, frames):
+        '''
+        Get the cached matrices of a node.
+        path: MDagPath.
+        frames: Frames.
+        return: List with one MMatrix per frame, None for the frames not cached.
+        
+        '''
+        key = om2.MObjectHandle(path.node()).hashCode()
+        entry = self.entries.get(key)
+        if entry is None or entry['path'] != path.fullPathName():
+            self.misses += len(frames)
+            return [None] * len(frames)
+
+        # Most recently used last
+        self.entries[key] = self.entries.pop(key)
+
+        cached = entry['frames']
+        data = entry['data']
+        matrices = []
+        for f in frames:
+            ids = bisect_left(cached, f)
+            if ids < len(cached) and cached[ids] == f:
+                matrices.append(om2.MMatrix(tuple(data[ids * 16:ids * 16 + 16])))
+            else:
+                matrices.append(None)
+
+        found = len([m for m in matrices if m is not None])
+        self.hits += found
+        self.misses += len(frames) - found
+        return matrices
+
+    def put(self, path, frames, matrices):
+        '''
+        Store sampled matrices of a node, inserted in place among the frames already cached.
+        Frames after the last cached one are appended, the others are inserted at their index.
+        path: MDagPath.
+        frames: Frames.
+        matrices: One MMatrix per frame.
+        
+        '''
+        key = om2.MObjectHandle(path.node()).hashCode()
+        entry = self.entries.get(key)
+        if entry is None or entry['path'] != path.fullPathName():
+            self.drop(key)
+            entry = {'path': path.fullPathName(), 'frames': array('d'), 'data': array('d'), 'bytes': 0}
+            entry['sources'] = self.watch(key, path.node())
+
+        cached = entry['frames']
+        data = entry['data']
+        for f, m in sorted(dict(zip(frames, matrices)).items()):
+            ids = bisect_left(cached, f)
+            values = array('d', [m[k] for k in range(16)])
+            if ids < len(cached) and cached[ids] == f:
+                data[ids * 16:ids * 16 + 16] = values
+            else:
+                cached.insert(ids, f)
+                data[ids * 16:ids * 16] = values
+
+        # Most recently used last
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        size = (len(cached) + len(data)) * 8
+        self.size += size - entry['bytes']
+        entry['bytes'] = size
+
+        # Evict the least recently used nodes, the new one is always kept
+        while self.size > self.limit and len(self.entries) > 1:
+            self.drop(next(iter(self.entries)))
+
+
+class MatrixBake(object):
+    '''
+    Bake world space transforms by sampling worldMatrix plugs through MDGContext.
+    No temporary constraints are created, keys are written with MFnAnimCurve.addKeys.
+    
+    '''
+    channels = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz', 'sx', 'sy', 'sz']
+
+    # PoseCache used by sample, None to always evaluate
+    cache = None
+
+    @classmethod
+    def get_frames(cls, objs, keys=True, rate=1, step=1, windows=None):
+        '''
+        Get the frames to sample in the playback range.
+        objs: Source objects, their key times are used when keys is True.
+        keys: Only sample the keyed frames (same meaning as Utils.bake_obj).
+        rate: Samples per frame when every frame is sampled, 4 samples at quarter frames.
+        step: Only keep one sample every step frames, the coarse grid of an adaptive bake.
+        windows: Merged FrameRanges windows sampled instead of the playback range, their borders are always sampled.
+        return: Sorted list of frames.
+        
+        '''
+        if windows is None:
+            start_key = cmds.playbackOptions(q=True, ast=True)
+            end_key = cmds.playbackOptions(q=True, aet=True)
+            if keys and objs:
+                return KeyIndex.instance().get_frames(objs, start_key, end_key)
+            windows = [(start_key, end_key)]
+
+        frames = []
+        for start, end in windows:
+            if keys:
+                lst = KeyIndex.instance().get_frames(objs, start, end) if objs else []
+                frames.extend(sorted(set(lst) | set([start, end])))
+            elif step > 1:
+                lst = [start + i * step for i in range(int((end - start) // step) + 1)]
+                frames.extend(lst if lst[-1] == end else lst + [end])
+            else:
+                count = int(round((end - start) * rate))
+                frames.extend(start + i / float(rate) for i in range(count + 1))
+
+        return frames
+
+    @classmethod
+    def get_world_plug(cls, obj):
+        '''
+        Get the worldMatrix plug of the object's dag path instance.
+        obj: Object name.
+        return: MPlug.
+        
+        '''
+        sel = om2.MSelectionList()
+        sel.add(obj)
+        path = sel.getDagPath(0)
+        plug = om2.MFnDagNode(path).findPlug('worldMatrix', False)
+        return plug.elementByLogicalIndex(path.instanceNumber())
+
+    @classmethod
+    def eval_matrix(cls, plug, ctx):
+        '''
+        Evaluate a matrix plug in a given context.
+        plug: Matrix MPlug.
+        ctx: MDGContext.
+        return: MMatrix.
+        
+        '''
+        if hasattr(om2, 'MDGContextGuard'):
+            with om2.MDGContextGuard(ctx):
+                return om2.MFnMatrixData(plug.asMObject()).matrix()
+
+        return om2.MFnMatrixData(plug.asMObject(ctx)).matrix()
+
+    @classmethod
+    def sample(cls, objs, frames):
+        '''
+        Sample the world matrices of all objects, one context per frame.
+        Frames found in MatrixBake.cache are not evaluated.
+        objs: Source objects.
+        frames: Frames to sample.
+        return: One list of MMatrix per object.
+        
+        '''
+        plugs = [cls.get_world_plug(obj) for obj in objs]
+        unit = om2.MTime.uiUnit()
+        cache = cls.cache
+        if cache is None:
+            matrices = [[] for _ in plugs]
+            for f in frames:
+                ctx = om2.MDGContext(om2.MTime(f, unit))
+                for ids, plug in enumerate(plugs):
+                    matrices[ids].append(cls.eval_matrix(plug, ctx))
+            return matrices
+
+        paths = Utils.get_paths(objs)
+        matrices = [cache.get(path, frames) for path in paths]
+        for i, f in enumerate(frames):
+            missing = [ids for ids, m in enumerate(matrices) if m[i] is None]
+            if missing:
+                ctx = om2.MDGContext(om2.MTime(f, unit))
+                for ids in missing:
+                    matrices[ids][i] = cls.eval_matrix(plugs[ids], ctx)
+
+        for path, m in zip(paths, matrices):
+            cache.put(path, frames, m)
+        return matrices
+
+    @classmethod
+    def get_error(cls, a, b, mid):
+        '''
+        Compare a sample with the interpolation of the samples around it.
+        a: MMatrix before.
+        b: MMatrix after.
+        mid: MMatrix halfway.
+        return: Distance (internal units) and angle (radians) to the interpolation.
+        
+        '''
+        ta, tb, tm = [om2.MTransformationMatrix(m) for m in (a, b, mid)]
+        pos = (ta.translation(om2.MSpace.kWorld) + tb.translation(om2.MSpace.kWorld)) * 0.5
+        linear = (tm.translation(om2.MSpace.kWorld) - pos).length()
+
+        q = om2.MQuaternion.slerp(ta.rotation(asQuaternion=True), tb.rotation(asQuaternion=True), 0.5)
+        qm = tm.rotation(asQuaternion=True)
+        dot = abs(q.x * qm.x + q.y * qm.y + q.z * qm.z + q.w * qm.w)
+        return linear, 2.0 * math.acos(min(dot, 1.0))
+
+    @classmethod
+    def refine(cls, objs, frames, samples, rate, tolerance, windows=None):
+        '''
+        Adaptive sampling: halve the intervals where the motion departs from the interpolation
+        of the samples around, down to 1 / rate frame. Each pass samples the midpoints of all
+        objects at once, holds keep the coarse frames.
+        objs: Source objects.
+        frames: Coarse frames, shared by all objects.
+        samples: One list of MMatrix per object, at the coarse frames.
+        rate: Samples per frame at the finest level.
+        tolerance: Distance (internal units) and angle (radians) allowed.
+        windows: Merged FrameRanges windows, intervals between two windows are not refined.
+        return: One list of frames and one list of MMatrix per object.
+        
+        '''
+        min_step = 1.0 / rate
+        keys = [dict(zip(frames, matrices)) for matrices in samples]
+        intervals = [(a, b) for a, b in zip(frames, frames[1:]) if (b - a) * 0.5 >= min_step - 1e-6 and
+                     (windows is None or any(start <= a and b <= end for start, end in windows))]
+        pending = [list(intervals) for _ in objs]
+
+        while any(pending):
+            ids = [i for i, intervals in enumerate(pending) if intervals]
+            mids = sorted(set((a + b) * 0.5 for i in ids for a, b in pending[i]))
+            for i, matrices in zip(ids, cls.sample([objs[i] for i in ids], mids)):
+                lookup = dict(zip(mids, matrices))
+                intervals = []
+                for a, b in pending[i]:
+                    mid = (a + b) * 0.5
+                    linear, angular = cls.get_error(keys[i][a], keys[i][b], lookup[mid])
+                    if linear > tolerance[0] or angular > tolerance[1]:
+                        keys[i][mid] = lookup[mid]
+                        if (mid - a) * 0.5 >= min_step - 1e-6:
+                            intervals.extend([(a, mid), (mid, b)])
+                pending[i] = intervals
+
+        frame_lst = [sorted(k) for k in keys]
+        return frame_lst, [[k[f] for f in f_lst] for k, f_lst in zip(keys, frame_lst)]
+
+    @classmethod
+    def decompose(cls, matrices, ro=0):
+        '''
+        Decompose world matrices to channel values, filtering euler flips.
+        matrices: List of MMatrix.
+        ro: Rotate order.
+        return: List of value lists in the order of MatrixBake.channels.
+        
+        '''
+        # Batched decomposition when NumPy is available
+        if Decompose.available():
+            return Decompose.channels(matrices, ro).tolist()
+
+        values = [[] for _ in cls.channels]
+        last = None
+        for m in matrices:
+            tm = om2.MTransformationMatrix(m)
+            t = tm.translation(om2.MSpace.kWorld)
+            r = tm.rotation(asQuaternion=False).reorder(ro)
+            s = tm.scale(om2.MSpace.kWorld)
+            if last is not None:
+                r.setToClosestSolution(last)
+            last = r
+
+            for ids, v in enumerate([t.x, t.y, t.z, r.x, r.y, r.z, s[0], s[1], s[2]]):
+                values[ids].append(v)
+
+        return values
+
+    @classmethod
+    def sample_plugs(cls, plugs, frames):
+        '''
+        Sample the values of attributes, one context per frame.
+        plugs: List of 'node.attr' names.
+        frames: Frames to sample.
+        return: One list of values (internal units) per plug.
+        
+        '''
+        sel = om2.MSelectionList()
+        for p in plugs:
+            sel.add(p)
+        plug_lst = [sel.getPlug(i) for i in range(sel.length())]
+        unit = om2.MTime.uiUnit()
+        values = [[] for _ in plug_lst]
+
+        for f in frames:
+            ctx = om2.MDGContext(om2.MTime(f, unit))
+            for ids, plug in enumerate(plug_lst):
+                if hasattr(om2, 'MDGContextGuard'):
+                    with om2.MDGContextGuard(ctx):
+                        values[ids].append(plug.asDouble())
+                else:
+                    values[ids].append(plug.asDouble(ctx))
+
+        return values
+
+    @classmethod
+    def set_plug_keys(cls, plugs, frames, values, modifier, keep=False):
+        '''
+        Write all keys of each attribute in bulk, reusing connected anim curves.
+        plugs: List of 'node.attr' names.
+        frames: Key frames.
+        values: One list of values (internal units) per plug.
+        modifier: Modifier recording the keys and connecting the new curves.
+        keep: Merge with the existing keys instead of replacing them.
+        
+        '''
+        sel = om2.MSelectionList()
+        for p in plugs:
+            sel.add(p)
+        unit = om2.MTime.uiUnit()
+        times = om2.MTimeArray([om2.MTime(f, unit) for f in frames])
+
+        for ids, vals in enumerate(values):
+            modifier.add_keys(sel.getPlug(ids), times, vals, keep)
+
+    @classmethod
+    def set_keys(cls, obj, frames, values, modifier, keep=False):
+        '''
+        Create anim curves on the object and write all keys in bulk.
+        obj: Object to key.
+        frames: Key frames.
+        values: Value lists in the order of MatrixBake.channels (internal units).
+        modifier: Modifier recording the keys and connecting the new curves.
+        keep: Merge with the existing keys instead of replacing them.
+        
+        '''
+        cls.set_plug_keys(['{}.{}'.format(obj, attr) for attr in cls.channels], frames, values, modifier, keep)
+
+    @classmethod
+    def write(cls, targets, frames, samples, keep=False):
+        '''
+        Decompose sampled world matrices and key them on the targets.
+        targets: Objects to key, parented to the world.
+        frames: Sampled frames.
+        samples: One list of MMatrix per target.
+        keep: Merge with the existing keys instead of replacing them.
+        
+        '''
+        with Modifier() as mod:
+            for target, matrices in zip(targets, samples):
+                ro = cmds.getAttr('{}.rotateOrder'.format(target))
+                cls.set_keys(target, frames, cls.decompose(matrices, ro), mod, keep)
+
+    @classmethod
+    def bake_points(cls, sources, points, targets, frames):
+        '''
+        Key the translation of targets following points fixed in the space of the sources,
+        the same motion as a parentConstraint with maintain offset.
+        sources: Source MDagPaths.
+        points: One list of MPoint per source, in the source space.
+        targets: One list of objects per source, parented to the world, matching the points.
+        frames: Frames to sample.
+
+        '''
+        samples = cls.sample(sources, frames)
+        if Decompose.available():
+            positions = Decompose.transform_points(samples, [[(p.x, p.y, p.z) for p in lst] for lst in points])
+            positions = [[pos.T.tolist() for pos in lst] for lst in positions]
+        else:
+            positions = []
+            for lst, matrices in zip(points, samples):
+                world = [[p * m for m in matrices] for p in lst]
+                positions.append([[[w.x for w in pos], [w.y for w in pos], [w.z for w in pos]] for pos in world])
+
+        with Modifier() as mod:
+            for target_lst, pos_lst in zip(targets, positions):
+                for target, values in zip(target_lst, pos_lst):
+                    cls.set_plug_keys(['{}.{}'.format(target, attr) for attr in cls.channels[:3]],
+                                      frames, values, mod)
+
+    @classmethod
+    def bake(cls, sources, targets, keys=True):
+        '''
+        Bake the world space transforms of the sources onto the targets.
+        sources: Objects to sample.
+        targets: Objects to key, parented to the world.
+        keys: Only sample the keyed frames of the sources.
+        
+        '''
+        if not sources:
+            return
+
+        frames = cls.get_frames(sources, keys)
+        cls.write(targets, frames, cls.sample(sources, frames))
+
+
+class BakeJob(object):
+    '''
+    Run a sampling bake in frame chunks, so it can be driven from the event loop
+    with progress and cancel. Nothing is keyed before finish.
+    
+    '''
+    def __init__(self, frames, sample, finish, cancel=None, chunk=50, plan=None):
+        '''
+        frames: Frames to sample.
+        sample: Function sampling a list of frames, returns one list of samples per item.
+        finish: Function called with the frames and the merged samples.
+        cancel: Function called to clean up when the job is cancelled.
+        chunk: Number of frames sampled per step.
+        plan: BakePlan timing the phases, Profiler only when None.
+        
+        '''
+        self.frames = frames
+        self.sample = sample
+        self.on_finish = finish
+        self.on_cancel = cancel
+        self.chunk = max(int(chunk), 1)
+        self.timer = Profiler if plan is None else plan
+
+        self.index = 0
+        self.samples = None
+
+    def progress(self):
+        return float(self.index) / len(self.frames) if self.frames else 1.0
+
+    def is_done(self):
+        return self.index >= len(self.frames)
+
+    def step(self):
+        '''
+        Sample the next chunk of frames.
+        return: Progress from 0.0 to 1.0.
+        
+        '''
+        frames = self.frames[self.index:self.index + self.chunk]
+        with self.timer.phase('bake'):
+            samples = self.sample(frames)
+        if self.samples is None:
+            self.samples = samples
+        else:
+            for merged, s in zip(self.samples, samples):
+                merged.extend(s)
+
+        self.index += len(frames)
+        return self.progress()
+
+    def finish(self):
+        with self.timer.phase('cleanup'):
+            self.on_finish(self.frames, self.samples or [])
+
+    def cancel(self):
+        if self.on_cancel:
+            with self.timer.phase('cleanup'):
+                self.on_cancel()
+
+    def run(self):
+        '''
+        Run all chunks and finish, blocking.
+        
+        '''
+        while not self.is_done():
+            self.step()
+        self.finish()
+
+
+class BakePlan(object):
+    '''
+    Bake targets without duplicates, ordered by dag parentage. The targets are grouped in
+    levels: no target of a level is an ancestor of another one of the same level, and the
+    nearest target ancestor of each of them is in the previous level. A level can be sampled
+    together, parents are always before their children. The plan keeps the time of its phases.
+    
+    '''
+    class Timer(object):
+        def __init__(self, plan, name):
+            self.plan = plan
+            self.name = name
+            self.start = 0.0
+            self.phase = None
+
+        def __enter__(self):
+            self.phase = Profiler.phase(self.name)
+            self.phase.__enter__()
+            self.start = time.time()
+            return self
+
+        def __exit__(self, *args):
+            times = self.plan.times
+            times[self.name] = times.get(self.name, 0.0) + time.time() - self.start
+            self.phase.__exit__(*args)
+
+    def __init__(self, nodes):
+        '''
+        nodes: Targets, names, MObjects or MDagPaths in any order, duplicates and instances are dropped.
+        
+        '''
+        start = time.time()
+        self.paths = []
+        self.targets = []
+        self.levels = []
+        self.parents = {}
+        self.duplicates = 0
+        self.times = OrderedDict()
+
+        self.build(nodes)
+        self.times['plan'] = time.time() - start
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __iter__(self):
+        return iter(self.levels)
+
+    def build(self, nodes):
+        '''
+        Deduplicate and sort the targets.
+        nodes: Targets.
+        
+        '''
+        nodes = list(nodes) if not isinstance(nodes, om2.MSelectionList) else nodes
+        paths = []
+        seen = set()
+        for path in Utils.get_paths(nodes):
+            # Instances share their node, it is evaluated once
+            key = om2.MObjectHandle(path.node()).hashCode()
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+        self.duplicates = (nodes.length() if isinstance(nodes, om2.MSelectionList) else len(nodes)) - len(paths)
+
+        names = [path.fullPathName() for path in paths]
+        index = set(names)
+        for name in names:
+            parts = name.split('|')
+            self.parents[name] = next(('|'.join(parts[:i]) for i in range(len(parts) - 1, 1, -1)
+                                       if '|'.join(parts[:i]) in index), None)
+
+        # Ancestors have shorter paths, their depth is known first
+        depth = {}
+        for name in sorted(names, key=lambda n: n.count('|')):
+            parent = self.parents[name]
+            depth[name] = 0 if parent is None else depth[parent] + 1
+
+        self.levels = [[] for _ in range(max(depth.values()) + 1 if depth else 0)]
+        level_paths = [[] for _ in self.levels]
+        for name, path in zip(names, paths):
+            self.levels[depth[name]].append(name)
+            level_paths[depth[name]].append(path)
+
+        self.targets = [name for level in self.levels for name in level]
+        self.paths = [path for level in level_paths for path in level]
+
+    def phase(self, name):
+        '''
+        Time a phase of the bake, also reported to the Profiler.
+        name: Phase name.
+        return: Context manager.
+        
+        '''
+        return BakePlan.Timer(self, name)
+
+    def info(self):
+        return {'targets': len(self.targets), 'duplicates': self.duplicates,
+                'levels': [len(level) for level in self.levels], 'times': dict(self.times)}
+
+
+class KeyReduce(object):
+    '''
+    Remove redundant keys from baked curves, with one tolerance per channel type.
+    Kept keys get spline tangents, the error is measured against that spline.
+    
+    '''
+    # Translation in scene units, rotation in degrees, scale unitless
+    TOLERANCE = {'t': 0.01, 'r': 0.05, 's': 0.001}
+    CURVE_TYPES = {oma.MFnAnimCurve.kAnimCurveTL: 't',
+                   oma.MFnAnimCurve.kAnimCurveTA: 'r',
+                   oma.MFnAnimCurve.kAnimCurveTU: 's'}
+
+    @classmethod
+    def get_slopes(cls, times, values, keep):
+        '''
+        Get the spline tangent slopes of the kept keys.
+        times: Key times.
+        values: Key values.
+        keep: Sorted indices of the kept keys.
+        return: List of slopes.
+        
+        '''
+        slopes = []
+        last = len(keep) - 1
+        for ids, k in enumerate(keep):
+            a = keep[max(ids - 1, 0)]
+            b = keep[min(ids + 1, last)]
+            slopes.append((values[b] - values[a]) / (times[b] - times[a]))
+
+        return slopes
+
+    @classmethod
+    def get_errors(cls, times, values, keep):
+        '''
+        Measure the error of each segment between kept keys.
+        times: Key times.
+        values: Key values.
+        keep: Sorted indices of the kept keys.
+        return: List of (max error, index of the worst key) per segment.
+        
+        '''
+        slopes = cls.get_slopes(times, values, keep)
+        errors = []
+        for ids in range(len(keep) - 1):
+            a, b = keep[ids], keep[ids + 1]
+            h = times[b] - times[a]
+            worst = (0.0, None)
+            for i in range(a + 1, b):
+                s = (times[i] - times[a]) / h
+                s2, s3 = s * s, s * s * s
+                v = ((2 * s3 - 3 * s2 + 1) * values[a] + (s3 - 2 * s2 + s) * h * slopes[ids] +
+                     (-2 * s3 + 3 * s2) * values[b] + (s3 - s2) * h * slopes[ids + 1])
+                err = abs(v - values[i])
+                if err > worst[0]:
+                    worst = (err, i)
+            errors.append(worst)
+
+        return errors
+
+    @classmethod
+    def simplify(cls, times, values, tol, fixed=None):
+        '''
+        Find the keys to keep on a curve.
+        times: Key times.
+        values: Key values.
+        tol: Maximum error.
+        fixed: Indices of the keys that are always kept.
+        return: Sorted indices of the kept keys and the maximum error.
+        
+        '''
+        n = len(times)
+        if n < 3:
+            return list(range(n)), 0.0
+
+        keep = set([0, n - 1] + list(fixed or []))
+
+        # Split every segment at its worst key until the spline is within tolerance
+        while True:
+            keep_lst = sorted(keep)
+            errors = cls.get_errors(times, values, keep_lst)
+            added = [i for e, i in errors if e > tol]
+            if not added:
+                break
+            keep.update(added)
+
+        return keep_lst, max([e for e, i in errors] or [0.0])
+
+    @classmethod
+    def reduce(cls, plugs, tolerance=None, windows=None):
+        '''
+        Reduce the keys of the anim curves of baked attributes in one pass.
+        plugs: 'node.attr' names of the transform channels the bake wrote, hand keyed attributes stay untouched.
+        tolerance: Dict overriding TOLERANCE per channel type ('t', 'r', 's').
+        windows: Merged FrameRanges windows, the keys outside them are kept. None for every key.
+        return: Dict with the number of curves, removed keys and max error per channel type.
+        
+        '''
+        tol = dict(cls.TOLERANCE)
+        tol.update(tolerance or {})
+        info = {'curves': 0, 'removed': 0, 'max_error': {'t': 0.0, 'r': 0.0, 's': 0.0}}
+
+        curves = list(set(cmds.keyframe(plugs, q=True, n=True) or [])) if plugs else []
+        sel = om2.MSelectionList()
+        for c in curves:
+            sel.add(c)
+
+        for ids, curve in enumerate(curves):
+            fn = oma.MFnAnimCurve(sel.getDependNode(ids))
+            kind = cls.CURVE_TYPES.get(fn.animCurveType)
+            if kind is None:
+                continue
+
+            # Rotation curves hold radians
+            unit = math.degrees(1.0) if kind == 'r' else 1.0
+            inputs = [fn.input(i) for i in range(fn.numKeys)]
+            times = [t.value for t in inputs]
+            values = [fn.value(i) for i in range(fn.numKeys)]
+            fixed = None
+            if windows:
+                frames = [t.asUnits(om2.MTime.uiUnit()) for t in inputs]
+                fixed = [i for i, f in enumerate(frames) if not any(start < f < end for start, end in windows)]
+            keep = cls.simplify(times, values, tol[kind] / unit, fixed)[0]
+
+            info['curves'] += 1
+            removed = sorted(set(range(len(times))) - set(keep))
+            if not removed:
+                continue
+
+            # Cut contiguous index ranges in a single call per curve
+            ranges = []
+            for i in removed:
+                if ranges and ranges[-1][1] == i - 1:
+                    ranges[-1] = (ranges[-1][0], i)
+                else:
+                    ranges.append((i, i))
+            cmds.cutKey(curve, index=ranges, clear=True)
+            if windows:
+                for window in windows:
+                    cmds.keyTangent(curve, t=window, itt='spline', ott='spline')
+            else:
+                cmds.keyTangent(curve, itt='spline', ott='spline')
+            info['removed'] += len(removed)
+
+            # Measured on the written curve, the keys outside the windows and the blended borders keep their tangents
+            err = max(abs(fn.evaluate(inputs[i]) - values[i]) for i in removed)
+            info['max_error'][kind] = max(info['max_error'][kind], err * unit)
+
+        return info
+
+
+class BakeContext(object):
+    '''
+    Speed up bakes: suspend viewport refresh, switch the evaluation manager mode,
+    apply scheduling overrides and disable cycle checks and auto key.
+    Everything is restored on exit, even when the bake raises.
+    
+    '''
+    SCHEDULING_FLAGS = {'parallel': 'nodeTypeParallel',
+                        'serialize': 'nodeTypeSerialize',
+                        'globallySerialize': 'nodeTypeGloballySerialize',
+                        'untrusted': 'nodeTypeUntrusted'}
+
+    @classmethod
+    def wrap(cls, func):
+        '''
+        Run a WorldSpaceLoc method inside a context built from its bake_opts,
+        the elapsed time is stored on bake_time.
+        
+        '''
+        @wraps(func)
+        def bake(self, *args, **kwargs):
+            with cls(**self.bake_opts) as ctx:
+                result = func(self, *args, **kwargs)
+            self.bake_time = ctx.elapsed
+            return result
+        return bake
+
+    def __init__(self, refresh=False, evaluation=None, scheduling=None, cycle_check=False):
+        '''
+        refresh: Suspend the viewport refresh.
+        evaluation: Evaluation manager mode ('parallel', 'serial', 'off'), None to keep it.
+        scheduling: Dict of node type to scheduling ('parallel', 'serialize', 'globallySerialize', 'untrusted').
+        cycle_check: Disable cycle checks and auto key.
+        
+        '''
+        self.refresh = refresh
+        self.evaluation = evaluation
+        self.scheduling = scheduling or {}
+        self.cycle_check = cycle_check
+
+        self.restore = []
+        self.start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.restore = []
+        self.start = time.time()
+
+        if self.refresh:
+            cmds.refresh(suspend=True)
+            self.restore.append(lambda: cmds.refresh(suspend=False))
+            if not cmds.about(batch=True) and not cmds.ogs(q=True, pause=True):
+                cmds.ogs(pause=True)
+                self.restore.append(lambda: cmds.ogs(pause=True))
+
+        if self.evaluation:
+            mode = cmds.evaluationManager(q=True, mode=True)[0]
+            cmds.evaluationManager(mode=self.evaluation)
+            self.restore.append(lambda: cmds.evaluationManager(mode=mode))
+
+        for node_type, schedule in self.scheduling.items():
+            flag = self.SCHEDULING_FLAGS[schedule]
+            state = cmds.evaluationManager(node_type, q=True, **{flag: True})
+            cmds.evaluationManager(node_type, **{flag: True})
+            self.restore.append(partial(cmds.evaluationManager, node_type, **{flag: bool(state)}))
+
+        if self.cycle_check:
+            cycle = cmds.cycleCheck(q=True, e=True)
+            auto_key = cmds.autoKeyframe(q=True, state=True)
+            cmds.cycleCheck(e=False)
+            cmds.autoKeyframe(state=False)
+            self.restore.append(lambda: cmds.cycleCheck(e=cycle))
+            self.restore.append(lambda: cmds.autoKeyframe(state=auto_key))
+
+        return self
+
+    def __exit__(self, *args):
+        # Restore in reverse order, keep going if one of them fails
+        for func in reversed(self.restore):
+            try:
+                func()
+            except RuntimeError:
+                pass
+        self.restore = []
+        self.elapsed = time.time() - self.start
+
+
+class Profiler(object):
+    '''
+    Opt-in profile of the world space operations: wall time per operation and phase, count and
+    time of every cmds call, and the number of nodes created and deleted. The cmds of the module
+    are only wrapped while an operation runs, and phases are a shared no-op while it is off.
+    
+    '''
+    instance = None
+    active = None
+
+    class Null(object):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+    class Timer(object):
+        def __init__(self, profiler, name):
+            self.profiler = profiler
+            self.name = name
+            self.start = 0.0
+            self.record = None
+            self.module = None
+
+        def __enter__(self):
+            self.start = time.time()
+            self.record = self.profiler.begin(self.name)
+            if self.record is not None:
+                self.module = Profiler.swap(Profiler.Commands(self.profiler, cmds))
+            return self
+
+        def __exit__(self, *args):
+            try:
+                self.profiler.end(self.name, self.record, time.time() - self.start)
+            finally:
+                # Restored even when the operation raises
+                if self.record is not None:
+                    Profiler.swap(self.module)
+                    self.module = None
+
+    class Commands(object):
+        '''
+        cmds module proxy timing every call.
+        
+        '''
+        def __init__(self, profiler, module):
+            self.profiler = profiler
+            self.module = module
+
+        def __getattr__(self, name):
+            func = getattr(self.module, name)
+            if not callable(func):
+                return func
+
+            def call(*args, **kwargs):
+                start = time.time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.profiler.add_call(name, time.time() - start)
+            setattr(self, name, call)
+            return call
+
+    null = Null()
+
+    @classmethod
+    def enable(cls):
+        '''
+        Start recording, the previous records are kept.
+        return: Profiler.
+        
+        '''
+        if cls.instance is None:
+            cls.instance = Profiler()
+        cls.instance.start()
+        return cls.instance
+
+    @classmethod
+    def disable(cls):
+        if cls.instance:
+            cls.instance.stop()
+
+    @classmethod
+    def swap(cls, module):
+        '''
+        Replace the cmds used by the module.
+        module: cmds module or Commands proxy.
+        return: The replaced one.
+        
+        '''
+        global cmds
+        old, cmds = cmds, module
+        return old
+
+    @classmethod
+    def phase(cls, name):
+        '''
+        Time a phase of the current operation.
+        name: Phase name ('setup', 'constraint', 'bake', 'cleanup').
+        return: Context manager.
+        
+        '''
+        if cls.active is None:
+            return cls.null
+        return Profiler.Timer(cls.active, name)
+
+    @classmethod
+    def wrap(cls, func):
+        '''
+        Record each call of a function as an operation, or as a phase when an operation is running.
+        
+        '''
+        @wraps(func)
+        def profile(*args, **kwargs):
+            if cls.active is None:
+                return func(*args, **kwargs)
+            with Profiler.Timer(cls.active, func.__name__):
+                return func(*args, **kwargs)
+        return profile
+
+    def __init__(self, limit=200):
+        '''
+        limit: Number of operations kept.
+        
+        '''
+        self.limit = limit
+        self.records = []
+        self.current = None
+        self.callbacks = []
+
+        # Called with the record when an operation ends
+        self.changed = []
+
+    def start(self):
+        if Profiler.active is self:
+            return
+
+        self.callbacks = [om2.MDGMessage.addNodeAddedCallback(partial(self.add_node, 'created'), 'dependNode'),
+                          om2.MDGMessage.addNodeRemovedCallback(partial(self.add_node, 'deleted'), 'dependNode')]
+        Profiler.active = self
+
+    def stop(self):
+        if Profiler.active is not self:
+            return
+
+        om2.MMessage.removeCallbacks(self.callbacks)
+        self.callbacks = []
+        Profiler.active = None
+
+    def clear(self):
+        self.records = []
+
+    def begin(self, name):
+        '''
+        Open an operation, or a phase of the current one.
+        name: Operation or phase name.
+        return: The new record, None for a phase.
+        
+        '''
+        if self.current is not None:
+            return None
+
+        self.current = {'operation': name, 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'time': 0.0,
+                        'phases': {}, 'commands': {}, 'created': 0, 'deleted': 0}
+        return self.current
+
+    def end(self, name, record, elapsed):
+        if record is None:
+            if self.current is not None:
+                self.current['phases'][name] = self.current['phases'].get(name, 0.0) + elapsed
+            return
+
+        record['time'] = elapsed
+        self.current = None
+        self.records.append(record)
+        del self.records[:-self.limit]
+        for func in self.changed:
+            func(record)
+
+    def add_call(self, name, elapsed):
+        if self.current is not None:
+            stat = self.current['commands'].setdefault(name, [0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+
+    def add_node(self, key, *args):
+        if self.current is not None:
+            self.current[key] += 1
+
+    def format(self, record):
+        '''
+        Format a record as text.
+        record: Operation record.
+        return: Text.
+        
+        '''
+        calls = sorted(record['commands'].items(), key=lambda item: -item[1][1])
+        lines = ['{}  {:.3f}s  {} calls  +{} -{} nodes'.format(
+            record['operation'], record['time'], sum(c for c, t in record['commands'].values()),
+            record['created'], record['deleted'])]
+        lines.extend('    {:<12} {:.3f}s'.format(name, t) for name, t in sorted(record['phases'].items()))
+        lines.extend('    {:<22} {:>5}  {:.3f}s'.format('cmds.' + name, c, t) for name, (c, t) in calls[:8])
+        return '\n'.join(lines)
+
+    def report(self, count=5):
+        return '\n'.join(self.format(r) for r in reversed(self.records[-count:]))
+
+    def dump(self, path):
+        '''
+        Write the records to a json file.
+        path: File path.
+        
+        '''
+        with open(path, 'w') as f:
+            json.dump({'records': [dict(r, commands=dict((name, {'count': c, 'time': t})
+                                                         for name, (c, t) in r['commands'].items()))
+                                   for r in self.records]}, f, indent=2)
+
+
+class Registry(object):
+    '''
+    Map each control to its world space nodes (locators, aim targets, group, constraints).
+    The nodes are linked to the control through message attributes, loaded once and
+    kept in sync by node added/removed callbacks, so lookups are dict hits.
+    Nodes created before the links are found by their names once, when the registry loads.
+    
+    '''
+    role_attr = 'wslRole'
+    source_attr = 'wslSource'
+
+    # Names of the nodes created before the links: (role, prefix, suffix) around the control name,
+    # the longest prefixes first
+    legacy_pattern = 'WSpace_loc_*'
+    legacy_names = [('WSpace_loc_aim_grp_', 'WSpace_loc_aim_grp_', ''),
+                    ('WSpace_loc_aim_target_', 'WSpace_loc_aim_target_', ''),
+                    ('WSpace_loc_aim_up_', 'WSpace_loc_aim_up_', ''),
+                    ('_parentConstraint', 'WSpace_loc_', '_parentConstraint'),
+                    ('_pointConstraint', 'WSpace_loc_', '_pointConstraint'),
+                    ('_orientConstraint', 'WSpace_loc_', '_orientConstraint'),
+                    ('_aimConstraint', 'WSpace_loc_', '_aimConstraint'),
+                    ('WSpace_loc_', 'WSpace_loc_', '')]
+
+    reg_instance = None
+    @classmethod
+    def instance(cls):
+        if not cls.reg_instance:
+            cls.reg_instance = Registry()
+            cls.reg_instance.add_callbacks()
+
+        return cls.reg_instance
+
+    def __init__(self):
+        self.nodes = {}
+        self.owners = {}
+        self.pending = []
+        self.callbacks = []
+        self.dirty = True
+
+    def add_callbacks(self):
+        '''
+        Track nodes added to and removed from the scene.
+        
+        '''
+        if self.callbacks:
+            return
+
+        self.callbacks = [om2.MDGMessage.addNodeAddedCallback(self.node_added, 'dependNode'),
+                          om2.MDGMessage.addNodeRemovedCallback(self.node_removed, 'dependNode'),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterOpen, self.scene_changed),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterNew, self.scene_changed)]
+
+    def remove_callbacks(self):
+        if self.callbacks:
+            om2.MMessage.removeCallbacks(self.callbacks)
+        self.callbacks = []
+
+    def scene_changed(self, *args):
+        self.dirty = True
+
+    def node_added(self, node, *args):
+        # The link attributes are added after creation, check them on the next lookup
+        if not self.dirty:
+            self.pending.append(om2.MObjectHandle(node))
+
+    def node_removed(self, node, *args):
+        key = om2.MObjectHandle(node).hashCode()
+        ctrl = self.owners.pop(key, None)
+        if ctrl is not None:
+            roles = self.nodes.get(ctrl, {})
+            for role, handle in list(roles.items()):
+                if handle.hashCode() == key:
+                    del roles[role]
+
+        if key in self.nodes:
+            for handle in self.nodes.pop(key).values():
+                self.owners.pop(handle.hashCode(), None)
+
+    @classmethod
+    def get_key(cls, obj):
+        '''
+        Get the dict key of a node.
+        obj: Node name or MObject.
+        return: MObjectHandle hash code, None if the node does not exist.
+        
+        '''
+        if not isinstance(obj, om2.MObject):
+            sel = om2.MSelectionList()
+            try:
+                sel.add(obj)
+            except RuntimeError:
+                return None
+            obj = sel.getDependNode(0)
+
+        return om2.MObjectHandle(obj).hashCode()
+
+    @classmethod
+    def get_name(cls, obj):
+        '''
+        Get a unique name of a node.
+        obj: MObject.
+        return: Full dag path for dag nodes, node name otherwise.
+        
+        '''
+        if obj.hasFn(om2.MFn.kDagNode):
+            return om2.MDagPath.getAPathTo(obj).fullPathName()
+
+        return om2.MFnDependencyNode(obj).name()
+
+    def add_node(self, node):
+        '''
+        Register a node carrying the link attributes.
+        node: MObject.
+        
+        '''
+        fn = om2.MFnDependencyNode(node)
+        if not fn.hasAttribute(self.role_attr):
+            return
+
+        src = fn.findPlug(self.source_attr, False).source()
+        if src.isNull:
+            return
+
+        ctrl = om2.MObjectHandle(src.node()).hashCode()
+        handle = om2.MObjectHandle(node)
+        # Plugin locators carry the link on their shape, the transform is the linked node
+        if fn.typeName == Utils.plugin_loc:
+            handle = om2.MObjectHandle(om2.MFnDagNode(node).parent(0))
+        self.nodes.setdefault(ctrl, {})[fn.findPlug(self.role_attr, False).asString()] = handle
+        self.owners[handle.hashCode()] = ctrl
+
+    def load(self):
+        '''
+        Load all linked nodes of the scene.
+        
+        '''
+        self.nodes = {}
+        self.owners = {}
+        self.pending = []
+
+        sel = om2.MSelectionList()
+        for n in cmds.ls('*.{}'.format(self.role_attr), r=True, o=True) or []:
+            sel.add(n)
+
+        for i in range(sel.length()):
+            self.add_node(sel.getDependNode(i))
+
+        self.dirty = False
+        self.migrate()
+
+    @classmethod
+    def parse_legacy(cls, name):
+        '''
+        Get the control and role of a node from its legacy name.
+        name: Node name.
+        return: (control name, role), None if the name does not match.
+        
+        '''
+        name = name.split('|')[-1]
+        for role, prefix, suffix in cls.legacy_names:
+            if name.startswith(prefix) and name.endswith(suffix) and len(name) > len(prefix) + len(suffix):
+                return name[len(prefix):len(name) - len(suffix)], role
+
+        return None
+
+    def migrate(self):
+        '''
+        Link the unlinked nodes matching the legacy names to their controls, with one ls.
+        The links are saved with the scene, so this only does work on older scenes.
+        return: Number of linked nodes.
+        
+        '''
+        mod = Modifier(undoable=False)
+        count = 0
+        for name in cmds.ls(self.legacy_pattern, type='transform', l=True) or []:
+            parsed = self.parse_legacy(name)
+            if parsed is None:
+                continue
+
+            ctrl, role = parsed
+            node = Modifier.get_node(name)
+            ctrl_key = self.get_key(ctrl)
+            # The temporary bake constraints match the aim constraint name, their control does not exist
+            if ctrl_key is None or om2.MFnDependencyNode(node).hasAttribute(self.role_attr) or \
+                    role in self.nodes.get(ctrl_key, {}):
+                continue
+
+            self.link(Modifier.get_node(ctrl), node, role, mod)
+            count += 1
+
+        # Not undoable, the links must stay with the nodes
+        if count:
+            mod.doIt()
+        return count
+
+    def update(self):
+        '''
+        Load the registry if needed and register pending nodes.
+        
+        '''
+        if self.dirty:
+            self.load()
+
+        for handle in self.pending:
+            if handle.isValid():
+                self.add_node(handle.object())
+        self.pending = []
+
+    def link(self, obj, node, role, modifier=None):
+        '''
+        Link a node to a control.
+        obj: Control.
+        node: World space node.
+        role: Role of the node.
+        modifier: Collect the link in this Modifier, registered once it is applied.
+        
+        '''
+        if modifier:
+            ctrl = Modifier.get_node(obj)
+            node = Modifier.get_node(node)
+            fn = om2.MFnDependencyNode(node)
+            if fn.hasAttribute(self.role_attr):
+                src_attr = fn.attribute(self.source_attr)
+                role_attr = fn.attribute(self.role_attr)
+            else:
+                src_attr = om2.MFnMessageAttribute().create(self.source_attr, self.source_attr)
+                role_attr = om2.MFnTypedAttribute().create(self.role_attr, self.role_attr, om2.MFnData.kString)
+                modifier.add_attr(node, src_attr)
+                modifier.add_attr(node, role_attr)
+
+            modifier.set_plug(om2.MPlug(node, role_attr), role)
+            modifier.connect(om2.MFnDependencyNode(ctrl).findPlug('message', False), om2.MPlug(node, src_attr))
+            modifier.after.append(partial(self.add_node, node))
+            return
+
+        if isinstance(obj, (om2.MObject, om2.MDagPath)):
+            obj = self.get_name(Modifier.get_node(obj))
+        if not cmds.attributeQuery(self.role_attr, n=node, ex=True):
+            cmds.addAttr(node, ln=self.source_attr, at='message')
+            cmds.addAttr(node, ln=self.role_attr, dt='string')
+        cmds.setAttr('{}.{}'.format(node, self.role_attr), role, type='string')
+        cmds.connectAttr('{}.message'.format(obj), '{}.{}'.format(node, self.source_attr), f=True)
+
+        self.update()
+        sel = om2.MSelectionList()
+        sel.add(node)
+        self.add_node(sel.getDependNode(0))
+
+    def get(self, obj, role):
+        '''
+        Get the node linked to a control.
+        obj: Control.
+        role: Role of the node.
+        return: Node name, None if there is none.
+        
+        '''
+        self.update()
+        handle = self.nodes.get(self.get_key(obj), {}).get(role)
+        if handle is None or not handle.isValid():
+            return None
+
+        return self.get_name(handle.object())
+
+    def has(self, obj, roles):
+        '''
+        Check if any of the roles is linked to a control.
+        obj: Control.
+        roles: List of roles.
+        return: True or False
+        
+        '''
+        for role in roles:
+            if self.get(obj, role):
+                return True
+
+        return False
+
+
+class BakeTracker(object):
+    '''
+    Remember the upstream anim curves of every baked control, so a refresh bake only
+    re-samples the frame intervals that changed since the last bake. Edited curves are
+    collected by a callback, and compared with their snapshot when the refresh runs. A
+    changed key dirties the interval between its neighbour keys, the span it influences.
+    
+    '''
+    tracker_instance = None
+    @classmethod
+    def instance(cls):
+        if not cls.tracker_instance:
+            cls.tracker_instance = BakeTracker()
+            cls.tracker_instance.add_callbacks()
+
+        return cls.tracker_instance
+
+    def __init__(self):
+        self.entries = {}
+        self.edited = set()
+        self.callbacks = []
+
+    def add_callbacks(self):
+        if self.callbacks:
+            return
+
+        self.callbacks = [oma.MAnimMessage.addAnimCurveEditedCallback(self.curves_edited),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterOpen, self.scene_changed),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterNew, self.scene_changed)]
+
+    def remove_callbacks(self):
+        if self.callbacks:
+            om2.MMessage.removeCallbacks(self.callbacks)
+        self.callbacks = []
+
+    def scene_changed(self, *args):
+        self.entries = {}
+        self.edited = set()
+
+    def curves_edited(self, curves, *args):
+        for i in range(len(curves)):
+            self.edited.add(om2.MObjectHandle(curves[i]).hashCode())
+
+    @classmethod
+    def get_node_curves(cls, node, skip=None):
+        curves = {}
+        it = om2.MItDependencyGraph(node, om2.MFn.kAnimCurve, om2.MItDependencyGraph.kUpstream,
+                                    om2.MItDependencyGraph.kDepthFirst, om2.MItDependencyGraph.kNodeLevel)
+        while not it.isDone():
+            curve = it.currentNode()
+            if skip is None or not cls.drives(curve, skip):
+                handle = om2.MObjectHandle(curve)
+                curves[handle.hashCode()] = handle
+            it.next()
+        return curves
+
+    @classmethod
+    def get_curves(cls, path, exclude=None, memo=None):
+        '''
+        Get the anim curves upstream of a node and of its parents.
+        path: MDagPath.
+        exclude: MObject whose own curves are skipped, like the locator driving the node.
+        memo: Dict of the parents' curves, shared by the calls of one operation.
+        return: Dict of curve hash code to MObjectHandle.
+        
+        '''
+        memo = {} if memo is None else memo
+        curves = cls.get_node_curves(path.node(), om2.MObjectHandle(exclude).hashCode()
+                                     if exclude is not None else None)
+        path = om2.MDagPath(path)
+        path.pop()
+        while path.length():
+            key = om2.MObjectHandle(path.node()).hashCode()
+            if key not in memo:
+                memo[key] = cls.get_node_curves(path.node())
+            curves.update(memo[key])
+            path.pop()
+
+        return curves
+
+    @classmethod
+    def drives(cls, curve, key):
+        for plug in om2.MFnDependencyNode(curve).findPlug('output', False).destinations():
+            if om2.MObjectHandle(plug.node()).hashCode() == key:
+                return True
+        return False
+
+    @classmethod
+    def snapshot(cls, curve):
+        '''
+        Copy the keys of a curve.
+        curve: MObject.
+        return: Dict of key time to (value, in/out tangent types and angles), None for non time curves.
+        
+        '''
+        fn = oma.MFnAnimCurve(curve)
+        if fn.isUnitlessInput:
+            return None
+
+        keys = {}
+        for i in range(fn.numKeys):
+            keys[fn.input(i).value] = (fn.value(i), fn.inTangentType(i), fn.outTangentType(i),
+                                       fn.getTangentAngleWeight(i, True)[0].value,
+                                       fn.getTangentAngleWeight(i, False)[0].value)
+        return keys
+
+    @classmethod
+    def get_intervals(cls, old, new, start, end):
+        '''
+        Get the intervals influenced by the differences between two snapshots.
+        old: Snapshot of the last bake.
+        new: Current snapshot.
+        start: Start of the baked range.
+        end: End of the baked range.
+        return: List of (start, end) intervals.
+        
+        '''
+        if old is None or new is None:
+            return [(start, end)] if old != new else []
+
+        intervals = []
+        for keys in [old, new]:
+            times = sorted(keys)
+            for ids, t in enumerate(times):
+                if old.get(t) != new.get(t):
+                    # Constant infinity, the first and last keys influence the range ends
+                    intervals.append((times[ids - 1] if ids else start,
+                                      times[ids + 1] if ids + 1 < len(times) else end))
+        return intervals
+
+    @classmethod
+    def merge(cls, intervals, start, end):
+        '''
+        Clamp intervals to a range and merge the overlapping ones.
+        intervals: List of (start, end).
+        start: Range start.
+        end: Range end.
+        return: Sorted list of (start, end).
+        
+        '''
+        merged = []
+        for a, b in sorted((max(a, start), min(b, end)) for a, b in intervals):
+            if a > b:
+                continue
+            if merged and a <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+            else:
+                merged.append((a, b))
+        return merged
+
+    def track(self, paths, locs, every_frame, rate=1, windows=None):
+        '''
+        Snapshot the upstream curves of baked controls.
+        paths: Control MDagPaths.
+        locs: Locators the controls were baked to.
+        every_frame: Same meaning as the bake's every_frame.
+        rate: Samples per frame of the bake.
+        windows: Merged FrameRanges windows of a partial bake, the playback range by default.
+        
+        '''
+        if not windows:
+            windows = [(cmds.playbackOptions(q=True, ast=True), cmds.playbackOptions(q=True, aet=True))]
+        start, end = windows[0][0], windows[-1][1]
+        memo = {}
+        for path, loc in zip(paths, locs):
+            loc = Modifier.get_node(loc)
+            curves = self.get_curves(path, loc, memo)
+            self.entries[om2.MObjectHandle(path.node()).hashCode()] = {
+                'loc': om2.MObjectHandle(loc), 'range': (start, end), 'keys': every_frame,
+                'rate': rate, 'windows': list(windows),
+                'curves': dict((key, (handle, self.snapshot(handle.object()))) for key, handle in curves.items())}
+
+    def get_dirty(self, path):
+        '''
+        Get the intervals to re-bake for a control.
+        path: Control MDagPath.
+        return: Entry and list of (start, end), None if the control was not tracked.
+        
+        '''
+        entry = self.entries.get(om2.MObjectHandle(path.node()).hashCode())
+        if entry is None or not entry['loc'].isValid():
+            return None, None
+
+        start, end = entry['range']
+        intervals = []
+        curves = self.get_curves(path, entry['loc'].object())
+        for key, handle in curves.items():
+            if key not in entry['curves']:
+                # A curve added upstream
+                intervals.append((start, end))
+            elif key in self.edited:
+                intervals.extend(self.get_intervals(entry['curves'][key][1], self.snapshot(handle.object()),
+                                                    start, end))
+        if set(entry['curves']) - set(curves):
+            intervals.append((start, end))
+
+        # Only the baked windows are re-baked, the keys outside them were never sampled
+        return entry, self.merge([(max(a, w_start), min(b, w_end)) for a, b in intervals
+                                  for w_start, w_end in entry['windows'] if a <= w_end and b >= w_start],
+                                 start, end)
+
+    def update(self, path, entry):
+        '''
+        Take new snapshots of a control's curves once it is re-baked.
+        path: Control MDagPath.
+        entry: Tracker entry.
+        
+        '''
+        curves = self.get_curves(path, entry['loc'].object())
+        entry['curves'] = dict((key, (handle, self.snapshot(handle.object()) if key in self.edited or
+                                      key not in entry['curves'] else entry['curves'][key][1]))
+                               for key, handle in curves.items())
+
+    def refresh(self, paths):
+        '''
+        Re-sample and re-key only the dirty intervals on the existing locators.
+        paths: Control MDagPaths.
+        return: Number of frames re-baked.
+        
+        '''
+        count = 0
+        done = []
+        for path in paths:
+            entry, intervals = self.get_dirty(path)
+            if not intervals:
+                continue
+
+            loc = entry['loc'].object()
+            for a, b in intervals:
+                count += self.rebake(path, loc, a, b, entry['keys'], entry['rate'], entry['windows'])
+            done.append((path, entry))
+
+        for path, entry in done:
+            self.update(path, entry)
+        if done:
+            # Only the curves of the other tracked controls stay edited, until those are refreshed
+            refreshed = set(id(entry) for path, entry in done)
+            self.edited &= set(key for entry in self.entries.values() if id(entry) not in refreshed
+                               for key in entry['curves'])
+        return count
+
+    def rebake(self, path, loc, start, end, keys, rate=1, windows=None):
+        '''
+        Re-bake one interval of a locator, rotations stay continuous with the key before it.
+        path: Control MDagPath.
+        loc: Locator MObject.
+        start: Interval start.
+        end: Interval end.
+        keys: Only key the keyed frames, like the bake.
+        rate: Samples per frame of the bake.
+        windows: Windows of the bake, the one holding the interval sets the sampling grid.
+        return: Number of frames re-baked.
+        
+        '''
+        loc_name = Registry.get_name(loc)
+        if keys:
+            window = (start, end)
+        else:
+            # Every frame bakes sample on the grid of their window, not from the interval start
+            window = next((w for w in windows or [] if w[0] <= start and end <= w[1]), (start, end))
+        frames = [f for f in MatrixBake.get_frames([path.fullPathName()], keys, rate, windows=[window])
+                  if start <= f <= end]
+
+        # The key before the interval anchors the euler filter
+        before = cmds.findKeyframe(loc_name, t=(start, start), which='previous', at='rx')
+        anchor = [before] if before is not None and before < start else []
+
+        values = MatrixBake.decompose(MatrixBake.sample([path], anchor + frames)[0],
+                                      Utils.get_rotate_order(loc))
+        if anchor:
+            fn = om2.MFnDependencyNode(loc)
+            for ids in [3, 4, 5]:
+                src = fn.findPlug(MatrixBake.channels[ids], False).source()
+                if src.isNull or not src.node().hasFn(om2.MFn.kAnimCurve):
+                    continue
+                current = oma.MFnAnimCurve(src.node()).evaluate(om2.MTime(before, om2.MTime.uiUnit()))
+                turns = round((current - values[ids][0]) / (2 * math.pi))
+                values[ids] = [v + turns * 2 * math.pi for v in values[ids]]
+            values = [v[1:] for v in values]
+
+        cmds.cutKey(loc_name, at=MatrixBake.channels, t=(start, end), clear=True)
+        with Modifier() as mod:
+            MatrixBake.set_keys(loc_name, frames, values, mod, keep=True)
+        return len(frames)
+
+
+class KeyIndex(object):
+    '''
+    Union of the key times driving bake sources, for the key only bakes. Each source's
+    upstream graph is walked once: its parents, constraint targets and their parents, and
+    the drivers of driven keys, whose own curves are skipped since their input is not time.
+    The sorted times of every queried node are cached until a curve, a connection, a parent
+    or the scene changes.
+    
+    '''
+    index_instance = None
+
+    # Samples added around each key time, and between consecutive key times
+    padding = 0
+    substeps = 0
+
+    @classmethod
+    def instance(cls):
+        if not cls.index_instance:
+            cls.index_instance = KeyIndex()
+            cls.index_instance.add_callbacks()
+
+        return cls.index_instance
+
+    def __init__(self):
+        self.entries = {}
+        self.callbacks = []
+
+    def add_callbacks(self):
+        if self.callbacks:
+            return
+
+        self.callbacks = [oma.MAnimMessage.addAnimCurveEditedCallback(self.clear),
+                          om2.MDGMessage.addConnectionCallback(self.clear),
+                          om2.MDagMessage.addParentAddedCallback(self.clear),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterOpen, self.clear),
+                          om2.MSceneMessage.addCallback(om2.MSceneMessage.kAfterNew, self.clear)]
+
+    def remove_callbacks(self):
+        if self.callbacks:
+            om2.MMessage.removeCallbacks(self.callbacks)
+        self.callbacks = []
+
+    def clear(self, *args):
+        self.entries = {}
+
+    @classmethod
+    def get_curve_times(cls, curve):
+        '''
+        Get the key times of a time input anim curve.
+        curve: Anim curve MObject.
+        return: List of frames, empty for driven key curves.
+        
+        '''
+        fn = oma.MFnAnimCurve(curve)
+        if fn.isUnitlessInput:
+            return []
+
+        unit = om2.MTime.uiUnit()
+        return [fn.input(i).asUnits(unit) for i in range(fn.numKeys)]
+
+    def get_times(self, node):
+        '''
+        Get the key times upstream of a node and of its parents.
+        node: MObject.
+        return: Sorted array('d') of frames.
+        
+        '''
+        key = om2.MObjectHandle(node).hashCode()
+        if key in self.entries:
+            return self.entries[key]
+
+        times = set()
+        seen = set()
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            current_key = om2.MObjectHandle(current).hashCode()
+            if current_key in seen:
+                continue
+            seen.add(current_key)
+            if current_key != key and current_key in self.entries:
+                times.update(self.entries[current_key])
+                continue
+
+            it = om2.MItDependencyGraph(current, om2.MFn.kInvalid, om2.MItDependencyGraph.kUpstream,
+                                        om2.MItDependencyGraph.kDepthFirst, om2.MItDependencyGraph.kNodeLevel)
+            while not it.isDone():
+                upstream = it.currentNode()
+                if upstream.hasFn(om2.MFn.kAnimCurve):
+                    times.update(self.get_curve_times(upstream))
+                elif upstream.hasFn(om2.MFn.kDagNode):
+                    # The world matrix of a dag node also depends on its parents
+                    fn = om2.MFnDagNode(upstream)
+                    for i in range(fn.parentCount()):
+                        parent = fn.parent(i)
+                        if not parent.hasFn(om2.MFn.kWorld):
+                            pending.append(parent)
+                it.next()
+
+        self.entries[key] = array('d', sorted(times))
+        return self.entries[key]
+
+    @classmethod
+    def expand(cls, times, start, end, padding=0, substeps=0):
+        '''
+        Add the padding and sub-frame samples to key times, inside a frame range.
+        times: Sorted key times.
+        start: Range start, always sampled.
+        end: Range end, always sampled.
+        padding: Frames sampled before and after each key.
+        substeps: Samples added between consecutive keys.
+        return: Sorted list of frames.
+        
+        '''
+        times = [t for t in times if start <= t <= end]
+        frames = set(times + [start, end])
+        for t in times:
+            for i in range(1, int(padding) + 1):
+                frames.update([t - i, t + i])
+
+        if substeps:
+            keys = sorted(frames)
+            for a, b in zip(keys, keys[1:]):
+                frames.update(a + (b - a) * i / (substeps + 1.0) for i in range(1, substeps + 1))
+
+        return sorted(f for f in frames if start <= f <= end)
+
+    def get_frames(self, nodes, start, end):
+        '''
+        Get the frames of a key only bake of several sources.
+        nodes: Source names, MObjects or MDagPaths.
+        start: Range start.
+        end: Range end.
+        return: Sorted list of frames.
+        
+        '''
+        times = set()
+        for path in Utils.get_paths(nodes):
+            times.update(self.get_times(path.node()))
+
+        return self.expand(sorted(times), start, end, self.padding, self.substeps)
+
+
+class FrameRanges(object):
+    '''
+    Frame ranges of partial bakes, from explicit ranges, the time slider highlight or the
+    selected keys, merged into the fewest evaluation windows. Only the windows are sampled
+    and keyed, the keys outside them stay. Near the window borders inside the playback
+    range, the new keys can blend in from the previous animation.
+    
+    '''
+    SOURCES = ['playback', 'slider', 'keys']
+
+    @classmethod
+    def merge(cls, ranges, gap=1.0):
+        '''
+        Merge frame ranges into sorted windows.
+        ranges: List of (start, end) or single frames.
+        gap: Ranges closer than this number of frames are joined.
+        return: List of (start, end).
+        
+        '''
+        windows = []
+        for start, end in sorted((min(r), max(r)) if isinstance(r, (list, tuple)) else (r, r) for r in ranges):
+            if windows and start - windows[-1][1] <= gap:
+                windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+            else:
+                windows.append((start, end))
+
+        return windows
+
+    @classmethod
+    def get_slider(cls):
+        '''
+        Get the highlighted range of the time slider.
+        return: List with one (start, end), empty when nothing is highlighted.
+        
+        '''
+        from maya import mel
+        slider = mel.eval('$tmp = $gPlayBackSlider')
+        if not cmds.timeControl(slider, q=True, rangeVisible=True):
+            return []
+
+        # The end of the highlight is exclusive
+        start, end = cmds.timeControl(slider, q=True, rangeArray=True)
+        return [(start, max(start, end - 1))]
+
+    @classmethod
+    def get_keys(cls):
+        '''
+        Get the ranges of the selected keys, one per run of consecutive selected keys of a curve.
+        return: List of (start, end).
+        
+        '''
+        ranges = []
+        for curve in cmds.keyframe(q=True, sl=True, n=True) or []:
+            selected = set(cmds.keyframe(curve, q=True, sl=True, tc=True) or [])
+            run = None
+            for t in cmds.keyframe(curve, q=True, tc=True) or []:
+                if t in selected:
+                    run = (run[0], t) if run else (t, t)
+                elif run:
+                    ranges.append(run)
+                    run = None
+            if run:
+                ranges.append(run)
+
+        return ranges
+
+    @classmethod
+    def get(cls, source=None):
+        '''
+        Get the bake windows.
+        source: List of (start, end), or one of SOURCES, None for the playback range.
+        return: Merged windows, None for the playback range or when the source is empty.
+        
+        '''
+        if source is None or source == 'playback':
+            return None
+        if source == 'slider':
+            source = cls.get_slider()
+        elif source == 'keys':
+            source = cls.get_keys()
+
+        return cls.merge(source) or None
+
+    @classmethod
+    def cut(cls, nodes, windows, attrs=None):
+        '''
+        Remove the keys inside the windows.
+        nodes: Nodes, or 'node.attr' names when attrs is None.
+        windows: Merged windows.
+        attrs: Attribute names.
+        
+        '''
+        kwargs = {'at': attrs} if attrs else {}
+        for window in windows:
+            cmds.cutKey(nodes, t=window, clear=True, **kwargs)
+
+    @classmethod
+    def get_curve(cls, plug):
+        '''
+        Get the anim curve holding the animation of an attribute, also behind a pairBlend
+        or the live follow.
+        plug: MPlug.
+        return: MObject, None if the attribute is not animated.
+        
+        '''
+        src = plug.source()
+        if src.isNull:
+            return None
+
+        node = src.node()
+        if node.hasFn(om2.MFn.kAnimCurve):
+            return node
+        if node.hasFn(om2.MFn.kPairBlend):
+            # outTranslateX is blended from inTranslateX1, the anim curve input
+            name = om2.MFnAttribute(src.attribute()).name
+            src = om2.MFnDependencyNode(node).findPlug('in{}1'.format(name[3:]), False).source()
+            return src.node() if not src.isNull and src.node().hasFn(om2.MFn.kAnimCurve) else None
+        if om2.MFnDependencyNode(node).typeName == LiveFollow.node_type:
+            return LiveFollow.get_curve(src)
+
+        return None
+
+    @classmethod
+    def get_weight(cls, frame, windows, blend, first, last):
+        '''
+        Get the weight of the new animation at a frame.
+        frame: Frame.
+        windows: Merged windows.
+        blend: Blend length in frames.
+        first: Playback start, no blend at a window border on it.
+        last: Playback end.
+        return: 0.0 for the old animation to 1.0 for the new one, eased.
+        
+        '''
+        weight = 1.0
+        for start, end in windows:
+            if start <= frame <= end:
+                if start > first:
+                    weight = min(weight, (frame - start) / float(blend))
+                if end < last:
+                    weight = min(weight, (end - frame) / float(blend))
+                break
+
+        weight = max(0.0, min(weight, 1.0))
+        return weight * weight * (3.0 - 2.0 * weight)
+
+    @classmethod
+    def capture(cls, plugs, frames, windows, blend):
+        '''
+        Evaluate the animation of attributes at the frames a partial bake keys near the window borders.
+        plugs: List of 'node.attr' names.
+        frames: Frames the bake keys.
+        windows: Merged windows, None for a full bake.
+        blend: Blend length in frames, 0 for no blend.
+        return: List of (plug name, list of (frame, old value, weight)), for blend_keys.
+        
+        '''
+        if not windows or not blend:
+            return []
+
+        first = cmds.playbackOptions(q=True, ast=True)
+        last = cmds.playbackOptions(q=True, aet=True)
+        zone = [(f, cls.get_weight(f, windows, blend, first, last)) for f in frames]
+        zone = [(f, w) for f, w in zone if w < 1.0]
+        if not zone:
+            return []
+
+        sel = om2.MSelectionList()
+        for p in plugs:
+            sel.add(p)
+        unit = om2.MTime.uiUnit()
+
+        captured = []
+        for i in range(sel.length()):
+            plug = sel.getPlug(i)
+            curve = cls.get_curve(plug)
+            if curve is not None:
+                fn = oma.MFnAnimCurve(curve)
+                captured.append((plug.name(), [(f, fn.evaluate(om2.MTime(f, unit)), w) for f, w in zone]))
+
+        return captured
+
+    @classmethod
+    def blend_keys(cls, captured, modifier=None):
+        '''
+        Blend the keys of a partial bake with the captured animation.
+        captured: Result of capture.
+        modifier: Collect the changes in this Modifier, applied here when None.
+        
+        '''
+        mod = modifier or Modifier()
+        unit = om2.MTime.uiUnit()
+        for name, zone in captured:
+            sel = om2.MSelectionList()
+            sel.add(name)
+            plug = sel.getPlug(0)
+            curve = cls.get_curve(plug)
+            if curve is None:
+                continue
+
+            fn = oma.MFnAnimCurve(curve)
+            for f, old, weight in zone:
+                ids = fn.find(om2.MTime(f, unit))
+                if ids is not None:
+                    mod.set_key(plug, fn, ids, old + (fn.value(ids) - old) * weight)
+
+        if modifier is None and not mod.empty:
+            mod.apply()
+
+
+class LiveFollow(object):
+    '''
+    Live follow of the locators without constraints: every control is one element of the
+    target array of a single wslFollow node (world_space_loc_plugin), which solves the
+    local transforms of all controls in one compute. The anim curves of the followed
+    channels are kept connected to the element, and reconnected when the follow is removed.
+    
+    '''
+    node_type = 'wslFollow'
+    node_name = 'WSpace_loc_follow'
+
+    MODES = ['parent', 'point', 'orient']
+    CONSTRAINTS = ['parentConstraint', 'pointConstraint', 'orientConstraint']
+    channels = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz']
+    # Transform stack of the controls, connected to the follow node and copied to the parity proxies
+    pivots = ['rotateAxis', 'scalePivot', 'scalePivotTranslate', 'rotatePivot', 'rotatePivotTranslate']
+
+    @classmethod
+    def get_channels(cls, mode):
+        '''
+        Get the channel ids driven by a follow mode.
+        mode: Index in MODES.
+        return: List of indices in channels.
+        
+        '''
+        return [[0, 1, 2, 3, 4, 5], [0, 1, 2], [3, 4, 5]][mode]
+
+    @classmethod
+    def get_node(cls, create=False):
+        '''
+        Get the wslFollow node of the scene.
+        create: Create it when there is none.
+        return: MObject, None if there is none or the plugin is not loaded.
+        
+        '''
+        if Modifier.get_plugin() is None:
+            return None
+
+        nodes = cmds.ls(type=cls.node_type) or []
+        if not nodes:
+            if not create:
+                return None
+            nodes = [cmds.createNode(cls.node_type, n=cls.node_name)]
+
+        return Modifier.get_node(nodes[0])
+
+    @classmethod
+    def get_entry(cls, path):
+        '''
+        Get the follow element driving a control.
+        path: Control MDagPath.
+        return: wslFollow MObject and element index, None if the control is not followed.
+        
+        '''
+        fn = om2.MFnDagNode(path)
+        for attr in cls.channels:
+            src = fn.findPlug(attr, False).source()
+            if not src.isNull and om2.MFnDependencyNode(src.node()).typeName == cls.node_type:
+                return src.node(), src.parent().parent().logicalIndex()
+
+        return None
+
+    @classmethod
+    def get_curve(cls, src):
+        '''
+        Get the anim curve a follow output replaced.
+        src: Output MPlug of the follow node, like output[0].outTranslateX.
+        return: MObject, None if the channel had no anim curve.
+        
+        '''
+        fn = om2.MFnDependencyNode(src.node())
+        name = om2.MFnAttribute(src.attribute()).name
+        channel = 'XYZ'.index(name[-1]) + (3 if name.startswith('outRotate') else 0)
+        element = fn.findPlug('target', False).elementByLogicalIndex(src.parent().parent().logicalIndex())
+        curve = element.child(fn.attribute('keyCurve')).elementByLogicalIndex(channel).source()
+        return None if curve.isNull else curve.node()
+
+    @classmethod
+    def get_offset(cls, path, loc_path, mode):
+        '''
+        Get the offset keeping a control at its current pose, like maintain offset.
+        path: Control MDagPath.
+        loc_path: Locator MDagPath.
+        mode: Index in MODES.
+        return: MMatrix.
+        
+        '''
+        ctrl = path.inclusiveMatrix()
+        loc = loc_path.inclusiveMatrix()
+        if mode == 1:
+            # Like pointConstraint, the rotate pivot follows the locator: it is at translate + rp + rpt
+            name = path.fullPathName()
+            pivot = om2.MPoint()
+            for attr in ['translate', 'rotatePivot', 'rotatePivotTranslate']:
+                pivot += om2.MVector(cmds.getAttr('{}.{}'.format(name, attr))[0])
+            offset = pivot - om2.MPoint(loc[12], loc[13], loc[14]) * path.exclusiveMatrixInverse()
+            matrix = om2.MTransformationMatrix()
+            matrix.setTranslation(offset, om2.MSpace.kTransform)
+            return matrix.asMatrix()
+        if mode == 2:
+            return (om2.MTransformationMatrix(ctrl).rotation(asQuaternion=True) *
+                    om2.MTransformationMatrix(loc).rotation(asQuaternion=True).conjugate()).asMatrix()
+
+        return ctrl * loc.inverse()
+
+    @classmethod
+    def add(cls, paths, locs, mode, offset, modifier):
+        '''
+        Drive controls from their locators through the follow node.
+        Controls with a followed channel driven by anything else than an anim curve are skipped.
+        paths: Control MDagPaths.
+        locs: Locator names, one per control.
+        mode: Index in MODES.
+        offset: Maintain the current pose of the controls.
+        modifier: Modifier collecting the connections.
+        return: Followed controls.
+        
+        '''
+        node = cls.get_node(create=True)
+        if node is None:
+            cmds.warning('{} is not loaded, live follow is not available'.format(Modifier.plugin))
+            return []
+
+        fn = om2.MFnDependencyNode(node)
+        target = fn.findPlug('target', False)
+        output = fn.findPlug('output', False)
+        attrs = dict((n, fn.attribute(n)) for n in ['targetMatrix', 'parentInverse', 'offsetMatrix', 'followMode',
+                                                    'targetRotateOrder', 'orientMatrix', 'keyCurve',
+                                                    'outTranslate', 'outRotate'])
+        stack = [fn.attribute('target{}{}'.format(a[0].upper(), a[1:])) for a in cls.pivots]
+        index = max(target.getExistingArrayAttributeIndices() or [-1]) + 1
+        channels = cls.get_channels(mode)
+
+        followed = []
+        for path, loc in zip(paths, locs):
+            ctrl = om2.MFnDagNode(path)
+            plugs = [ctrl.findPlug(cls.channels[c], False) for c in channels]
+            sources = [p.source() for p in plugs]
+            if any(p.isLocked or not src.isNull and not src.node().hasFn(om2.MFn.kAnimCurve)
+                   for p, src in zip(plugs, sources)):
+                continue
+
+            loc_path = Utils.get_paths([loc])[0]
+            element = target.elementByLogicalIndex(index)
+            out = output.elementByLogicalIndex(index)
+            index += 1
+
+            modifier.connect(om2.MFnDagNode(loc_path).findPlug('worldMatrix', False).elementByLogicalIndex(
+                loc_path.instanceNumber()), element.child(attrs['targetMatrix']))
+            modifier.connect(ctrl.findPlug('parentInverseMatrix', False).elementByLogicalIndex(path.instanceNumber()),
+                             element.child(attrs['parentInverse']))
+            modifier.connect(ctrl.findPlug('rotateOrder', False), element.child(attrs['targetRotateOrder']))
+            for attr, child in zip(cls.pivots, stack):
+                modifier.connect(ctrl.findPlug(attr, False), element.child(child))
+            modifier.set_plug(element.child(attrs['followMode']), mode)
+            modifier.set_matrix(element.child(attrs['offsetMatrix']),
+                                cls.get_offset(path, loc_path, mode) if offset else om2.MMatrix())
+            if path.hasFn(om2.MFn.kJoint):
+                orient = om2.MEulerRotation(*[a * math.pi / 180.0 for a in cmds.getAttr(
+                    '{}.jointOrient'.format(path.fullPathName()))[0]])
+                modifier.set_matrix(element.child(attrs['orientMatrix']), orient.asMatrix())
+
+            for c, plug, src in zip(channels, plugs, sources):
+                if not src.isNull:
+                    modifier.disconnect(src, plug)
+                    modifier.connect(om2.MFnDependencyNode(src.node()).findPlug('message', False),
+                                     element.child(attrs['keyCurve']).elementByLogicalIndex(c))
+                axis = out.child(attrs['outTranslate'] if c < 3 else attrs['outRotate']).child(c % 3)
+                modifier.connect(axis, plug)
+            followed.append(path)
+
+        return followed
+
+    @classmethod
+    def remove(cls, paths, modifier, restore=True):
+        '''
+        Stop following the locators.
+        paths: Control MDagPaths, the ones not followed are ignored.
+        modifier: Modifier collecting the changes.
+        restore: Reconnect the anim curves the follow replaced, delete them otherwise.
+        return: Controls that were followed.
+        
+        '''
+        removed = []
+        for path in paths:
+            entry = cls.get_entry(path)
+            if entry is None:
+                continue
+
+            node, index = entry
+            fn = om2.MFnDependencyNode(node)
+            element = fn.findPlug('target', False).elementByLogicalIndex(index)
+            curves = element.child(fn.attribute('keyCurve'))
+            ctrl = om2.MFnDagNode(path)
+
+            for c, attr in enumerate(cls.channels):
+                plug = ctrl.findPlug(attr, False)
+                src = plug.source()
+                if not src.isNull and src.node() == node:
+                    modifier.disconnect(src, plug)
+                curve = curves.elementByLogicalIndex(c).source()
+                if curve.isNull:
+                    continue
+                if restore:
+                    modifier.connect(om2.MFnDependencyNode(curve.node()).findPlug('output', False), plug)
+                else:
+                    modifier.delete_node(curve.node())
+
+            modifier.remove_multi(element)
+            modifier.remove_multi(fn.findPlug('output', False).elementByLogicalIndex(index))
+            removed.append(path)
+
+        return removed
+
+    @classmethod
+    def parity(cls, paths, frames):
+        '''
+        Compare the live follow with the constraints it replaces. Each followed control gets a
+        temporary proxy under the same parent, at the same pose, constrained to the same locator.
+        paths: Control MDagPaths, the ones not followed are ignored.
+        frames: Frames to compare.
+        return: Largest distance and angle (radians) between the controls and their proxies.
+        
+        '''
+        ctrls = []
+        proxies = []
+        modes = []
+        try:
+            for path in paths:
+                entry = cls.get_entry(path)
+                if entry is None:
+                    continue
+
+                node, index = entry
+                fn = om2.MFnDependencyNode(node)
+                element = fn.findPlug('target', False).elementByLogicalIndex(index)
+                loc = om2.MFnDagNode(element.child(fn.attribute('targetMatrix')).source().node()).fullPathName()
+                mode = element.child(fn.attribute('followMode')).asInt()
+                offset = not om2.MFnMatrixData(element.child(fn.attribute('offsetMatrix')).asMObject()).matrix() \
+                    .isEquivalent(om2.MMatrix())
+
+                obj = path.fullPathName()
+                parent = cmds.listRelatives(obj, p=True, f=True)
+                kwargs = {'p': parent[0]} if parent else {}
+                proxy = cmds.createNode('joint' if path.hasFn(om2.MFn.kJoint) else 'transform',
+                                        n='WSpace_loc_parity_#', ss=True, **kwargs)
+                proxy = (cmds.ls(proxy, l=True) or [proxy])[0]
+                proxies.append(proxy)
+                cmds.setAttr('{}.rotateOrder'.format(proxy), cmds.getAttr('{}.rotateOrder'.format(obj)))
+                # Same parent and same channels, the proxy starts at the pose of the control
+                attrs = ['translate', 'rotate', 'scale', 'shear'] + cls.pivots
+                if path.hasFn(om2.MFn.kJoint):
+                    attrs.append('jointOrient')
+                for attr in attrs:
+                    cmds.setAttr('{}.{}'.format(proxy, attr), *cmds.getAttr('{}.{}'.format(obj, attr))[0])
+                getattr(cmds, cls.CONSTRAINTS[mode])(loc, proxy, w=1.0, mo=offset)
+                ctrls.append(obj)
+                modes.append(mode)
+
+            if not ctrls:
+                return 0.0, 0.0
+
+            distance = 0.0
+            angle = 0.0
+            for mode, live, ref in zip(modes, MatrixBake.sample(ctrls, frames), MatrixBake.sample(proxies, frames)):
+                for a, b in zip(live, ref):
+                    if mode != 2:
+                        distance = max(distance, (om2.MVector(a[12], a[13], a[14]) -
+                                                  om2.MVector(b[12], b[13], b[14])).length())
+                    if mode != 1:
+                        qa = om2.MTransformationMatrix(a).rotation(asQuaternion=True)
+                        qb = om2.MTransformationMatrix(b).rotation(asQuaternion=True)
+                        dot = abs(qa.x * qb.x + qa.y * qb.y + qa.z * qb.z + qa.w * qb.w)
+                        angle = max(angle, 2.0 * math.acos(min(dot, 1.0)))
+
+            return distance, angle
+        finally:
+            if proxies:
+                cmds.delete(proxies)
+
+
+class WorldSpaceLoc(object):
+    '''
+    Every operation works on an explicit list of nodes (names, MObjects, MDagPaths
+    or an MSelectionList), the selection is only used when nodes is None.
+    
+    '''
+    def __init__(self):
+        self.prefix = 'WSpace_loc_'
+
+        self.aim_grp_prefix = 'WSpace_loc_aim_grp_'
+        self.aim_prefix = 'WSpace_loc_aim_target_'
+        self.up_prefix = 'WSpace_loc_aim_up_'
+
+        self.parent_constr = '_parentConstraint'
+        self.point_constr = '_pointConstraint'
+        self.orient_constr = '_orientConstraint'
+        self.aim_constr = '_aimConstraint'
+        self.target_constr = 'target_aimConstraint'
+        self.up_constr = 'up_aimConstraint'
+
+        self.registry = Registry.instance()
+        self.tracker = BakeTracker.instance()
+
+        # Key reduction tolerances, None to keep every baked key
+        self.reduce_tol = None
+        self.reduce_info = None
+
+        # BakeContext options and the duration of the last bake
+        self.bake_opts = {}
+        self.bake_time = 0.0
+
+        # Samples per frame of the every frame bakes, and the adaptive tolerances of the native
+        # bake_loc (distance, angle in radians) refining a grid of adaptive_step frames, None to keep every sample
+        self.sample_rate = 1
+        self.adaptive = None
+        self.adaptive_step = 4
+
+        # Fast mode: bakes run with the undo queue off, revert_bake restores the last snapshot
+        self.fast = False
+        self.snapshot_limit = 64 * 1024 * 1024
+        self.snapshot = None
+
+        # BakePlan of the last bake
+        self.plan = None
+
+        # Frame ranges of the bakes, FrameRanges.get source: a list of (start, end), 'slider', 'keys'
+        # or None for the playback range. Partial bakes blend in over range_blend frames at the borders
+        self.ranges = None
+        self.range_blend = 0
+
+        # Live mode: parent_loc, point_loc and orient_loc drive the controls through the
+        # single LiveFollow node instead of one constraint per control
+        self.live = False
+
+    def node_name(self, prefix, obj, suffix=''):
+        '''
+        Format the name of a world space node.
+        prefix: Name prefix.
+        obj: Control.
+        suffix: Name suffix.
+        return: Node name.
+        
+        '''
+        return '{}{}{}'.format(prefix, Utils.short_name(obj), suffix)
+
+    def reduce_keys(self, plugs, windows=None):
+        '''
+        Run the key reduction pass on baked attributes when it is enabled.
+        plugs: 'node.attr' names the bake wrote.
+        windows: Merged FrameRanges windows of a partial bake, None for every key.
+        
+        '''
+        if self.reduce_tol is None or not plugs:
+            return
+
+        self.reduce_info = KeyReduce.reduce(plugs, self.reduce_tol, windows)
+        om2.MGlobal.displayInfo('Removed {} keys on {} curves, max error t: {:.4f} r: {:.4f} s: {:.4f}'.format(
+            self.reduce_info['removed'], self.reduce_info['curves'], self.reduce_info['max_error']['t'],
+            self.reduce_info['max_error']['r'], self.reduce_info['max_error']['s']))
+
+    def create_locs(self, paths, prefix, parents=None):
+        '''
+        Create and link the locators of controllers in one Modifier.
+        paths: Controller MDagPaths.
+        prefix: Locator prefix, also the role of the locators.
+        parents: Parent of each locator, None for the world.
+        return: List of locator names.
+        
+        '''
+        with Modifier() as mod:
+            nodes = Utils.create_loc_nodes([path.fullPathName() for path in paths], prefix,
+                                           [Utils.get_rotate_order(path) for path in paths], mod, parents)
+            for path, (loc, shape) in zip(paths, nodes):
+                plugin = om2.MFnDependencyNode(shape).typeName == Utils.plugin_loc
+                self.registry.link(path.node(), shape if plugin else loc, prefix, mod)
+
+        return [Registry.get_name(loc) for loc, _ in nodes]
+
+    def take_snapshot(self, nodes=None):
+        '''
+        Copy the channels of nodes before a bake, when the fast mode is on.
+        nodes: Nodes whose channels the bake overwrites.
+        return: BakeSnapshot, inactive when the fast mode is off or the snapshot would exceed snapshot_limit.
+        
+        '''
+        # A new bake makes the previous snapshot stale
+        self.snapshot = None
+        if not self.fast:
+            return BakeSnapshot(active=False)
+
+        plugs = ['{}.{}'.format(n, attr) for n in nodes or [] for attr in MatrixBake.channels]
+        size = BakeSnapshot.estimate(plugs)
+        if size > self.snapshot_limit:
+            om2.MGlobal.displayWarning('Fast mode skipped, the snapshot needs {:.1f} MB over the {:.1f} MB limit'.format(
+                size / 1048576.0, self.snapshot_limit / 1048576.0))
+            return BakeSnapshot(active=False)
+
+        self.snapshot = BakeSnapshot(plugs)
+        om2.MGlobal.displayInfo('Fast mode snapshot: {} attributes, {} keys, {:.2f} MB'.format(
+            len(self.snapshot.names), self.snapshot.info()['keys'], self.snapshot.size / 1048576.0))
+        return self.snapshot
+
+    def revert_bake(self):
+        '''
+        Revert the last fast mode bake from its snapshot.
+        return: True if there was a snapshot to restore.
+        
+        '''
+        if self.snapshot is None:
+            return False
+
+        self.snapshot.revert()
+        self.snapshot = None
+        return True
+
+    @Profiler.wrap
+    @BakeContext.wrap
+    def bake_loc(self, every_frame, native=False, nodes=None):
+        '''
+        Bake the animation of objects to locators.
+        every_frame: Whether to bake every frame.
+        native: Sample the world matrices with MatrixBake instead of constraint + bakeResults.
+        nodes: Objects to bake, the selection by default.
+        
+        '''
+        if native:
+            job = self.bake_loc_job(every_frame, nodes=nodes)
+            if job:
+                job.run()
+            return
+
+        plan = self.plan = BakePlan(Utils.get_paths(nodes))
+        paths = plan.paths
+        s_lst = plan.targets
+        bake_lst = []
+        windows = FrameRanges.get(self.ranges)
+
+        if s_lst:
+            old_lst = [self.registry.get(path.node(), self.prefix) for path in paths]
+            keep_lst = [loc for loc in old_lst if loc] if windows else []
+            blend = []
+            with self.take_snapshot(keep_lst) as snapshot:
+                with plan.phase('setup'):
+                    if windows:
+                        # Partial bakes key the existing locators, only the missing ones are created
+                        new_lst = self.create_locs([path for path, loc in zip(paths, old_lst) if not loc], self.prefix)
+                        snapshot.add_created(new_lst)
+                        new_iter = iter(new_lst)
+                        bake_lst = [loc or next(new_iter) for loc in old_lst]
+                        blend = FrameRanges.capture(
+                            ['{}.{}'.format(loc, attr) for loc in keep_lst for attr in MatrixBake.channels],
+                            MatrixBake.get_frames(s_lst, every_frame, self.sample_rate, windows=windows),
+                            windows, self.range_blend)
+                    else:
+                        snapshot.delete([loc for loc in old_lst if loc])
+                        bake_lst = self.create_locs(paths, self.prefix)
+                        snapshot.add_created(bake_lst)
+
+                with plan.phase('constraint'):
+                    for obj, loc in zip(s_lst, bake_lst):
+                        cmds.parentConstraint(obj, loc, w=1.0, mo=False)
+
+                with plan.phase('bake'):
+                    Utils.bake_obj(bake_lst, every_frame, self.sample_rate, windows)
+
+                with plan.phase('cleanup'):
+                    cmds.delete(bake_lst, cn=True)
+                    FrameRanges.blend_keys(blend)
+                    self.reduce_keys(['{}.{}'.format(loc, attr) for loc in bake_lst for attr in MatrixBake.channels],
+                                     windows)
+                    self.tracker.track(paths, bake_lst, every_frame, self.sample_rate, windows)
+                    if nodes is None:
+                        cmds.select(s_lst)
+
+    @Profiler.wrap
+    @BakeContext.wrap
+    def refresh_loc(self, nodes=None):
+        '''
+        Re-bake only the frame intervals whose source animation changed since the last bake_loc,
+        on the existing locators.
+        nodes: Objects baked with bake_loc, the selection by default.
+        return: Number of frames re-baked.
+        
+        '''
+        return self.tracker.refresh(Utils.get_paths(nodes))
+
+    def bake_loc_job(self, every_frame, chunk=50, nodes=None):
+        '''
+        Set up a chunked native bake of objects to locators.
+        Previous locators are only replaced when the job finishes, partial bakes key them instead.
+        every_frame: Whether to bake every frame.
+        chunk: Number of frames sampled per step.
+        nodes: Objects to bake, the selection by default.
+        return: BakeJob, None if there is nothing to bake.
+        
+        '''
+        plan = self.plan = BakePlan(Utils.get_paths(nodes))
+        paths = plan.paths
+        s_lst = plan.targets
+        if not s_lst:
+            return None
+
+        windows = FrameRanges.get(self.ranges)
+        old_dict = {}
+        for obj, path in zip(s_lst, paths):
+            old_loc = self.registry.get(path.node(), self.prefix)
+            if old_loc:
+                old_dict[obj] = old_loc
+
+        if windows:
+            new_lst = self.create_locs([path for obj, path in zip(s_lst, paths) if obj not in old_dict], self.prefix)
+            new_iter = iter(new_lst)
+            bake_lst = [old_dict.get(obj) or next(new_iter) for obj in s_lst]
+            keep_lst = list(old_dict.values())
+            old_dict = {}
+        else:
+            bake_lst = new_lst = self.create_locs(paths, self.prefix)
+            keep_lst = []
+
+        # Adaptive bakes sample a coarse grid first, refined when the job finishes
+        adaptive = self.adaptive is not None and not every_frame
+        frames = MatrixBake.get_frames(s_lst, every_frame, self.sample_rate, self.adaptive_step if adaptive else 1,
+                                       windows)
+        # Refined frames fall on the full rate grid
+        blend = FrameRanges.capture(['{}.{}'.format(loc, attr) for loc in keep_lst for attr in MatrixBake.channels],
+                                    MatrixBake.get_frames(s_lst, every_frame, self.sample_rate, windows=windows)
+                                    if adaptive else frames, windows, self.range_blend)
+
+        def sample(frames):
+            return MatrixBake.sample(paths, frames)
+
+        def finish(frames, samples):
+            if keep_lst:
+                FrameRanges.cut(keep_lst, windows, MatrixBake.channels)
+            if adaptive:
+                frame_lst, samples = MatrixBake.refine(paths, frames, samples, self.sample_rate, self.adaptive,
+                                                       windows)
+                for loc, loc_frames, matrices in zip(bake_lst, frame_lst, samples):
+                    MatrixBake.write([loc], loc_frames, [matrices], bool(windows))
+            else:
+                MatrixBake.write(bake_lst, frames, samples, bool(windows))
+            FrameRanges.blend_keys(blend)
+            if old_dict:
+                cmds.delete(list(old_dict.values()))
+                for obj in old_dict:
+                    cmds.rename(self.registry.get(obj, self.prefix), self.node_name(self.prefix, obj))
+            loc_lst = [self.registry.get(path.node(), self.prefix) for path in paths]
+            self.reduce_keys(['{}.{}'.format(loc, attr) for loc in loc_lst for attr in MatrixBake.channels], windows)
+            self.tracker.track(paths, loc_lst, every_frame, self.sample_rate, windows)
+            if nodes is None:
+                cmds.select(s_lst)
+
+        def cancel():
+            if new_lst:
+                cmds.delete(new_lst)
+            for obj, old_loc in old_dict.items():
+                self.registry.link(obj, old_loc, self.prefix)
+            if nodes is None:
+                cmds.select(s_lst)
+
+        return BakeJob(frames, sample, finish, cancel, chunk, plan)
+
+    @Profiler.wrap
+    def export_locs(self, path, every_frame, nodes=None, chunk=100):
+        '''
+        Sample the world space channels of objects and write them to an AnimFile.
+        path: File path.
+        every_frame: Whether to bake every frame.
+        nodes: Objects to export, usually baked locators, the selection by default.
+        chunk: Number of objects sampled together, bounds the memory used by the matrices.
+        return: Number of exported objects.
+
+        '''
+        paths = Utils.get_paths(nodes)
+        s_lst = [p.fullPathName() for p in paths]
+        if not s_lst:
+            return 0
+
+        frames = MatrixBake.get_frames(s_lst, every_frame, self.sample_rate)
+        entries = []
+        for i in range(0, len(paths), chunk):
+            group = paths[i:i + chunk]
+            for p, matrices in zip(group, MatrixBake.sample(group, frames)):
+                ro = Utils.get_rotate_order(p)
+                entries.append((Utils.short_name(p.fullPathName()), ro, frames, MatrixBake.decompose(matrices, ro)))
+
+        fps = om2.MTime(1.0, om2.MTime.kSeconds).asUnits(om2.MTime.uiUnit())
+        AnimFile.write(path, entries, {'fps': fps})
+        return len(entries)
+
+    @Profiler.wrap
+    def import_locs(self, path, names=None, start=None, end=None, prefix=''):
+        '''
+        Create or update locators from an AnimFile, keys are written in bulk.
+        Existing objects only have their keys inside the frame window replaced.
+        path: File path.
+        names: Names of the nodes to import, all of them when None.
+        start: First frame of the window, in scene frames, from the beginning when None.
+        end: Last frame of the window, in scene frames, to the end when None.
+        prefix: Prefix added to the locator names.
+        return: List of locator names.
+
+        '''
+        with AnimFile(path) as data:
+            names = data.names if names is None else [n for n in names if n in data.nodes]
+            if not names:
+                return []
+
+            # Frames are converted when the file was written at another frame rate
+            fps = om2.MTime(1.0, om2.MTime.kSeconds).asUnits(om2.MTime.uiUnit())
+            scale = fps / data.info.get('fps', fps)
+            window = [None if f is None else f / scale for f in (start, end)]
+
+            loc_lst = ['{}{}'.format(prefix, n) for n in names]
+            new_lst = [(n, loc) for n, loc in zip(names, loc_lst) if not cmds.objExists(loc)]
+            if new_lst:
+                Utils.create_locs([n for n, _ in new_lst], prefix, [data.nodes[n]['ro'] for n, _ in new_lst])
+
+            keep = start is not None or end is not None
+            with Modifier() as mod:
+                for n, loc in zip(names, loc_lst):
+                    frames, values = data.read(n, *window)
+                    if not len(frames):
+                        continue
+                    frames = [f * scale for f in frames]
+                    if keep:
+                        cmds.cutKey(loc, at=MatrixBake.channels, t=(frames[0], frames[-1]), clear=True)
+                    MatrixBake.set_keys(loc, frames, values, mod, keep)
+
+        return loc_lst
+
+    @Profiler.wrap
+    def parent_loc(self, offset, nodes=None):
+        '''
+        Parent the locators to the controllers using various constraint types.
+        In live mode the controllers follow through LiveFollow instead of constraints.
+        offset: Preserve offset.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        with Modifier() as mod:
+            follow = []
+            for path in Utils.get_paths(nodes):
+                obj = path.fullPathName()
+                node = path.node()
+                loc = self.registry.get(node, self.prefix)
+                if loc and not self.registry.has(node, [self.parent_constr, self.point_constr,
+                                                        self.orient_constr, self.aim_constr]) and \
+                        LiveFollow.get_entry(path) is None:
+                    if self.live:
+                        follow.append((path, loc))
+                        continue
+                    constr = cmds.parentConstraint(loc, obj, w=1.0, mo=offset,
+                                                   n=self.node_name(self.prefix, obj, self.parent_constr))
+                    self.registry.link(node, constr[0], self.parent_constr, mod)
+
+            if follow:
+                LiveFollow.add(*zip(*follow), mode=0, offset=offset, modifier=mod)
+
+    @Profiler.wrap
+    def point_loc(self, offset, nodes=None):
+        '''
+        Point constrain the locators to the controllers using various constraint types.
+        offset: Preserve offset.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        with Modifier() as mod:
+            follow = []
+            for path in Utils.get_paths(nodes):
+                obj = path.fullPathName()
+                node = path.node()
+                loc = self.registry.get(node, self.prefix)
+                # Check constraint types
+                if loc and not self.registry.has(node, [self.point_constr, self.parent_constr]) and \
+                        LiveFollow.get_entry(path) is None:
+                    if self.live and not self.registry.has(node, [self.orient_constr, self.aim_constr]):
+                        follow.append((path, loc))
+                        continue
+                    constr = cmds.pointConstraint(loc, obj, w=1.0, mo=offset,
+                                                  n=self.node_name(self.prefix, obj, self.point_constr))
+                    self.registry.link(node, constr[0], self.point_constr, mod)
+
+            if follow:
+                LiveFollow.add(*zip(*follow), mode=1, offset=offset, modifier=mod)
+
+    @Profiler.wrap
+    def orient_loc(self, offset, nodes=None):
+        '''
+        Orient constrain the locators to the controllers using various constraint types.
+        offset: Preserve offset.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        with Modifier() as mod:
+            follow = []
+            for path in Utils.get_paths(nodes):
+                obj = path.fullPathName()
+                node = path.node()
+                loc = self.registry.get(node, self.prefix)
+                # Check constraint types
+                if loc and not self.registry.has(node, [self.parent_constr, self.orient_constr,
+                                                        self.aim_constr]) and LiveFollow.get_entry(path) is None:
+                    if self.live and not self.registry.has(node, [self.point_constr]):
+                        follow.append((path, loc))
+                        continue
+                    constr = cmds.orientConstraint(loc, obj, w=1.0, mo=offset,
+                                                   n=self.node_name(self.prefix, obj, self.orient_constr))
+                    self.registry.link(node, constr[0], self.orient_constr, mod)
+
+            if follow:
+                LiveFollow.add(*zip(*follow), mode=2, offset=offset, modifier=mod)
+
+    def follow_parity(self, frames=None, nodes=None):
+        '''
+        Compare the live followed controllers with the constraints of the same type and offset.
+        frames: Frames to compare, the playback range by default.
+        nodes: Controllers, the selection by default.
+        return: Largest distance and angle (radians) over all controllers and frames.
+        
+        '''
+        if frames is None:
+            frames = range(int(cmds.playbackOptions(q=True, ast=True)), int(cmds.playbackOptions(q=True, aet=True)) + 1)
+
+        return LiveFollow.parity(Utils.get_paths(nodes), list(frames))
+
+    def get_locs(self, nodes=None):
+        '''
+        Get the locators of controllers.
+        nodes: Controllers, the selection by default.
+        return: List of locators.
+        
+        '''
+        prefix_lst = [self.aim_prefix, self.up_prefix, self.prefix]
+        loc_lst = []
+
+        for path in Utils.get_paths(nodes):
+            for n in prefix_lst:
+                loc = self.registry.get(path.node(), n)
+                if loc:
+                    loc_lst.append(loc)
+
+        return loc_lst
+
+    @Profiler.wrap
+    def select_loc(self, nodes=None):
+        '''
+        Select the locators of controllers.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        paths = Utils.get_paths(nodes)
+        if paths:
+            # One undoable select command over every locator
+            cmds.select(self.get_locs(paths))
+
+    @Profiler.wrap
+    def delete_constr(self, nodes=None):
+        '''
+        Delete world space constraints on controllers.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        constr_prefix_lst = [self.parent_constr, self.point_constr, self.orient_constr,
+                             self.aim_constr]
+
+        paths = Utils.get_paths(nodes)
+        for path in paths:
+            node = path.node()
+            for n in constr_prefix_lst:
+                constr = self.registry.get(node, n)
+                if constr:
+                    cmds.delete(constr, cn=True)
+                    # Delete target constraints
+                    if n == self.aim_constr:
+                        cmds.delete([loc for loc in [self.registry.get(node, self.aim_prefix),
+                                                     self.registry.get(node, self.up_prefix)] if loc])
+            # Delete target constraint groups
+            grp = self.registry.get(node, self.aim_grp_prefix)
+            if grp:
+                cmds.delete(grp)
+
+        # Live followed controls get their own anim curves back
+        with Modifier() as mod:
+            LiveFollow.remove(paths, mod)
+
+    def get_ctrl_constr(self, paths):
+        '''
+        Collect the world space constraints of controllers.
+        paths: Controller MDagPaths.
+        return: Constrained controllers, constraints and aim target locators.
+        
+        '''
+        bake_lst = []
+        constr_lst = []
+
+        # Target constraint components
+        aim_lst = []
+
+        # Constraint suffixes
+        constr_prefix_lst = [self.parent_constr, self.point_constr, self.orient_constr,
+                             self.aim_constr]
+
+        for path in paths:
+            node = path.node()
+            # Loop through constraint list
+            for n in constr_prefix_lst:
+                # If the constraint exists
+                constr = self.registry.get(node, n)
+                if constr:
+                    bake_lst.append(path.fullPathName())
+                    constr_lst.append(constr)
+
+                    # If it's the aim constraint, handle the two locators separately
+                    if n == self.aim_constr:
+                        aim_lst.extend([loc for loc in [self.registry.get(node, self.aim_prefix),
+                                                        self.registry.get(node, self.up_prefix)] if loc])
+
+            # Live followed controls have no constraint node
+            if LiveFollow.get_entry(path) is not None:
+                bake_lst.append(path.fullPathName())
+
+        return bake_lst, constr_lst, aim_lst
+
+    def get_constr_plugs(self, objs):
+        '''
+        Get the transform attributes driven by constraints or the live follow.
+        objs: Controllers.
+        return: List of 'node.attr' names.
+        
+        '''
+        plugs = []
+        for path in Utils.get_paths(objs):
+            fn = om2.MFnDagNode(path)
+            for attr in MatrixBake.channels[:6]:
+                src = fn.findPlug(attr, False).source()
+                if not src.isNull and (src.node().hasFn(om2.MFn.kConstraint) or
+                                       src.node().hasFn(om2.MFn.kPairBlend) or
+                                       om2.MFnDependencyNode(src.node()).typeName == LiveFollow.node_type):
+                    plugs.append('{}.{}'.format(path.fullPathName(), attr))
+
+        return plugs
+
+    @Profiler.wrap
+    @BakeContext.wrap
+    def bake_ctrl(self, every_frame, native=False, nodes=None):
+        '''
+        Bake the animation of the controllers and delete the constraints.
+        every_frame: Whether to bake every frame.
+        native: Sample the constrained attributes with MatrixBake instead of bakeResults.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        if native:
+            job = self.bake_ctrl_job(every_frame, nodes=nodes)
+            if job:
+                job.run()
+            return
+
+        paths = Utils.get_paths(nodes)
+        windows = FrameRanges.get(self.ranges)
+
+        if paths:
+            with Profiler.phase('setup'):
+                bake_lst, constr_lst, aim_lst = self.get_ctrl_constr(paths)
+                # A control with several constraints is listed once per constraint
+                plan = self.plan = BakePlan(bake_lst)
+                snapshot = self.take_snapshot(plan.targets)
+
+                blend = []
+                live_plugs = []
+                targets = plan.targets
+                # Only the constrained attributes are reduced once the constraints are gone
+                plugs = self.get_constr_plugs(plan.paths)
+                if windows:
+                    frames = MatrixBake.get_frames(plan.targets, every_frame, self.sample_rate, windows=windows)
+                    blend = FrameRanges.capture(plugs, frames, windows, self.range_blend)
+                    # bakeResults would drop the curves kept by the live follow, the followed controls are sampled
+                    live = [path for path in plan.paths if LiveFollow.get_entry(path) is not None]
+                    live_plugs = self.get_constr_plugs(live)
+                    targets = [path.fullPathName() for path in plan.paths if path not in live]
+
+            if not plan.targets:
+                return
+
+            with snapshot:
+                with plan.phase('bake'):
+                    if live_plugs:
+                        values = MatrixBake.sample_plugs(live_plugs, frames)
+                    Utils.bake_obj(targets, keys=every_frame, rate=self.sample_rate, windows=windows)
+
+                with plan.phase('cleanup'):
+                    # Constraints and aim constraint locators
+                    snapshot.delete(constr_lst + aim_lst)
+                    mod = Modifier()
+                    LiveFollow.remove(plan.paths, mod, restore=bool(windows))
+                    snapshot.apply(mod)
+                    if live_plugs:
+                        FrameRanges.cut(live_plugs, windows)
+                        with Modifier() as mod:
+                            MatrixBake.set_plug_keys(live_plugs, frames, values, mod, keep=True)
+                    FrameRanges.blend_keys(blend)
+                    self.reduce_keys(plugs, windows)
+
+    def bake_ctrl_job(self, every_frame, chunk=50, nodes=None):
+        '''
+        Set up a chunked native bake of the constrained controllers.
+        The constraints are only deleted when the job finishes.
+        every_frame: Whether to bake every frame.
+        chunk: Number of frames sampled per step.
+        nodes: Controllers, the selection by default.
+        return: BakeJob, None if nothing is constrained.
+        
+        '''
+        paths = Utils.get_paths(nodes)
+        if not paths:
+            return None
+
+        bake_lst, constr_lst, aim_lst = self.get_ctrl_constr(paths)
+        plan = self.plan = BakePlan(bake_lst)
+        plugs = self.get_constr_plugs(plan.paths)
+        if not plugs:
+            return None
+
+        # The keys of the driving locators decide the frames
+        loc_lst = [loc for loc in [self.registry.get(path.node(), self.prefix) for path in plan.paths] if loc]
+        windows = FrameRanges.get(self.ranges)
+        frames = MatrixBake.get_frames(loc_lst + aim_lst, every_frame, self.sample_rate, windows=windows)
+        blend = FrameRanges.capture(plugs, frames, windows, self.range_blend)
+
+        def sample(frames):
+            return MatrixBake.sample_plugs(plugs, frames)
+
+        # One undo step, also when the job is run from a script
+        @Utils.add_undo
+        def finish(frames, values):
+            if constr_lst:
+                cmds.delete(constr_lst, cn=True)
+            if aim_lst:
+                cmds.delete(aim_lst)
+            with Modifier() as mod:
+                LiveFollow.remove(plan.paths, mod, restore=bool(windows))
+            if windows:
+                FrameRanges.cut(plugs, windows)
+
+            with Modifier() as mod:
+                MatrixBake.set_plug_keys(plugs, frames, values, mod, keep=bool(windows))
+            FrameRanges.blend_keys(blend)
+            self.reduce_keys(plugs, windows)
+
+        return BakeJob(frames, sample, finish, None, chunk, plan)
+
+    @Profiler.wrap
+    def scale_loc_add(self, num, nodes=None):
+        '''
+        Scale the locators by a given value.
+        num: Scale value.
+        nodes: Locators, the selection by default.
+        
+        '''
+        ScaleSnapshot(nodes).commit(num)
+
+    def scale_snapshot(self, nodes=None):
+        '''
+        Snapshot the locators for interactive scaling.
+        nodes: Locators, the selection by default.
+        return: ScaleSnapshot.
+        
+        '''
+        return ScaleSnapshot(nodes)
+
+    @Profiler.wrap
+    def aim_loc(self, nodes=None):
+        '''
+        Create aim constraint locators. 
+        nodes: Controllers, the selection by default.
+        
+        '''
+        paths = [path for path in Utils.get_paths(nodes)
+                 if not self.registry.has(path.node(), [self.aim_grp_prefix, self.parent_constr,
+                                                        self.aim_constr, self.orient_constr])]
+        if not paths:
+            return
+
+        # Groups and locators of every controller in one Modifier
+        with Modifier() as mod:
+            grp_lst = [mod.create_node('transform', self.node_name(self.aim_grp_prefix, path.fullPathName()))
+                       for path in paths]
+            for path, grp in zip(paths, grp_lst):
+                self.registry.link(path.node(), grp, self.aim_grp_prefix, mod)
+        grp_lst = [Registry.get_name(grp) for grp in grp_lst]
+
+        aim_lst = self.create_locs(paths, self.aim_prefix, grp_lst)
+        self.create_locs(paths, self.up_prefix, grp_lst)
+
+        with Modifier() as mod:
+            for path, grp in zip(paths, grp_lst):
+                obj = path.fullPathName()
+                constr = cmds.parentConstraint(obj, grp, w=1.0, mo=False,
+                                               n=self.node_name(self.prefix, obj, self.parent_constr))
+                self.registry.link(path.node(), constr[0], self.parent_constr, mod)
+
+        if nodes is None:
+            cmds.select(aim_lst[-1])
+
+    @Profiler.wrap
+    @BakeContext.wrap
+    def bake_aim(self, every_frame, native=False, nodes=None):
+        '''
+        Bake aim constraint locators and apply aim constraints.
+        every_frame: Whether to bake every frame.
+        native: Compute the locator trajectories from the sampled controller matrices,
+                without temporary constraints and bakeResults.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        paths = Utils.get_paths(nodes)
+        normal_lst = []
+        point_lst = []
+        bake_lst = []
+        aim_lst = []
+
+        if paths:
+            # Set up the aim and up locators of every object first
+            with Profiler.phase('setup'):
+                for path in paths:
+                    obj = path.fullPathName()
+                    node = path.node()
+                    grp = self.registry.get(node, self.aim_grp_prefix)
+                    aim_loc = self.registry.get(node, self.aim_prefix)
+                    up_loc = self.registry.get(node, self.up_prefix)
+                    if grp and aim_loc and up_loc:
+                        # Get the normalized vectors of the locators
+                        normal_lst.append([Utils.get_norm_vec(aim_loc), Utils.get_norm_vec(up_loc)])
+                        if native:
+                            # Locator positions in the controller space, the offsets kept by the constraints
+                            inverse = path.inclusiveMatrix().inverse()
+                            point_lst.append([om2.MPoint() * loc.inclusiveMatrix() * inverse
+                                              for loc in Utils.get_paths([aim_loc, up_loc])])
+
+                        # Unparent the constraints
+                        aim_loc, up_loc = cmds.parent(aim_loc, up_loc, w=True)
+                        cmds.delete(grp)
+
+                        if not native:
+                            cmds.parentConstraint(obj, aim_loc, w=1.0, mo=True,
+                                                  n=self.node_name(self.prefix, obj, self.target_constr))
+                            cmds.parentConstraint(obj, up_loc, w=1.0, mo=True,
+                                                  n=self.node_name(self.prefix, obj, self.up_constr))
+                        bake_lst.extend([aim_loc, up_loc])
+                        aim_lst.append(path)
+
+            if not aim_lst:
+                return
+
+            # One bake over the whole range for all locators
+            with Profiler.phase('bake'):
+                if native:
+                    frames = MatrixBake.get_frames([path.fullPathName() for path in aim_lst], every_frame,
+                                                   self.sample_rate)
+                    MatrixBake.bake_points(aim_lst, point_lst, [bake_lst[i:i + 2] for i in range(0, len(bake_lst), 2)],
+                                           frames)
+                else:
+                    Utils.bake_obj(bake_lst, every_frame, self.sample_rate)
+
+            with Profiler.phase('cleanup'):
+                if not native:
+                    cmds.delete(bake_lst, cn=True)
+                self.reduce_keys(['{}.{}'.format(loc, attr) for loc in bake_lst for attr in MatrixBake.channels])
+
+            # Apply the aim constraints
+            with Profiler.phase('constraint'), Modifier() as mod:
+                for path, normal in zip(aim_lst, normal_lst):
+                    obj = path.fullPathName()
+                    aim_loc = self.registry.get(path.node(), self.aim_prefix)
+                    up_loc = self.registry.get(path.node(), self.up_prefix)
+                    constr = cmds.aimConstraint(aim_loc, obj, aim=normal[0], u=normal[1],
+                                                mo=False, w=1.0, wut='object', wuo=up_loc,
+                                                n=self.node_name(self.prefix, obj, self.aim_constr))
+                    self.registry.link(path.node(), constr[0], self.aim_constr, mod)
+
+            if nodes is None:
+                cmds.select([path.fullPathName() for path in paths])
+
+    @Profiler.wrap
+    def set_color(self, colorid, nodes=None):
+        '''
+        Batch set controller color.
+        colorid: Color ID.
+        nodes: Controllers, the selection by default.
+        
+        '''
+        with Modifier() as mod:
+            for path in Utils.get_paths(nodes):
+                if path.node().hasFn(om2.MFn.kJoint):
+                    Utils.set_attr([path.node()], ['overrideEnabled', 'overrideColor'], [1, colorid], mod)
+                    continue
+
+                fn = om2.MFnDagNode(path)
+                for i in range(fn.childCount()):
+                    child = fn.child(i)
+                    if child.hasFn(om2.MFn.kShape):
+                        Utils.set_attr([child], ['overrideEnabled', 'overrideColor'], [1, colorid], mod)
@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+'''
+World Space Locator plugin (Python API 2.0).
+
+wslApplyModifier: applies the next pending Modifier from world_space_loc_core with one doIt,
+and registers it in the undo queue.
+wslLocator: light locator shape with a single size attribute, the link to its control and the
+control's rotate order as static attributes.
+wslLocatorDraw: draws all the wslLocators of the scene as instances of one Viewport 2.0 render item.
+wslFollow: one node driving the translate and rotate of many controls from their locators,
+all of them solved in a single compute (NumPy when available).
+
+The node ids 0x0007F3A1 - 0x0007F3A3 are in 0x00000000 - 0x0007FFFF, the range Autodesk leaves
+to plug-ins only used locally: another local plug-in may use the same ids. Before sharing scenes
+outside the studio, replace them by ids of a block registered with Autodesk. Binary scenes store
+the ids, so they can't change once such scenes exist.
+
+'''
+import ctypes
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaRender as omr
+
+try:
+    import numpy as np
+    from world_space_decompose import Decompose
+except ImportError:
+    np = None
+
+# Modifiers waiting to be applied, anything with doIt and undoIt methods
+pending = []
+
+
+def maya_useNewAPI():
+    pass
+
+
+class ApplyModifierCmd(om2.MPxCommand):
+    name = 'wslApplyModifier'
+
+    def __init__(self):
+        super(ApplyModifierCmd, self).__init__()
+        self.modifier = None
+
+    @staticmethod
+    def creator():
+        return ApplyModifierCmd()
+
+    def doIt(self, args):
+        if pending:
+            self.modifier = pending.pop(0)
+        self.redoIt()
+
+    def redoIt(self):
+        if self.modifier:
+            self.modifier.doIt()
+
+    def undoIt(self):
+        if self.modifier:
+            self.modifier.undoIt()
+
+    def isUndoable(self):
+        return self.modifier is not None
+
+
+class LocatorNode(om2.MPxLocatorNode):
+    name = 'wslLocator'
+    id = om2.MTypeId(0x0007F3A1)
+    # No override is registered for it, all the locators are drawn by the wslLocatorDraw node
+    classification = 'drawdb/geometry/wslLocator'
+
+    # Same names as the link attributes of Registry, so no dynamic attribute is needed
+    size = None
+    source = None
+    role = None
+    rotate_order = None
+
+    # MObjectHandle of every node by hash code, drawn by LocatorSubScene
+    nodes = {}
+
+    def __init__(self):
+        super(LocatorNode, self).__init__()
+
+    @staticmethod
+    def creator():
+        return LocatorNode()
+
+    @staticmethod
+    def initialize():
+        numeric = om2.MFnNumericAttribute()
+        LocatorNode.size = numeric.create('size', 'wsz', om2.MFnNumericData.kDouble, 1.0)
+        numeric.setMin(0.0)
+        numeric.keyable = False
+        numeric.channelBox = True
+
+        LocatorNode.source = om2.MFnMessageAttribute().create('wslSource', 'wslSource')
+
+        typed = om2.MFnTypedAttribute()
+        LocatorNode.role = typed.create('wslRole', 'wslRole', om2.MFnData.kString)
+
+        enum = om2.MFnEnumAttribute()
+        LocatorNode.rotate_order = enum.create('wslRotateOrder', 'wslRotateOrder', 0)
+        for ids, order in enumerate(['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']):
+            enum.addField(order, ids)
+
+        for attr in [LocatorNode.size, LocatorNode.source, LocatorNode.role, LocatorNode.rotate_order]:
+            om2.MPxNode.addAttribute(attr)
+
+    def postConstructor(self):
+        handle = om2.MObjectHandle(self.thisMObject())
+        LocatorNode.nodes[handle.hashCode()] = handle
+
+    @classmethod
+    def get_size(cls, obj):
+        return om2.MPlug(obj, cls.size).asDouble()
+
+    @classmethod
+    def get_box(cls, size):
+        return om2.MBoundingBox(om2.MPoint(-size, -size, -size), om2.MPoint(size, size, size))
+
+    def isBounded(self):
+        return True
+
+    def boundingBox(self):
+        return self.get_box(self.get_size(self.thisMObject()))
+
+    def setDependentsDirty(self, plug, plug_array):
+        # Nothing else tells the viewport that the drawn size changed
+        if plug == LocatorNode.size:
+            LocatorDrawNode.set_dirty()
+        return super(LocatorNode, self).setDependentsDirty(plug, plug_array)
+
+
+class LocatorDrawNode(om2.MPxLocatorNode):
+    '''
+    Draws every wslLocator of the scene through LocatorSubScene, it has no attribute of its own.
+    Utils.create_loc_nodes creates one with the first plugin locators. When imported or referenced
+    scenes bring more of them, only the first one in the scene draws.
+
+    '''
+    name = 'wslLocatorDraw'
+    id = om2.MTypeId(0x0007F3A3)
+    classification = 'drawdb/subscene/wslLocatorDraw'
+    registrant = 'wslLocatorSubScene'
+
+    nodes = {}
+
+    def __init__(self):
+        super(LocatorDrawNode, self).__init__()
+
+    @staticmethod
+    def creator():
+        return LocatorDrawNode()
+
+    @staticmethod
+    def initialize():
+        pass
+
+    def postConstructor(self):
+        handle = om2.MObjectHandle(self.thisMObject())
+        LocatorDrawNode.nodes[handle.hashCode()] = handle
+
+    def isBounded(self):
+        # The locators can be anywhere
+        return False
+
+    @classmethod
+    def get_active(cls):
+        '''
+        Get the node drawing the locators.
+        return: MObject, None if no node is in the scene.
+
+        '''
+        for key, handle in list(cls.nodes.items()):
+            if not handle.isValid():
+                del cls.nodes[key]
+            # Deleted nodes kept by the undo queue have no path
+            elif len(om2.MDagPath.getAllPathsTo(handle.object())):
+                return handle.object()
+        return None
+
+    @classmethod
+    def set_dirty(cls):
+        obj = cls.get_active()
+        if obj is not None:
+            omr.MRenderer.setGeometryDrawDirty(obj)
+
+
+class LocatorSubScene(omr.MPxSubSceneOverride):
+    '''
+    Draw every wslLocator as an instance of a single render item: the three axes of a unit
+    locator, instanced with the world matrix of each visible locator scaled by its size, in its
+    wireframe color. All the locators are one draw call and one Python update per refresh, instead
+    of one draw override per locator. A click on an instance selects its locator.
+
+    '''
+    item_name = 'wslLocatorAxes'
+
+    def __init__(self, obj):
+        super(LocatorSubScene, self).__init__(obj)
+        self.node = obj
+        self.buffers = None
+        self.paths = []
+
+    @staticmethod
+    def creator(obj):
+        return LocatorSubScene(obj)
+
+    def supportedDrawAPIs(self):
+        return omr.MRenderer.kAllDevices
+
+    def requiresUpdate(self, container, frame_context):
+        # Any locator may have moved, the instance matrices are rebuilt on every refresh
+        return True
+
+    def add_item(self, container):
+        '''
+        Create the render item and its geometry, the six points of the axes of a unit locator.
+        container: MSubSceneContainer.
+        return: MRenderItem.
+
+        '''
+        item = omr.MRenderItem.create(self.item_name, omr.MRenderItem.NonMaterialSceneItem, omr.MGeometry.kLines)
+        item.setDrawMode(omr.MGeometry.kAll)
+        item.depthPriority(omr.MRenderItem.sDormantWireDepthPriority)
+        item.setSelectionMask(om2.MSelectionMask(om2.MSelectionMask.kSelectLocators))
+        item.setShader(omr.MRenderer.getShaderManager().getStockShader(omr.MShaderManager.k3dSolidShader))
+        container.add(item)
+
+        positions = omr.MVertexBuffer(omr.MVertexBufferDescriptor('', omr.MGeometry.kPosition,
+                                                                   omr.MGeometry.kFloat, 3))
+        address = positions.acquire(6, True)
+        (ctypes.c_float * 18).from_address(address)[:] = [1.0, 0.0, 0.0, -1.0, 0.0, 0.0, 0.0, 1.0, 0.0,
+                                                           0.0, -1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, -1.0]
+        positions.commit(address)
+
+        indices = omr.MIndexBuffer(omr.MGeometry.kUnsignedInt32)
+        address = indices.acquire(6, True)
+        (ctypes.c_uint32 * 6).from_address(address)[:] = list(range(6))
+        indices.commit(address)
+
+        buffers = omr.MVertexBufferArray()
+        buffers.append(positions, 'positions')
+        self.setGeometryForRenderItem(item, buffers, indices, LocatorNode.get_box(1.0))
+        # The render item does not own its buffers
+        self.buffers = (positions, indices, buffers)
+        return item
+
+    def update(self, container, frame_context):
+        item = container.find(self.item_name) or self.add_item(container)
+        self.paths = []
+        if LocatorDrawNode.get_active() != self.node:
+            item.enable(False)
+            return
+
+        matrices = om2.MMatrixArray()
+        colors = []
+        for key, handle in list(LocatorNode.nodes.items()):
+            if not handle.isValid():
+                del LocatorNode.nodes[key]
+                continue
+
+            obj = handle.object()
+            size = LocatorNode.get_size(obj)
+            scale = om2.MMatrix([[size, 0.0, 0.0, 0.0], [0.0, size, 0.0, 0.0], [0.0, 0.0, size, 0.0],
+                                 [0.0, 0.0, 0.0, 1.0]])
+            for path in om2.MDagPath.getAllPathsTo(obj):
+                if not path.isVisible():
+                    continue
+                matrices.append(scale * path.inclusiveMatrix())
+                color = omr.MGeometryUtilities.wireframeColor(path)
+                colors.extend([color.r, color.g, color.b, color.a])
+                self.paths.append(om2.MDagPath(path))
+
+        item.enable(bool(self.paths))
+        if self.paths:
+            self.setInstanceTransformArray(item, matrices)
+            self.setExtraInstanceData(item, 'solidColor', om2.MFloatArray(colors))
+
+    def getInstancedSelectionPath(self, render_item, intersection, dag_path):
+        # The instance ids start at 1
+        index = intersection.instanceID - 1
+        if render_item.name() != self.item_name or not 0 <= index < len(self.paths):
+            return False
+
+        dag_path.set(self.paths[index])
+        return True
+
+
+class FollowNode(om2.MPxNode):
+    '''
+    target[i]: locator world matrix, control parent inverse matrix, offset, follow mode
+    (parent, point, orient), control rotate order, joint orient matrix, rotate axis and
+    pivots, plus the anim curves the follow replaced. output[i]: translate and rotate of
+    the control, solved against its full transform stack.
+    The offsets match the constraints: a world matrix before the target for parent and
+    orient, a translation of the rotate pivot in the parent space of the control for point.
+
+    '''
+    name = 'wslFollow'
+    id = om2.MTypeId(0x0007F3A2)
+
+    target = None
+    target_matrix = None
+    parent_inverse = None
+    offset = None
+    mode = None
+    rotate_order = None
+    orient = None
+    rotate_axis = None
+    pivots = None
+    key_curve = None
+
+    output = None
+    out_translate = None
+    out_rotate = None
+
+    def __init__(self):
+        super(FollowNode, self).__init__()
+
+    @staticmethod
+    def creator():
+        return FollowNode()
+
+    @staticmethod
+    def initialize():
+        matrix = om2.MFnMatrixAttribute()
+        FollowNode.target_matrix = matrix.create('targetMatrix', 'tgm')
+        FollowNode.parent_inverse = matrix.create('parentInverse', 'tpi')
+        FollowNode.offset = matrix.create('offsetMatrix', 'tom')
+        FollowNode.orient = matrix.create('orientMatrix', 'tjo')
+
+        enum = om2.MFnEnumAttribute()
+        FollowNode.mode = enum.create('followMode', 'fmd', 0)
+        for ids, mode in enumerate(['parent', 'point', 'orient']):
+            enum.addField(mode, ids)
+        FollowNode.rotate_order = enum.create('targetRotateOrder', 'tro', 0)
+        for ids, order in enumerate(['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']):
+            enum.addField(order, ids)
+
+        unit = om2.MFnUnitAttribute()
+        numeric = om2.MFnNumericAttribute()
+
+        def vector(name, short, kind=om2.MFnUnitAttribute.kDistance):
+            axes = [unit.create('{}{}'.format(name, a), '{}{}'.format(short, a.lower()), kind) for a in 'XYZ']
+            return numeric.create(name, short, *axes)
+
+        # Connected from the control, in the order of the rows of solve
+        FollowNode.rotate_axis = vector('targetRotateAxis', 'tra', om2.MFnUnitAttribute.kAngle)
+        FollowNode.pivots = [vector('targetScalePivot', 'tsp'), vector('targetScalePivotTranslate', 'tst'),
+                             vector('targetRotatePivot', 'trp'), vector('targetRotatePivotTranslate', 'trt')]
+
+        message = om2.MFnMessageAttribute()
+        FollowNode.key_curve = message.create('keyCurve', 'kcv')
+        message.array = True
+
+        compound = om2.MFnCompoundAttribute()
+        FollowNode.target = compound.create('target', 'tg')
+        for attr in [FollowNode.target_matrix, FollowNode.parent_inverse, FollowNode.offset, FollowNode.mode,
+                     FollowNode.rotate_order, FollowNode.orient, FollowNode.rotate_axis] + FollowNode.pivots + \
+                [FollowNode.key_curve]:
+            compound.addChild(attr)
+        compound.array = True
+
+        FollowNode.out_translate = vector('outTranslate', 'ot')
+        FollowNode.out_rotate = vector('outRotate', 'or', om2.MFnUnitAttribute.kAngle)
+
+        FollowNode.output = compound.create('output', 'out')
+        compound.addChild(FollowNode.out_translate)
+        compound.addChild(FollowNode.out_rotate)
+        compound.array = True
+        compound.usesArrayDataBuilder = True
+        compound.writable = False
+        compound.storable = False
+
+        om2.MPxNode.addAttribute(FollowNode.target)
+        om2.MPxNode.addAttribute(FollowNode.output)
+        om2.MPxNode.attributeAffects(FollowNode.target, FollowNode.output)
+
+    @classmethod
+    def solve(cls, rows):
+        '''
+        Solve the local translate and rotate of every control.
+        rows: List of (target matrix, parent inverse, offset, mode, rotate order, orient matrix,
+        rotate axis in radians, (scale pivot, scale pivot translate, rotate pivot, rotate pivot translate)).
+        return: List of (translate, rotate in radians).
+
+        '''
+        if np is not None:
+            return cls.solve_array(rows)
+
+        result = []
+        for target, parent_inverse, offset, mode, ro, orient, axis, pivots in rows:
+            sp, spt, rp, rpt = [om2.MVector(p) for p in pivots]
+            if mode == 1:
+                # The rotate pivot is on the target, it is at translate + rp + rpt whatever the rotation
+                point = om2.MPoint(target[12], target[13], target[14]) * parent_inverse
+                t = om2.MVector(point.x + offset[12], point.y + offset[13], point.z + offset[14]) - rp - rpt
+                result.append(((t.x, t.y, t.z), (0.0, 0.0, 0.0)))
+                continue
+            elif mode == 2:
+                world = (om2.MTransformationMatrix(offset).rotation(asQuaternion=True) *
+                         om2.MTransformationMatrix(target).rotation(asQuaternion=True)).asMatrix()
+            else:
+                world = offset * target
+
+            local = world * parent_inverse
+            rotation = om2.MTransformationMatrix(local).rotation(asQuaternion=True)
+            # The translation of sp^-1 * s * sh * sp * spt * rp^-1 is carried by the rotation
+            scale = local * rotation.asMatrix().transpose()
+            pre = sp + spt - rp - sp * scale
+            t = om2.MVector(local[12], local[13], local[14]) - pre * rotation.asMatrix() - rp - rpt
+
+            rotation = om2.MEulerRotation(*axis).asQuaternion().conjugate() * rotation * \
+                om2.MTransformationMatrix(orient).rotation(asQuaternion=True).conjugate()
+            r = rotation.asEulerRotation().reorder(ro)
+            result.append(((t.x, t.y, t.z), (r.x, r.y, r.z)))
+
+        return result
+
+    @classmethod
+    def solve_array(cls, rows):
+        target, parent_inverse, offset, orient = [np.array([list(r[i]) for r in rows]).reshape(-1, 4, 4)
+                                                  for i in (0, 1, 2, 5)]
+        mode = np.array([r[3] for r in rows])
+        ro = np.array([r[4] for r in rows])
+        axis = np.array([r[6] for r in rows], dtype=np.float64).reshape(-1, 3)
+        pivots = np.array([r[7] for r in rows], dtype=np.float64).reshape(-1, 4, 3)
+
+        world = np.matmul(offset, target)
+        point = mode == 1
+        world[point] = np.eye(4)
+        world[point, 3, :3] = target[point, 3, :3]
+
+        # Orient only: the target rotation without its scale, after the offset rotation
+        orient_mode = mode == 2
+        rot = target[orient_mode, :3, :3]
+        rot = rot / np.linalg.norm(rot, axis=-1)[:, :, None]
+        world[orient_mode] = np.eye(4)
+        world[orient_mode, :3, :3] = np.matmul(offset[orient_mode, :3, :3], rot)
+
+        local = np.matmul(world, parent_inverse)
+        # The rotate pivot of point rows is on the target, at translate + rp + rpt whatever the rotation
+        t = local[:, 3, :3] + offset[:, 3, :3] - pivots[:, 2] - pivots[:, 3]
+        r = np.zeros((len(rows), 3))
+        # Point rows keep a zero rotation, like the om2 solve
+        for order in set(ro[~point].tolist()):
+            ids = (ro == order) & ~point
+            t[ids], r[ids], _, _ = Decompose.unpivot(local[ids], order, pivots[ids],
+                                                     Decompose.rotation_matrix(axis[ids]), orient[ids, :3, :3])
+
+        return list(zip(t.tolist(), r.tolist()))
+
+    def compute(self, plug, data):
+        root = plug
+        if root.isChild:
+            root = root.parent()
+        if root.isChild:
+            root = root.parent()
+        if root.isElement:
+            root = root.array()
+        if root.attribute() != FollowNode.output:
+            return None
+
+        targets = data.inputArrayValue(FollowNode.target)
+        indices = []
+        rows = []
+        for i in range(len(targets)):
+            targets.jumpToPhysicalElement(i)
+            element = targets.inputValue()
+            indices.append(targets.elementLogicalIndex())
+            rows.append((element.child(FollowNode.target_matrix).asMatrix(),
+                         element.child(FollowNode.parent_inverse).asMatrix(),
+                         element.child(FollowNode.offset).asMatrix(),
+                         element.child(FollowNode.mode).asShort(),
+                         element.child(FollowNode.rotate_order).asShort(),
+                         element.child(FollowNode.orient).asMatrix(),
+                         element.child(FollowNode.rotate_axis).asDouble3(),
+                         [element.child(p).asDouble3() for p in FollowNode.pivots]))
+
+        out = data.outputArrayValue(FollowNode.output)
+        builder = out.builder()
+        for index, (t, r) in zip(indices, self.solve(rows) if rows else []):
+            element = builder.addElement(index)
+            element.child(FollowNode.out_translate).set3Double(*t)
+            element.child(FollowNode.out_rotate).set3Double(*r)
+        out.set(builder)
+        out.setAllClean()
+        data.setClean(plug)
+
+
+def initializePlugin(plugin):
+    fn = om2.MFnPlugin(plugin, 'kangddan', '1.0', 'Any')
+    fn.registerCommand(ApplyModifierCmd.name, ApplyModifierCmd.creator)
+    fn.registerNode(LocatorNode.name, LocatorNode.id, LocatorNode.creator, LocatorNode.initialize,
+                    om2.MPxNode.kLocatorNode, LocatorNode.classification)
+    fn.registerNode(LocatorDrawNode.name, LocatorDrawNode.id, LocatorDrawNode.creator, LocatorDrawNode.initialize,
+                    om2.MPxNode.kLocatorNode, LocatorDrawNode.classification)
+    omr.MDrawRegistry.registerSubSceneOverrideCreator(LocatorDrawNode.classification, LocatorDrawNode.registrant,
+                                                      LocatorSubScene.creator)
+    fn.registerNode(FollowNode.name, FollowNode.id, FollowNode.creator, FollowNode.initialize)
+
+
+def uninitializePlugin(plugin):
+    fn = om2.MFnPlugin(plugin)
+    fn.deregisterNode(FollowNode.id)
+    omr.MDrawRegistry.deregisterSubSceneOverrideCreator(LocatorDrawNode.classification, LocatorDrawNode.registrant)
+    fn.deregisterNode(LocatorDrawNode.id)
+    fn.deregisterNode(LocatorNode.id)
+    fn.deregisterCommand(ApplyModifierCmd.name)
@@ -5,450 +5,10 @@ from PySide2   import QtWidgets
 from PySide2   import QtCore
 from PySide2   import QtGui
 from functools import partial
-from maya.api  import OpenMaya as om2
 
-class Utils(object):
-    @classmethod
-    def add_undo(cls, func):
-        def undo(*args, **kwargs):
-            cmds.undoInfo(openChunk=True)
-            func(*args, **kwargs)
-            cmds.undoInfo(closeChunk=True)
-        return undo
-    
-    @classmethod
-    def mayaWindow(cls):
-        from maya.OpenMayaUI import MQtUtil
-        from shiboken2       import wrapInstance
-        if sys.version_info.major >= 3:
-            return wrapInstance(int(MQtUtil.mainWindow()), QtWidgets.QMainWindow)
-        else:
-            return wrapInstance(long(MQtUtil.mainWindow()), QtWidgets.QMainWindow)
-
-    @classmethod
-    def obj_exists(cls, lst):
-        '''
-        Check if a list of objects exists one by one.
-        return: True or False
-               
-        '''
-        for i in lst:
-            if not cmds.objExists(i):
-                break
-        else:
-            return True
-
-        return False
-
-    @classmethod
-    def get_norm_vec(cls, obj, get_type='t'):
-        '''
-        Normalize a vector.
-        obj: Object to get the attribute from2.
-        get_type: Specify the attribute to get from the object ('t', 'r', 's').
-        return: Normalized vector.
-        
-        '''
-        vec = om2.MVector(cmds.getAttr('{}.{}'.format(obj, get_type))[0])
-        vec.normalize()
-
-        return vec
-
-    @classmethod
-    def cond_switch(cls, lst, func):
-        '''
-        Evaluate multiple conditions and execute a dynamic function.
-        lst: List of conditions.
-        func: Function to be executed.
-        
-        '''
-        for cond in lst:
-            if cmds.objExists(cond):
-                pass
-            else:
-                func()
-
-    @classmethod
-    def bake_obj(cls, obj, keys=True):
-        '''
-        Bake keyframes. The object needs to be constrained for this to work properly.
-        obj: Object to be baked, can be a list.
-        keys: Whether to bake every frame.
-        
-        '''
-        start_key = cmds.playbackOptions(q=True, ast=True)
-        end_key = cmds.playbackOptions(q=True, aet=True)
-        if obj:
-            cmds.bakeResults(obj, t=(start_key, end_key), sr=[keys, 0],
-                             sm=False, pok=False, sac=False, ral=False,
-                             bol=False, mr=True, cp=False, s=True)
-
-    @classmethod
-    def set_attr(cls, nodes, attrs, value):
-        '''
-        Add attributes to nodes.
-        nodes: List of objects to add attributes to.
-        attrs: List of attributes to be added.
-        value: List of values to set for the attributes.
-        
-        '''
-        for n in nodes:
-            for ids, i in enumerate(attrs):
-                if isinstance(value[ids], (list, tuple)):
-                    cmds.setAttr('{}.{}'.format(n, i), *value[ids])
-                else:
-                    cmds.setAttr('{}.{}'.format(n, i), value[ids])
-
-    @classmethod
-    def lock_attr(cls, nodes, attrs, v=False):
-        '''
-        Lock attributes on nodes.
-        nodes: List of objects to lock attributes on.
-        attrs: List of attributes to be locked.
-        v: Value for lock and keyable properties.
-        
-        '''
-        if isinstance(nodes and attrs, list):
-            if 't' in attrs:
-                attrs.remove('t')
-                attrs.extend(['tx', 'ty', 'tz'])
-            if 'r' in attrs:
-                attrs.remove('r')
-                attrs.extend(['rx', 'ry', 'rz'])
-            if 's' in attrs:
-                attrs.remove('s')
-                attrs.extend(['sx', 'sy', 'sz'])
-
-            for n in nodes:
-                for i in attrs:
-                    cmds.setAttr('{}.{}'.format(n, i), l=False, k=False, cb=v)
-
-    @classmethod
-    def create_loc(cls, obj, prefix):
-        '''
-        Create a locator, get the object's rotate order, and hide a series of attributes.
-        obj: The object to get the name from2.
-        prefix: The prefix to be added.
-        return: Locator object.
-        
-        '''
-        ro = cmds.getAttr('{}.rotateOrder'.format(obj))
-        loc = cmds.spaceLocator(n='{}{}'.format(prefix, obj))
-        cmds.setAttr('{}.rotateOrder'.format(loc[0]), ro)
-
-        cls.lock_attr([loc[0]], ['v', 'lpx', 'lpy', 'lpz', 'lsx', 'lsy', 'lsz'], v=False)
-        return loc[0]
-
-    @classmethod
-    def scale_loc(cls, obj, value):
-        '''
-        Scale the locator.
-        obj: The locator object.
-        value: Scale value.
-        
-        '''
-        try: 
-            if cmds.nodeType(cmds.listRelatives(obj, s=True)[0]) == 'locator':
-                x = cmds.getAttr('{}.{}'.format(obj, 'lsx'))
-                Utils.set_attr([obj], ['lsx', 'lsy', 'lsz'], [x * value for i in range(3)])
-
-            else:
-                shapes = cmds.listRelatives(obj, s=True)
-                for i in shapes:
-                    points = cmds.ls(i + '.cv[*]')[0]
-                    #     cmds.scale(*[value for i in range(3)], points, r=1, ocp=1)
-
-                    cmds.scale(value, value, value, points, r=1, ocp=1)
-
-        except:
-            pass
-
-
-class WorldSpaceLoc(object):
-
-    def __init__(self):
-        self.prefix = 'WSpace_loc_'
-
-        self.aim_grp_prefix = 'WSpace_loc_aim_grp_'
-        self.aim_prefix = 'WSpace_loc_aim_target_'
-        self.up_prefix = 'WSpace_loc_aim_up_'
-
-        self.parent_constr = '_parentConstraint'
-        self.point_constr = '_pointConstraint'
-        self.orient_constr = '_orientConstraint'
-        self.aim_constr = '_aimConstraint'
-        self.target_constr = 'target_aimConstraint'
-        self.up_constr = 'up_aimConstraint'
-
-    def bake_loc(self, every_frame):
-        '''
-        Bake the animation of the selected objects to locators.
-        every_frame: Whether to bake every frame.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        bake_lst = []
-
-        if s_lst:
-            for obj in s_lst:
-                if cmds.objExists('{}{}'.format(self.prefix, obj)):
-                    cmds.delete('{}{}'.format(self.prefix, obj))
-
-                loc = Utils.create_loc(obj, self.prefix)
-                bake_lst.append(loc)
-
-                cmds.parentConstraint(obj, loc, w=1.0, mo=False)
-
-            Utils.bake_obj(bake_lst, every_frame)
-            cmds.delete(bake_lst, cn=True)
-            cmds.select(s_lst)
-
-    def parent_loc(self, offset):
-        '''
-        Parent the locators to the controllers using various constraint types.
-        offset: Preserve offset.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-
-        if s_lst:
-            for obj in s_lst:
-                if cmds.objExists('{}{}'.format(self.prefix, obj)):
-
-                    def constr_func():
-                        cmds.parentConstraint('{}{}'.format(self.prefix, obj), obj, w=1.0, mo=offset,
-                                              n='{}{}{}'.format(self.prefix, obj, self.parent_constr))
-
-                    if cmds.objExists('{}{}{}'.format(self.prefix, obj, self.parent_constr)):
-                        pass
-                    elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.point_constr)):
-                        pass
-                    elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.orient_constr)):
-                        pass
-                    elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.aim_constr)):
-                        pass
-                    else:
-                        constr_func()
-
-    def point_loc(self, offset):
-        '''
-        Point constrain the locators to the controllers using various constraint types.
-        offset: Preserve offset.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-
-        if s_lst:
-            for obj in s_lst:
-                if cmds.objExists('{}{}'.format(self.prefix, obj)):
-                    # Check constraint types
-                    def constr_func():
-                        cmds.pointConstraint('{}{}'.format(self.prefix, obj), obj, w=1.0, mo=offset,
-                                             n='{}{}{}'.format(self.prefix, obj, self.point_constr))
-
-                    if cmds.objExists('{}{}{}'.format(self.prefix, obj, self.point_constr)):
-                        pass
-                    elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.parent_constr)):
-                        pass
-                    else:
-                        constr_func()
-
-    def orient_loc(self, offset):
-        '''
-        Orient constrain the locators to the controllers using various constraint types.
-        offset: Preserve offset.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-
-        if s_lst:
-            for obj in s_lst:
-                if cmds.objExists('{}{}'.format(self.prefix, obj)):
-                    # Check constraint types
-                    def constr_func():
-                        cmds.orientConstraint('{}{}'.format(self.prefix, obj), obj, w=1.0, mo=offset,
-                                              n='{}{}{}'.format(self.prefix, obj, self.orient_constr))
-
-                    if cmds.objExists('{}{}{}'.format(self.prefix, obj, self.parent_constr)):
-                        pass
-                    elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.orient_constr)):
-                        pass
-                    elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.aim_constr)):
-                        pass
-                    else:
-                        constr_func()
-
-    def select_loc(self):
-        '''
-        Select locators for the currently selected objects.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        prefix_lst = [self.aim_prefix, self.up_prefix, self.prefix]
-
-        loc_lst = []
-
-        if s_lst:
-            for obj in s_lst:
-                for n in prefix_lst:
-                    if cmds.objExists('{}{}'.format(n, obj)):
-                        loc_lst.append('{}{}'.format(n, obj))
-
-            cmds.select(loc_lst)
-
-    def delete_constr(self):
-        '''
-        Delete world space constraints on selected objects.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        constr_prefix_lst = [self.parent_constr, self.point_constr, self.orient_constr,
-                             self.aim_constr]
-
-        if s_lst:
-            for obj in s_lst:
-                for n in constr_prefix_lst:
-                    if cmds.objExists('{}{}{}'.format(self.prefix, obj, n)):
-                        cmds.delete('{}{}{}'.format(self.prefix, obj, n), cn=True)
-                        # Delete target constraints
-                        if '{}{}{}'.format(self.prefix, obj, n) == '{}{}{}'.format(self.prefix, obj,
-                                                                                   self.aim_constr):
-                            cmds.delete('{}{}'.format(self.aim_prefix, obj),
-                                        '{}{}'.format(self.up_prefix, obj))
-                # Delete target constraint groups
-                if cmds.objExists('{}{}'.format(self.aim_grp_prefix, obj)):
-                    cmds.delete('{}{}'.format(self.aim_grp_prefix, obj))
-
-    def bake_ctrl(self, every_frame):
-        '''
-        Bake the animation of the controllers and delete the constraints.
-        every_frame: Whether to bake every frame.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        bake_lst = []
-        constr_lst = []
-
-        # Target constraint components
-        aim_lst = []
-
-        # Constraint suffixes
-        constr_prefix_lst = [self.parent_constr, self.point_constr, self.orient_constr,
-                             self.aim_constr]
-
-        if s_lst:
-            for obj in s_lst:
-                # Loop through constraint list
-                for n in constr_prefix_lst:
-                    # If the constraint exists
-                    if cmds.objExists('{}{}{}'.format(self.prefix, obj, n)):
-                        bake_lst.append(obj)
-                        constr_lst.append('{}{}{}'.format(self.prefix, obj, n))
-
-                        # If it's the aim constraint, handle the two locators separately
-                        if '{}{}{}'.format(self.prefix, obj, n) == '{}{}{}'.format(self.prefix, obj,
-                                                                                   self.aim_constr):
-                            aim_lst.extend(['{}{}'.format(self.aim_prefix, obj),
-                                            '{}{}'.format(self.up_prefix, obj)])
-
-            Utils.bake_obj(bake_lst, keys=every_frame)
-            cmds.delete(constr_lst, cn=True)
-            # Clean up aim constraint locators
-            if aim_lst:
-                cmds.delete(aim_lst)
-
-    def scale_loc_add(self, num):
-        '''
-        Scale the locators by a given value.
-        '''
-        s_lst = cmds.ls(sl=True)
-        if s_lst:
-            for obj in s_lst:
-                Utils.scale_loc(obj, num)
-
-    def aim_loc(self):
-        '''
-        Create aim constraint locators. 
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        if s_lst:
-            for obj in s_lst:
-
-                if cmds.objExists('{}{}'.format(self.aim_grp_prefix, obj)):
-                    pass
-                elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.parent_constr)):
-                    pass
-                elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.aim_constr)):
-                    pass
-                elif cmds.objExists('{}{}{}'.format(self.prefix, obj, self.orient_constr)):
-                    pass
-                else:
-                    aim_loc = Utils.create_loc(obj, self.aim_prefix)
-                    up_loc = Utils.create_loc(obj, self.up_prefix)
-
-                    grp = cmds.group(aim_loc, up_loc, n='{}{}'.format(self.aim_grp_prefix, obj))
-                    cmds.parentConstraint(obj, grp, w=1.0, mo=False,
-                                          n='{}{}{}'.format(self.prefix, obj, self.parent_constr))
-                    cmds.select(aim_loc)
-
-    def bake_aim(self, every_frame):
-        '''
-        Bake aim constraint locators and apply aim constraints.
-        every_frame: Whether to bake every frame.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        normal_lst = []
-        bake_lst = []
-
-        if s_lst:
-            for obj in s_lst:
-                if Utils.obj_exists(['{}{}'.format(self.aim_grp_prefix, obj), '{}{}'.format(self.aim_prefix, obj),
-                                     '{}{}'.format(self.up_prefix, obj)]):
-                    # Get the normalized vectors of the locators
-                    normal_lst.append(Utils.get_norm_vec('{}{}'.format(self.aim_prefix, obj)))
-                    normal_lst.append(Utils.get_norm_vec('{}{}'.format(self.up_prefix, obj)))
-
-                    # Unparent the constraints
-                    cmds.parent('{}{}'.format(self.aim_prefix, obj),
-                                '{}{}'.format(self.up_prefix, obj), w=True)
-                    cmds.delete('{}{}'.format(self.aim_grp_prefix, obj))
-
-                    cmds.parentConstraint(obj, '{}{}'.format(self.aim_prefix, obj), w=1.0, mo=True,
-                                          n='{}{}{}'.format(self.prefix, obj, self.target_constr))
-                    cmds.parentConstraint(obj, '{}{}'.format(self.up_prefix, obj), w=1.0, mo=True,
-                                          n='{}{}{}'.format(self.prefix, obj, self.up_constr))
-                    bake_lst.extend(['{}{}'.format(self.aim_prefix, obj),
-                                     '{}{}'.format(self.up_prefix, obj)])
-
-                    Utils.bake_obj(bake_lst, every_frame)
-                    cmds.delete('{}{}'.format(self.aim_prefix, obj), '{}{}'.format(self.up_prefix, obj), cn=True)
-
-                    cmds.aimConstraint('{}{}'.format(self.aim_prefix, obj), obj, aim=normal_lst[0], u=normal_lst[1],
-                                       mo=False, w=1.0, wut='object', wuo='{}{}'.format(self.up_prefix, obj),
-                                       n='{}{}{}'.format(self.prefix, obj, self.aim_constr))
-
-                    normal_lst = []
-                    cmds.select(s_lst)
-
-    def set_color(self, colorid):
-        '''
-        Batch set controller color.
-        colorid: Color ID.
-        
-        '''
-        s_lst = cmds.ls(sl=True)
-        shape = cmds.listRelatives(s_lst, c=True)
-        for obj in s_lst:
-
-            if cmds.nodeType(obj) == 'joint':
-                Utils.set_attr([obj], ['overrideEnabled', 'overrideColor'], [1, colorid])
-                continue
+from world_space_loc_core import (Utils, Modifier, MatrixBake, KeyReduce, BakeContext, Profiler,
+                                  WorldSpaceLoc, PoseCache)
 
-            for s in shape:
-                if cmds.objectType(s, isa='shape'):
-                    Utils.set_attr([s], ['overrideEnabled', 'overrideColor'], [1, colorid])
 
 class MyCheckBox(QtWidgets.QCheckBox):
     
@@ -484,9 +44,44 @@ class MyCheckBox(QtWidgets.QCheckBox):
                         
                         """ 
                         )
-                        
+
+
+class InputBlocker(QtCore.QObject):
+    '''
+    Application event filter swallowing the user input outside of the allowed widgets,
+    so nothing can edit the scene while a job keeps its undo chunk and BakeContext open.
+    
+    '''
+    EVENTS = [QtCore.QEvent.MouseButtonPress, QtCore.QEvent.MouseButtonRelease, QtCore.QEvent.MouseButtonDblClick,
+              QtCore.QEvent.KeyPress, QtCore.QEvent.KeyRelease, QtCore.QEvent.ShortcutOverride,
+              QtCore.QEvent.Shortcut, QtCore.QEvent.Wheel, QtCore.QEvent.DragEnter, QtCore.QEvent.Drop]
+
+    def __init__(self, allowed, parent=None):
+        '''
+        allowed: Widgets still receiving input, with their children.
+        
+        '''
+        super(InputBlocker, self).__init__(parent)
+        self.allowed = allowed
+
+    def is_allowed(self, obj):
+        # Input reaches the native window first, then its widgets
+        if isinstance(obj, QtGui.QWindow):
+            return any(obj is w.window().windowHandle() for w in self.allowed)
+        if isinstance(obj, QtWidgets.QWidget):
+            return any(obj is w or w.isAncestorOf(obj) for w in self.allowed)
+        return False
+
+    def eventFilter(self, obj, event):
+        return event.type() in self.EVENTS and not self.is_allowed(obj)
+
+
 class WSpaceWindow(QtWidgets.QDialog):
     SLIDER_BASIC_VALUE = 50
+    # Adaptive sampling tolerances: 0.01 cm and 0.1 degree
+    ADAPTIVE_TOLERANCE = (0.01, 0.1 * 3.141592653589793 / 180.0)
+    # Frames over which a partial bake blends into the old keys
+    RANGE_BLEND = 3
     
     dig_instance = None 
     @classmethod
@@ -500,8 +95,12 @@ class WSpaceWindow(QtWidgets.QDialog):
             cls.dig_instance.raise_()
             cls.dig_instance.activateWindow()
             
-    def __init__(self, window_parent=Utils.mayaWindow()):
+    def __init__(self, window_parent=None):
+        if window_parent is None:
+            window_parent = Utils.mayaWindow()
         super(WSpaceWindow, self).__init__(parent=window_parent)
+        # Loaded once for the session, the tools fall back to cmds without it
+        Modifier.load_plugin()
         self.wsl = WorldSpaceLoc()
         self.setWindowTitle('World Space Locator')
         self.main_layout = QtWidgets.QVBoxLayout()
@@ -510,12 +109,21 @@ class WSpaceWindow(QtWidgets.QDialog):
         self.main_layout.addLayout(self.check_box())
         self.main_layout.addLayout(self.bake_layout())
         self.main_layout.addLayout(self.loc_layout())
+        self.main_layout.addLayout(self.job_layout())
+        self.main_layout.addLayout(self.profile_layout())
         self.main_layout.setSpacing(5)
         self.main_layout.addStretch()
         
         self.main_layout.setContentsMargins(4, 5,    4, 5)
         self.setLayout(self.main_layout)
         self.geometry = None 
+
+        self.job = None
+        self.job_ctx = None
+        self.job_profile = None
+        self.job_blocker = None
+        self.job_timer = QtCore.QTimer(self)
+        self.job_timer.timeout.connect(self.run_job)
         
     def showEvent(self, event):
         super(WSpaceWindow, self).showEvent(event)
@@ -525,6 +133,9 @@ class WSpaceWindow(QtWidgets.QDialog):
     
     def closeEvent(self, event): 
         if isinstance(self, WSpaceWindow): 
+            self.cancel_job()
+            if self.profile_widget and self.Profile_check.isChecked():
+                self.Profile_check.click()
             super(WSpaceWindow, self).closeEvent(event)
             self.geometry = self.saveGeometry()
     
@@ -532,14 +143,67 @@ class WSpaceWindow(QtWidgets.QDialog):
                             
         self.Bake_check   = MyCheckBox('Bake Every Frame   ')
         
+        self.Native_check = MyCheckBox('Native Bake  ')
+        
+        self.Reduce_check = MyCheckBox('Reduce Keys  ')
+        
         self.Offset_check = MyCheckBox('Maintain Offset  ')
         #self.Offset_check.setLayoutDirection(QtCore.Qt.RightToLeft)
+
+        # One follow node for all controllers instead of a constraint each
+        self.Live_check   = MyCheckBox('Live  ')
         
         self.check_ly = QtWidgets.QHBoxLayout()
         self.check_ly.addWidget(self.Bake_check)
         self.check_ly.addStretch()
+        self.check_ly.addWidget(self.Native_check)
+        self.check_ly.addStretch()
+        self.check_ly.addWidget(self.Reduce_check)
+        self.check_ly.addStretch()
         self.check_ly.addWidget(self.Offset_check)
-        return self.check_ly
+        self.check_ly.addStretch()
+        self.check_ly.addWidget(self.Live_check)
+
+        self.Refresh_check  = MyCheckBox('Suspend Refresh  ')
+        self.Parallel_check = MyCheckBox('Parallel Eval  ')
+        self.Cycle_check    = MyCheckBox('No Cycle Check  ')
+        self.Cache_check    = MyCheckBox('Pose Cache  ')
+        self.Fast_check     = MyCheckBox('Fast (No Undo)  ')
+
+        # Samples per frame, the last entry refines a coarse native bake where the motion changes quickly
+        self.rate_box = QtWidgets.QComboBox()
+        self.rate_box.addItems(['1x', '2x', '4x', '4x Adaptive'])
+        self.rate_box.setToolTip('Samples per frame of the every frame bakes')
+
+        # Partial bakes only key the chosen ranges, optionally blended into the old keys at the borders
+        self.range_box = QtWidgets.QComboBox()
+        self.range_box.addItems(['Playback Range', 'Time Slider', 'Selected Keys'])
+        self.range_box.setToolTip('Frame ranges of the bakes, the keys outside them stay')
+        self.Blend_check    = MyCheckBox('Blend Borders  ')
+
+        self.perf_ly = QtWidgets.QHBoxLayout()
+        self.perf_ly.addWidget(self.Refresh_check)
+        self.perf_ly.addStretch()
+        self.perf_ly.addWidget(self.Parallel_check)
+        self.perf_ly.addStretch()
+        self.perf_ly.addWidget(self.Cycle_check)
+        self.perf_ly.addStretch()
+        self.perf_ly.addWidget(self.Cache_check)
+        self.perf_ly.addStretch()
+        self.perf_ly.addWidget(self.Fast_check)
+        self.perf_ly.addStretch()
+        self.perf_ly.addWidget(self.rate_box)
+
+        self.range_ly = QtWidgets.QHBoxLayout()
+        self.range_ly.addWidget(self.range_box)
+        self.range_ly.addStretch()
+        self.range_ly.addWidget(self.Blend_check)
+
+        self.check_v_ly = QtWidgets.QVBoxLayout()
+        self.check_v_ly.addLayout(self.check_ly)
+        self.check_v_ly.addLayout(self.perf_ly)
+        self.check_v_ly.addLayout(self.range_ly)
+        return self.check_v_ly
     ##########################  bake ly  #################################      
     def bake_layout(self):
         self.baake_ly = QtWidgets.QVBoxLayout()
@@ -578,14 +242,21 @@ class WSpaceWindow(QtWidgets.QDialog):
     def aim_button(self):
         self.add_aim_loc = QtWidgets.QPushButton(QtGui.QIcon(':aimConstraint.png'), 'Aim Locator')
         self.bake_aim    = QtWidgets.QPushButton(QtGui.QIcon(':timeplay.png'), 'Bake Aim')
+        self.refresh_bake = QtWidgets.QPushButton(QtGui.QIcon(':refresh.png'), 'Refresh Bake')
+        self.revert_bake = QtWidgets.QPushButton(QtGui.QIcon(':undo_s.png'), 'Revert Bake')
+        self.revert_bake.setEnabled(False)
 
         
         self.add_aim_loc.clicked.connect(self.aim_loc)
         self.bake_aim.clicked.connect(self.bake_aim_loc)
+        self.refresh_bake.clicked.connect(self.refresh_loc)
+        self.revert_bake.clicked.connect(self.revert_fast_bake)
         
         self.aim_ly = QtWidgets.QHBoxLayout()
         self.aim_ly.addWidget(self.add_aim_loc)
         self.aim_ly.addWidget(self.bake_aim)
+        self.aim_ly.addWidget(self.refresh_bake)
+        self.aim_ly.addWidget(self.revert_bake)
         return self.aim_ly
         
         
@@ -609,9 +280,19 @@ class WSpaceWindow(QtWidgets.QDialog):
         self.del_button.clicked.connect(self.delete_constr)
         self.sl_loc.clicked.connect(self.select_loc)
         
+        self.export_button = QtWidgets.QPushButton(QtGui.QIcon(':save.png'), 'Export Anim')
+        self.import_button = QtWidgets.QPushButton(QtGui.QIcon(':fileOpen.png'), 'Import Anim')
+        self.export_button.clicked.connect(self.export_locs)
+        self.import_button.clicked.connect(self.import_locs)
+        
+        self.io_ly = QtWidgets.QHBoxLayout()
+        self.io_ly.addWidget(self.export_button)
+        self.io_ly.addWidget(self.import_button)
+        
         self.v_ly = QtWidgets.QVBoxLayout()
         self.v_ly.addWidget(self.del_button)
         self.v_ly.addWidget(self.sl_loc)
+        self.v_ly.addLayout(self.io_ly)
         return self.v_ly
         
     def loc_attr(self):
@@ -664,16 +345,17 @@ class WSpaceWindow(QtWidgets.QDialog):
         self.loc_scale_slider.setRange(0, 100)
         self.loc_scale_slider.setValue(50)
         
-        self.loc_scale_slider.sliderPressed.connect(lambda: cmds.undoInfo(openChunk=True)) 
+        self.scale_snap = None
+        self.scale_timer = QtCore.QTimer(self)
+        self.scale_timer.setSingleShot(True)
+        self.scale_timer.setInterval(16)
+        self.scale_timer.timeout.connect(self.scale_update)
+
+        self.loc_scale_slider.sliderPressed.connect(self.scale_pressed) 
         
-        self.loc_scale_slider.sliderMoved.connect(self.scale_loc_addaa) 
+        self.loc_scale_slider.sliderMoved.connect(self.scale_moved) 
         
-          
-        self.loc_scale_slider.sliderReleased.connect(lambda: (self.loc_scale_slider.setValue(50), 
-                                                              cmds.undoInfo(closeChunk=True)))
-                                                              
-                                                              
-        self.loc_scale_slider.sliderReleased.connect(self.resete_slider_basic_value)                                                    
+        self.loc_scale_slider.sliderReleased.connect(self.scale_released)
        
         
         self.loc_attr_h_ly.addWidget(self.loc_scale_text)
@@ -683,6 +365,8 @@ class WSpaceWindow(QtWidgets.QDialog):
     def bake_con(self):
         self.info = QtWidgets.QLabel('World - Space - Locator - v1.6')
         self.info.setAlignment(QtCore.Qt.AlignCenter)
+        self.time_info = QtWidgets.QLabel('')
+        self.time_info.setAlignment(QtCore.Qt.AlignCenter)
         self.bake_button = QtWidgets.QPushButton(QtGui.QIcon(':bakeAnimation.png'), 'Bake Controls')
         self.bake_button.setStyleSheet("color: rgb(255, 255, 136);") 
         self.bake_button.setMinimumSize(0, 60)
@@ -691,27 +375,237 @@ class WSpaceWindow(QtWidgets.QDialog):
         self.bake_con_v_ly = QtWidgets.QVBoxLayout()
         self.bake_con_v_ly.setSpacing(0)
         self.bake_con_v_ly.addWidget(self.bake_button)
+        self.bake_con_v_ly.addWidget(self.time_info)
         self.bake_con_v_ly.addWidget(self.info)
         return self.bake_con_v_ly
 
-    @Utils.add_undo
+    def set_bake_opts(self):
+        self.wsl.reduce_tol = KeyReduce.TOLERANCE if self.Reduce_check.isChecked() else None
+        self.wsl.bake_opts = {'refresh': self.Refresh_check.isChecked(),
+                              'evaluation': 'parallel' if self.Parallel_check.isChecked() else None,
+                              'cycle_check': self.Cycle_check.isChecked()}
+        self.wsl.fast = self.Fast_check.isChecked()
+        self.wsl.sample_rate = [1, 2, 4, 4][self.rate_box.currentIndex()]
+        self.wsl.adaptive = WSpaceWindow.ADAPTIVE_TOLERANCE if self.rate_box.currentIndex() == 3 else None
+        self.wsl.ranges = [None, 'slider', 'keys'][self.range_box.currentIndex()]
+        self.wsl.range_blend = WSpaceWindow.RANGE_BLEND if self.Blend_check.isChecked() else 0
+        if self.Cache_check.isChecked():
+            PoseCache.enable()
+        else:
+            PoseCache.disable()
+
+    def show_time(self):
+        switches = [name for name, check in [('refresh', self.Refresh_check), ('parallel', self.Parallel_check),
+                                             ('cycle', self.Cycle_check)] if check.isChecked()]
+        text = 'Last bake: {:.2f}s  ({})'.format(self.wsl.bake_time, ', '.join(switches) or 'no switches')
+        if MatrixBake.cache:
+            info = MatrixBake.cache.info()
+            text += '  cache {:.1f} MB, {} hits'.format(info['bytes'] / 1048576.0, info['hits'])
+        if self.wsl.snapshot:
+            text += '  snapshot {:.2f} MB'.format(self.wsl.snapshot.size / 1048576.0)
+        self.revert_bake.setEnabled(self.wsl.snapshot is not None)
+        self.time_info.setText(text)
+
+    def job_layout(self):
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setTextVisible(True)
+        self.cancel_button = QtWidgets.QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.cancel_job)
+
+        self.job_ly = QtWidgets.QHBoxLayout()
+        self.job_ly.addWidget(self.progress_bar)
+        self.job_ly.addWidget(self.cancel_button)
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        return self.job_ly
+
+    def profile_layout(self):
+        self.profile_button = QtWidgets.QToolButton()
+        self.profile_button.setText('Profile')
+        self.profile_button.setCheckable(True)
+        self.profile_button.setArrowType(QtCore.Qt.RightArrow)
+        self.profile_button.setToolButtonStyle(QtCore.Qt.ToolButtonTextBesideIcon)
+        self.profile_button.setStyleSheet('border: none;')
+        self.profile_button.toggled.connect(self.show_profile)
+
+        # The panel is built when it is first expanded
+        self.profile_widget = None
+        self.profile_ly = QtWidgets.QVBoxLayout()
+        self.profile_ly.setSpacing(2)
+        self.profile_ly.addWidget(self.profile_button)
+        return self.profile_ly
+
+    def build_profile(self):
+        self.Profile_check = MyCheckBox('Record  ')
+        self.Profile_check.toggled.connect(self.set_profile)
+        self.profile_clear = QtWidgets.QPushButton('Clear')
+        self.profile_clear.clicked.connect(self.clear_profile)
+        self.profile_dump = QtWidgets.QPushButton('Dump...')
+        self.profile_dump.clicked.connect(self.dump_profile)
+
+        self.profile_text = QtWidgets.QPlainTextEdit()
+        self.profile_text.setReadOnly(True)
+        self.profile_text.setMinimumHeight(140)
+        self.profile_text.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+
+        self.profile_h_ly = QtWidgets.QHBoxLayout()
+        self.profile_h_ly.addWidget(self.Profile_check)
+        self.profile_h_ly.addStretch()
+        self.profile_h_ly.addWidget(self.profile_clear)
+        self.profile_h_ly.addWidget(self.profile_dump)
+
+        self.profile_widget = QtWidgets.QWidget()
+        self.profile_v_ly = QtWidgets.QVBoxLayout(self.profile_widget)
+        self.profile_v_ly.setContentsMargins(0, 0, 0, 0)
+        self.profile_v_ly.addLayout(self.profile_h_ly)
+        self.profile_v_ly.addWidget(self.profile_text)
+        self.profile_ly.addWidget(self.profile_widget)
+
+    def show_profile(self, visible):
+        if visible and self.profile_widget is None:
+            self.build_profile()
+            self.update_profile()
+        self.profile_button.setArrowType(QtCore.Qt.DownArrow if visible else QtCore.Qt.RightArrow)
+        if self.profile_widget:
+            self.profile_widget.setVisible(visible)
+        self.adjustSize()
+
+    def set_profile(self, enabled):
+        if enabled:
+            profiler = Profiler.enable()
+            if self.update_profile not in profiler.changed:
+                profiler.changed.append(self.update_profile)
+            self.update_profile()
+        elif Profiler.instance:
+            Profiler.disable()
+            if self.update_profile in Profiler.instance.changed:
+                Profiler.instance.changed.remove(self.update_profile)
+
+    def update_profile(self, *args):
+        if self.profile_widget is None:
+            return
+        self.profile_text.setPlainText(Profiler.instance.report() if Profiler.instance else '')
+
+    def clear_profile(self):
+        if Profiler.instance:
+            Profiler.instance.clear()
+        self.update_profile()
+
+    def dump_profile(self):
+        if not Profiler.instance or not Profiler.instance.records:
+            return
+
+        path = QtWidgets.QFileDialog.getSaveFileName(self, 'Dump Profile', 'world_space_profile.json',
+                                                     'JSON (*.json)')[0]
+        if path:
+            Profiler.instance.dump(path)
+
+    def start_job(self, create_job):
+        '''
+        Run a chunked bake from the event loop, inside a single undo chunk.
+        The user input is blocked until the job ends, only Cancel stays active.
+        create_job: Function returning a BakeJob.
+        
+        '''
+        if self.job:
+            return
+
+        cmds.undoInfo(openChunk=True)
+        if Profiler.active:
+            self.job_profile = Profiler.Timer(Profiler.active, create_job.func.__name__)
+            self.job_profile.__enter__()
+        self.job_ctx = BakeContext(**self.wsl.bake_opts)
+        self.job_ctx.__enter__()
+        try:
+            with Profiler.phase('setup'):
+                self.job = create_job()
+        except Exception:
+            self.end_job()
+            raise
+
+        if not self.job:
+            self.end_job()
+            return
+
+        self.job_blocker = InputBlocker([self.cancel_button], self)
+        QtWidgets.QApplication.instance().installEventFilter(self.job_blocker)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        for button in [self.button_objs[0], self.bake_aim, self.refresh_bake, self.bake_button]:
+            button.setEnabled(False)
+        self.job_timer.start(0)
+
+    def run_job(self):
+        try:
+            self.progress_bar.setValue(int(self.job.step() * 100))
+            if self.job.is_done():
+                self.job.finish()
+                self.end_job()
+        except Exception:
+            # Remove what the job created before the error
+            self.job_timer.stop()
+            try:
+                self.job.cancel()
+            finally:
+                self.end_job()
+            raise
+
+    def cancel_job(self):
+        if self.job:
+            self.job_timer.stop()
+            try:
+                self.job.cancel()
+            finally:
+                self.end_job()
+
+    def end_job(self):
+        self.job_timer.stop()
+        self.job = None
+        if self.job_blocker:
+            QtWidgets.QApplication.instance().removeEventFilter(self.job_blocker)
+            self.job_blocker = None
+        if self.job_ctx:
+            self.job_ctx.__exit__(None, None, None)
+            self.wsl.bake_time = self.job_ctx.elapsed
+            self.job_ctx = None
+        if self.job_profile:
+            self.job_profile.__exit__(None, None, None)
+            self.job_profile = None
+        cmds.undoInfo(closeChunk=True)
+
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        for button in [self.button_objs[0], self.bake_aim, self.refresh_bake, self.bake_button]:
+            button.setEnabled(True)
+        self.show_time()
+
     def bake_loc(self):
         bl = not bool(self.Bake_check.checkState())
-        self.wsl.bake_loc(every_frame=bl)
+        self.set_bake_opts()
+        if self.Native_check.isChecked():
+            self.start_job(partial(self.wsl.bake_loc_job, every_frame=bl))
+        else:
+            Utils.add_undo(self.wsl.bake_loc)(every_frame=bl)
+            self.show_time()
         
     @Utils.add_undo
     def parent_loc(self):
         bl = bool(self.Offset_check.checkState())
+        self.wsl.live = self.Live_check.isChecked()
         self.wsl.parent_loc(offset=bl)
         
     @Utils.add_undo
     def point_loc(self):
         bl = bool(self.Offset_check.checkState())
+        self.wsl.live = self.Live_check.isChecked()
         self.wsl.point_loc(offset=bl)
         
     @Utils.add_undo
     def orient_loc(self):
         bl = bool(self.Offset_check.checkState())
+        self.wsl.live = self.Live_check.isChecked()
         self.wsl.orient_loc(offset=bl)
         
     @Utils.add_undo
@@ -721,7 +615,19 @@ class WSpaceWindow(QtWidgets.QDialog):
     @Utils.add_undo
     def bake_aim_loc(self):
         bl = not bool(self.Bake_check.checkState())
-        self.wsl.bake_aim(every_frame=bl)
+        self.set_bake_opts()
+        self.wsl.bake_aim(every_frame=bl, native=self.Native_check.isChecked())
+        self.show_time()
+        
+    @Utils.add_undo
+    def refresh_loc(self):
+        self.set_bake_opts()
+        self.wsl.refresh_loc()
+        self.show_time()
+        
+    def revert_fast_bake(self):
+        self.wsl.revert_bake()
+        self.show_time()
         
     @Utils.add_undo
     def delete_constr(self):
@@ -731,24 +637,51 @@ class WSpaceWindow(QtWidgets.QDialog):
     def select_loc(self):
         self.wsl.select_loc()
         
-    def resete_slider_basic_value(self):
-        SLIDER_BASIC_VALUE = 50
-    
-    def scale_loc_addaa(self):
-        slider_value = self.loc_scale_slider.value()
+    def export_locs(self):
+        if not cmds.ls(sl=True):
+            return
+        path = QtWidgets.QFileDialog.getSaveFileName(self, 'Export Anim', 'world_space_anim.wsla',
+                                                     'World Space Anim (*.wsla)')[0]
+        if path:
+            bl = not bool(self.Bake_check.checkState())
+            self.wsl.export_locs(path, every_frame=bl)
         
-        if slider_value > WSpaceWindow.SLIDER_BASIC_VALUE:
-            self.wsl.scale_loc_add(num=1.05)        
+    @Utils.add_undo
+    def import_locs(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Import Anim', '', 'World Space Anim (*.wsla)')[0]
+        if path:
+            cmds.select(self.wsl.import_locs(path))
         
-        elif slider_value < WSpaceWindow.SLIDER_BASIC_VALUE:
-            self.wsl.scale_loc_add(num=1 / 1.05)
-            
-        WSpaceWindow.SLIDER_BASIC_VALUE = slider_value 
+    def scale_factor(self):
+        return 1.05 ** (self.loc_scale_slider.value() - WSpaceWindow.SLIDER_BASIC_VALUE)
+
+    def scale_pressed(self):
+        self.scale_snap = self.wsl.scale_snapshot()
+
+    def scale_moved(self):
+        # Coalesce the move events, at most one update per frame
+        if not self.scale_timer.isActive():
+            self.scale_timer.start()
+
+    def scale_update(self):
+        if self.scale_snap:
+            self.scale_snap.apply(self.scale_factor())
+
+    def scale_released(self):
+        self.scale_timer.stop()
+        if self.scale_snap:
+            self.scale_snap.commit(self.scale_factor())
+            self.scale_snap = None
+        self.loc_scale_slider.setValue(WSpaceWindow.SLIDER_BASIC_VALUE)
         
-    @Utils.add_undo
     def bake_ctrl(self):
         bl = not bool(self.Bake_check.checkState())
-        self.wsl.bake_ctrl(every_frame=bl)
+        self.set_bake_opts()
+        if self.Native_check.isChecked():
+            self.start_job(partial(self.wsl.bake_ctrl_job, every_frame=bl))
+        else:
+            Utils.add_undo(self.wsl.bake_ctrl)(every_frame=bl)
+            self.show_time()
         
 if __name__ == '__main__':
 